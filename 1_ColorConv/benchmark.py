@@ -0,0 +1,235 @@
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+import color_logic
+from color_batch import MODELS, conversion_path, convert_batch, rgb_to_lab_batch, rgb_to_xyz_batch
+from color_lut import ColorLUT
+
+# Speed and accuracy report for the color conversions, as JSON.
+#
+#   python benchmark.py                       full run, JSON to stdout
+#   python benchmark.py --quick -o new.json   smaller samples and sweep
+#   python benchmark.py --compare old.json    also print changes vs old run
+#
+# Throughput is measured for every src -> dst pair and each implementation
+# that exists for it: scalar (color_logic), batch (color_batch) and lut
+# (color_lut, RGB sources only). The best of --repeat runs is reported.
+#
+# Accuracy is an exhaustive sweep over all 256^3 RGB colors (every 4th
+# value per channel with --quick) through RGB -> X -> RGB round trips.
+# For Lab the rounding drift of xyz_to_lab is reported separately as the
+# CIE76 distance between rounded and unrounded Lab.
+
+
+# ---------------------- Inputs ----------------------
+
+def sample_colors(model, n, rng):
+    if model == "rgb":
+        return rng.integers(0, 256, (n, 3))
+    if model == "cmyk":
+        return rng.integers(0, 101, (n, 4))
+    if model == "xyz":
+        return rgb_to_xyz_batch(rng.integers(0, 256, (n, 3)))
+    L = rng.integers(0, 101, n)
+    ab = rng.integers(-128, 128, (n, 2))
+    return np.column_stack([L, ab])
+
+
+def scalar_path(src, dst):
+    """Scalar color_logic functions matching the batch conversion chain."""
+    return [getattr(color_logic, f.__name__[:-len("_batch")]) for f in conversion_path(src, dst)]
+
+
+# ---------------------- Throughput ----------------------
+
+def _best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _run_scalar(functions, rows):
+    def run():
+        for row in rows:
+            value = row
+            for f in functions:
+                value = f(*value)
+    return run
+
+
+def measure_throughput(scalar_n, batch_n, repeat, seed=0):
+    rng = np.random.default_rng(seed)
+    lut = ColorLUT()
+    lut_methods = {"xyz": lut.rgb_to_xyz, "lab": lut.rgb_to_lab, "cmyk": lut.rgb_to_cmyk}
+    results = []
+
+    for src in MODELS:
+        batch_input = sample_colors(src, batch_n, rng)
+        scalar_input = batch_input[:scalar_n].tolist()
+        if src == "rgb":
+            batch_input = batch_input.astype(np.uint8)
+
+        for dst in MODELS:
+            if src == dst:
+                continue
+            implementations = {
+                "scalar": (_run_scalar(scalar_path(src, dst), scalar_input), len(scalar_input)),
+                "batch": (lambda v=batch_input, d=dst: convert_batch(v, src, d), batch_n),
+            }
+            if src == "rgb" and dst in lut_methods:
+                method = lut_methods[dst]
+                # The first call builds or maps the cube, keep it out of the timing
+                method(batch_input[:1])
+                implementations["lut"] = (lambda v=batch_input, m=method: m(v), batch_n)
+
+            for name, (func, count) in implementations.items():
+                seconds = _best_time(func, repeat)
+                results.append({
+                    "src": src,
+                    "dst": dst,
+                    "implementation": name,
+                    "colors": count,
+                    "seconds": seconds,
+                    "colors_per_second": count / seconds if seconds else None,
+                })
+    return results
+
+
+# ---------------------- Accuracy ----------------------
+
+def _rgb_planes(step):
+    values = np.arange(0, 256, step, dtype=np.uint8)
+    g, b = np.meshgrid(values, values, indexing="ij")
+    plane = np.empty(g.shape + (3,), dtype=np.uint8)
+    plane[..., 1] = g
+    plane[..., 2] = b
+    for r in values:
+        plane[..., 0] = r
+        yield plane.reshape(-1, 3)
+
+
+class _ErrorStats:
+    def __init__(self):
+        self.count = 0
+        self.inexact = 0
+        self.max = 0.0
+        self.total = 0.0
+        self.worst_input = None
+
+    def add(self, inputs, errors):
+        """errors: one value per color (the largest channel error)."""
+        self.count += len(errors)
+        self.inexact += int(np.count_nonzero(errors))
+        self.total += float(errors.sum())
+        i = int(np.argmax(errors))
+        if errors[i] > self.max:
+            self.max = float(errors[i])
+            self.worst_input = inputs[i].tolist()
+
+    def as_dict(self):
+        return {
+            "colors": self.count,
+            "inexact": self.inexact,
+            "max_error": self.max,
+            "mean_error": self.total / self.count if self.count else 0.0,
+            "worst_input": self.worst_input,
+        }
+
+
+def measure_accuracy(step=1):
+    round_trips = {model: _ErrorStats() for model in ("cmyk", "xyz", "lab")}
+    lab_rounding = _ErrorStats()
+
+    for rgb in _rgb_planes(step):
+        for model, stats in round_trips.items():
+            back = convert_batch(convert_batch(rgb, "rgb", model), model, "rgb")
+            errors = np.abs(back.astype(np.int16) - rgb).max(axis=-1)
+            stats.add(rgb, errors)
+
+        exact = rgb_to_lab_batch(rgb, rounding=False)
+        drift = np.sqrt(((np.rint(exact) - exact) ** 2).sum(axis=-1))
+        lab_rounding.add(rgb, drift)
+
+    result = {f"rgb_{model}_rgb": stats.as_dict() for model, stats in round_trips.items()}
+    result["lab_rounding_delta_e76"] = lab_rounding.as_dict()
+    return result
+
+
+# ---------------------- Report ----------------------
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(quick=False, repeat=3, seed=0):
+    scalar_n, batch_n, step = (2_000, 100_000, 4) if quick else (20_000, 1_000_000, 1)
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "quick": quick,
+        "throughput": measure_throughput(scalar_n, batch_n, repeat, seed),
+        "accuracy": measure_accuracy(step),
+    }
+
+
+def compare(report, baseline):
+    """Human-readable differences between two reports."""
+    lines = []
+    old = {(r["src"], r["dst"], r["implementation"]): r for r in baseline.get("throughput", [])}
+    for r in report["throughput"]:
+        prev = old.get((r["src"], r["dst"], r["implementation"]))
+        if prev and prev["colors_per_second"] and r["colors_per_second"]:
+            ratio = r["colors_per_second"] / prev["colors_per_second"]
+            lines.append(f"{r['src']:>4} -> {r['dst']:<4} {r['implementation']:<6} "
+                         f"{r['colors_per_second']:>14,.0f}/s  x{ratio:.2f}")
+
+    for name, stats in report["accuracy"].items():
+        prev = baseline.get("accuracy", {}).get(name)
+        if prev:
+            lines.append(f"{name}: max {prev['max_error']:.4g} -> {stats['max_error']:.4g}, "
+                         f"mean {prev['mean_error']:.4g} -> {stats['mean_error']:.4g}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark color conversions, JSON output.")
+    parser.add_argument("--quick", action="store_true", help="smaller samples, sweep every 4th RGB value")
+    parser.add_argument("--repeat", type=int, default=3, help="timing runs per measurement (best is kept)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="previous JSON report to compare with")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.quick, args.repeat, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
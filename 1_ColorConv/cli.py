@@ -0,0 +1,255 @@
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, islice
+
+import numpy as np
+
+from color_batch import CHANNELS, MODELS, RANGES, convert_batch
+
+# Headless batch converter: reads colors line by line from files or stdin,
+# converts them chunk by chunk and writes each chunk as soon as it is done,
+# so memory stays bounded by --chunk-size whatever the input length.
+#
+# Input formats (one color per line, blank lines and "#" comments skipped):
+#   csv   - "255,128,0" (a non-numeric first line is taken as a header)
+#   jsonl - [255, 128, 0] or {"rgb": [255, 128, 0]}
+#   hex   - "#ff8000" or "ff8000" (RGB only)
+# Values outside the model's RANGES are invalid lines, like unparsable ones.
+# Output formats are the same; jsonl is written as {"<model>": [...]}.
+
+FORMATS = ("csv", "jsonl", "hex")
+_EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl", ".hex": "hex", ".txt": "hex"}
+
+
+class ConversionError(ValueError):
+    pass
+
+
+# ---------------------- Parsing ----------------------
+
+def _parse_csv(line, model):
+    return [float(v) for v in line.split(",")]
+
+
+def _parse_jsonl(line, model):
+    value = json.loads(line)
+    if isinstance(value, dict):
+        value = value[model]
+    return [float(v) for v in value]
+
+
+def _parse_hex(line, model):
+    text = line.lstrip("#")
+    if len(text) != 6:
+        raise ValueError(f"expected 6 hex digits, got {line!r}")
+    return [int(text[i:i + 2], 16) for i in (0, 2, 4)]
+
+
+def _check_range(row, model):
+    for value, (low, high) in zip(row, RANGES[model]):
+        # Written as "not inside" so that NaN is rejected too
+        if not low <= value <= high:
+            raise ValueError(f"{model} value {value:g} is outside {low}..{high}")
+
+
+def _is_header(line):
+    try:
+        _parse_csv(line, None)
+    except ValueError:
+        return True
+    return False
+
+
+_PARSERS = {"csv": _parse_csv, "jsonl": _parse_jsonl, "hex": _parse_hex}
+
+
+def parse_lines(lines, fmt, model, first_line=1, skip_invalid=False):
+    """
+    Parses one chunk of text lines into an (N, channels) array. Whole RGB
+    values give an integer array, so the conversion uses the 8-bit tables.
+    """
+    parse = _PARSERS[fmt]
+    channels = CHANNELS[model]
+    rows = []
+    skipped = 0
+
+    for number, line in enumerate(lines, start=first_line):
+        line = line.strip()
+        if not line or line.startswith("#") and fmt != "hex":
+            continue
+        if number == 1 and fmt == "csv" and _is_header(line):
+            continue
+        try:
+            row = parse(line, model)
+            if len(row) != channels:
+                raise ValueError(f"expected {channels} values for {model}, got {len(row)}")
+            _check_range(row, model)
+        except (ValueError, KeyError, TypeError) as e:
+            if skip_invalid:
+                skipped += 1
+                continue
+            raise ConversionError(f"line {number}: {e}") from None
+        rows.append(row)
+
+    values = np.array(rows, dtype=np.float64).reshape(-1, channels)
+    if model == "rgb" and np.array_equal(values, np.rint(values)):
+        values = values.astype(np.uint8)
+    return values, skipped
+
+
+# ---------------------- Formatting ----------------------
+
+def _number_formatter(values, precision):
+    if np.issubdtype(values.dtype, np.integer):
+        return str
+    return lambda v: f"{v:.{precision}f}"
+
+
+def format_rows(values, fmt, model, precision=6):
+    if fmt == "hex":
+        if model != "rgb":
+            raise ConversionError("hex output is only available for rgb")
+        # With --no-round the values are fractional: round, not truncate
+        return "".join(f"#{r:02x}{g:02x}{b:02x}\n" for r, g, b in np.rint(values).astype(np.int64).tolist())
+
+    number = _number_formatter(values, precision)
+    rows = values.tolist()
+    if fmt == "csv":
+        return "".join(",".join(number(v) for v in row) + "\n" for row in rows)
+    return "".join(f'{{"{model}": [{", ".join(number(v) for v in row)}]}}\n' for row in rows)
+
+
+def convert_chunk(lines, first_line, source, options):
+    """Parses, converts and formats one chunk. Runs in pool workers too."""
+    try:
+        values, skipped = parse_lines(lines, options["input_format"], options["src"],
+                                      first_line, options["skip_invalid"])
+    except ConversionError as e:
+        raise ConversionError(f"{source}: {e}") from None
+    result = convert_batch(values, options["src"], options["dst"], rounding=not options["no_round"])
+    return format_rows(result, options["output_format"], options["dst"], options["precision"]), skipped
+
+
+# ---------------------- Streaming ----------------------
+
+def _read_chunks(streams, chunk_size):
+    for stream in streams:
+        source = getattr(stream, "name", "<input>")
+        line_number = 1
+        while True:
+            lines = list(islice(stream, chunk_size))
+            if not lines:
+                break
+            yield lines, line_number, source
+            line_number += len(lines)
+
+
+def _convert_parallel(chunks, options, workers, write):
+    skipped = 0
+    # Bounded queue of pending chunks keeps the reader from running ahead
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for lines, first_line, source in chunks:
+            pending.append(pool.submit(convert_chunk, lines, first_line, source, options))
+            if len(pending) >= workers * 2:
+                text, count = pending.popleft().result()
+                write(text)
+                skipped += count
+        while pending:
+            text, count = pending.popleft().result()
+            write(text)
+            skipped += count
+    return skipped
+
+
+def run(streams, output, options, chunk_size=65536, workers=1):
+    """Converts all streams into output. Returns the number of skipped lines."""
+    chunks = _read_chunks(streams, chunk_size)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    chunks = chain([first], chunks)
+
+    # The process pool only pays off when there is more than one chunk
+    if workers > 1 and len(first[0]) == chunk_size:
+        return _convert_parallel(chunks, options, workers, output.write)
+
+    skipped = 0
+    for lines, first_line, source in chunks:
+        text, count = convert_chunk(lines, first_line, source, options)
+        output.write(text)
+        skipped += count
+    return skipped
+
+
+def _guess_format(path, default):
+    return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Convert colors between RGB, CMYK, XYZ and Lab without the GUI.",
+    )
+    parser.add_argument("--from", dest="src", choices=MODELS, required=True, help="input color model")
+    parser.add_argument("--to", dest="dst", choices=MODELS, required=True, help="output color model")
+    parser.add_argument("-i", "--input", nargs="*", default=[], help="input files (default: stdin)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--input-format", choices=FORMATS, help="default: by file extension, else csv")
+    parser.add_argument("--output-format", choices=FORMATS, help="default: by file extension, else csv")
+    parser.add_argument("--chunk-size", type=int, default=65536, help="colors per chunk (default: 65536)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="processes for inputs longer than one chunk (default: CPU count)")
+    parser.add_argument("--no-round", action="store_true", help="keep fractional CMYK/Lab/RGB values")
+    parser.add_argument("--precision", type=int, default=6, help="decimals for fractional output")
+    parser.add_argument("--skip-invalid", action="store_true", help="skip unparsable and out-of-range lines instead of failing")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.chunk_size < 1 or args.workers < 1:
+        print("error: --chunk-size and --workers must be positive", file=sys.stderr)
+        return 2
+
+    input_format = args.input_format or (_guess_format(args.input[0], "csv") if args.input else "csv")
+    output_format = args.output_format or (_guess_format(args.output, "csv") if args.output else "csv")
+    if input_format == "hex" and args.src != "rgb" or output_format == "hex" and args.dst != "rgb":
+        print("error: hex format is only available for rgb", file=sys.stderr)
+        return 2
+
+    options = {
+        "src": args.src,
+        "dst": args.dst,
+        "input_format": input_format,
+        "output_format": output_format,
+        "no_round": args.no_round,
+        "precision": args.precision,
+        "skip_invalid": args.skip_invalid,
+    }
+
+    inputs = [open(path, encoding="utf-8") for path in args.input] or [sys.stdin]
+    output = open(args.output, "w", encoding="utf-8", newline="\n") if args.output else sys.stdout
+    try:
+        skipped = run(inputs, output, options, args.chunk_size, args.workers)
+    except ConversionError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        for stream in inputs:
+            if stream is not sys.stdin:
+                stream.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if skipped:
+        print(f"skipped {skipped} invalid lines", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,300 @@
+import math
+
+import numpy as np
+
+import color_logic
+
+# Vectorized (NumPy) versions of the conversions from color_logic.
+#
+# Every function takes an array of any shape whose last axis holds the
+# channels (3 for RGB/XYZ/Lab, 4 for CMYK), e.g. a single color (3,),
+# a list of colors (N, 3) or a whole image (H, W, 3).
+#
+# The arithmetic repeats color_logic step by step (same constants, same
+# operation order, round-half-to-even like Python's round()), so with
+# rounding=True the results are identical to the scalar functions.
+#
+# Common keyword arguments:
+#   dtype    - dtype of the result (ignored when out is given)
+#   out      - preallocated array of the result shape to write into
+#   rounding - round the channels the scalar function rounds
+#
+# NumPy's power() may differ from math.pow() in the last bit. That never
+# matters after rounding except for values right at k + 0.5, so such
+# elements are recomputed with the scalar function (see _fix_ties).
+
+# Distance from a .5 tie below which the scalar function decides the rounding
+_TIE_EPS = 1e-9
+
+
+# ---------------------- Helpers ----------------------
+
+def _channels(values, count, name):
+    arr = np.asarray(values)
+    if arr.ndim == 0 or arr.shape[-1] != count:
+        raise ValueError(f"{name}: expected last axis of size {count}, got shape {arr.shape}")
+    arr = arr.astype(np.float64, copy=False)
+    return [arr[..., i] for i in range(count)]
+
+
+def _output(channels, shape, dtype, out):
+    result_shape = shape + (len(channels),)
+    if out is None:
+        out = np.empty(result_shape, dtype=dtype)
+    elif out.shape != result_shape:
+        raise ValueError(f"out: expected shape {result_shape}, got {out.shape}")
+
+    for i, channel in enumerate(channels):
+        out[..., i] = channel
+    return out
+
+
+def _fix_ties(channels, inputs, scalar):
+    near = np.zeros(channels[0].shape, dtype=bool)
+    for v in channels:
+        near |= np.abs(v - np.floor(v) - 0.5) < _TIE_EPS
+    if not near.any():
+        return
+
+    idx = np.nonzero(near)
+    rows = np.stack([np.broadcast_to(c, near.shape)[idx] for c in inputs], axis=-1)
+    fixed = np.array([scalar(*row) for row in rows.tolist()], dtype=np.float64)
+    for i, v in enumerate(channels):
+        v[idx] = fixed[:, i]
+
+
+def _default_dtype(dtype, rounding, int_dtype):
+    if dtype is not None:
+        return dtype
+    return int_dtype if rounding else np.float64
+
+
+# Gamma correction (sRGB -> linear)
+def _inv_gamma_scalar(c):
+    return math.pow((c + 0.055) / 1.055, 2.4) if c > 0.04045 else c / 12.92
+
+
+# Linear value of every 8-bit channel, computed exactly like color_logic
+SRGB_TO_LINEAR = np.array([_inv_gamma_scalar(v / 255) for v in range(256)], dtype=np.float64)
+
+
+def _inv_gamma(c):
+    with np.errstate(invalid="ignore"):
+        return np.where(c > 0.04045, np.power((c + 0.055) / 1.055, 2.4), c / 12.92)
+
+
+# Gamma correction (linear -> sRGB)
+def _gamma(c):
+    with np.errstate(invalid="ignore"):
+        return np.where(c > 0.0031308, 1.055 * np.power(c, 1 / 2.4) - 0.055, 12.92 * c)
+
+
+def _lab_f(t):
+    with np.errstate(invalid="ignore"):
+        return np.where(t > 0.008856, np.power(t, 1 / 3), 7.787 * t + 16 / 116)
+
+
+def _lab_f_inv(t):
+    t3 = np.power(t, 3.0)
+    return np.where(t3 > 0.008856, t3, (t - 16 / 116) / 7.787)
+
+
+# Matrix for D65, same summation order as color_logic.rgb_to_xyz
+def _linear_to_xyz(r, g, b):
+    x = r * 0.4124 + g * 0.3576 + b * 0.1805
+    y = r * 0.2126 + g * 0.7152 + b * 0.0722
+    z = r * 0.0193 + g * 0.1192 + b * 0.9505
+    return x, y, z
+
+
+# -------------------- RGB <-> CMYK --------------------------
+
+def rgb_to_cmyk_batch(rgb, dtype=None, out=None, rounding=True):
+    r, g, b = _channels(rgb, 3, "rgb")
+    black = (r == 0) & (g == 0) & (b == 0)
+
+    r_p = r / 255
+    g_p = g / 255
+    b_p = b / 255
+
+    k = 1 - np.maximum(np.maximum(r_p, g_p), b_p)
+    # Avoid 0/0 for pure black, it is replaced below anyway
+    denom = np.where(black, 1.0, 1 - k)
+    c = (1 - r_p - k) / denom * 100
+    m = (1 - g_p - k) / denom * 100
+    y = (1 - b_p - k) / denom * 100
+    k = k * 100
+
+    c, m, y = (np.where(black, 0.0, v) for v in (c, m, y))
+    k = np.where(black, 100.0, k)
+
+    if rounding:
+        c, m, y, k = np.rint(c), np.rint(m), np.rint(y), np.rint(k)
+
+    dtype = _default_dtype(dtype, rounding, np.uint8)
+    return _output((c, m, y, k), r.shape, dtype, out)
+
+
+def cmyk_to_rgb_batch(cmyk, dtype=None, out=None, rounding=True):
+    c, m, y, k = _channels(cmyk, 4, "cmyk")
+    c = c / 100
+    m = m / 100
+    y = y / 100
+    k = k / 100
+
+    r = 255 * (1 - c) * (1 - k)
+    g = 255 * (1 - m) * (1 - k)
+    b = 255 * (1 - y) * (1 - k)
+
+    if rounding:
+        r, g, b = np.rint(r), np.rint(g), np.rint(b)
+
+    dtype = _default_dtype(dtype, rounding, np.uint8)
+    return _output((r, g, b), c.shape, dtype, out)
+
+
+# -------------------- RGB <-> Lab ---------------------------
+
+def _is_8bit(arr):
+    if arr.dtype == np.uint8:
+        return True
+    return (np.issubdtype(arr.dtype, np.integer) and arr.size > 0
+            and arr.min() >= 0 and arr.max() <= 255)
+
+
+def _linearize(rgb):
+    arr = np.asarray(rgb)
+    if arr.ndim == 0 or arr.shape[-1] != 3:
+        raise ValueError(f"rgb: expected last axis of size 3, got shape {arr.shape}")
+    if _is_8bit(arr):
+        # Integer input: 256-entry table instead of pow() per element
+        return [SRGB_TO_LINEAR[arr[..., i]] for i in range(3)]
+    r, g, b = _channels(arr, 3, "rgb")
+    return [_inv_gamma(r / 255), _inv_gamma(g / 255), _inv_gamma(b / 255)]
+
+
+# sRGB to XYZ
+def rgb_to_xyz_batch(rgb, dtype=np.float64, out=None):
+    r, g, b = _linearize(rgb)
+    return _output(_linear_to_xyz(r, g, b), r.shape, dtype, out)
+
+
+# XYZ to Lab
+def xyz_to_lab_batch(xyz, dtype=None, out=None, rounding=True):
+    x, y, z = _channels(xyz, 3, "xyz")
+    # Reference white D65
+    Xn, Yn, Zn = 0.95047, 1.00000, 1.08883
+
+    fx = _lab_f(x / Xn)
+    fy = _lab_f(y / Yn)
+    fz = _lab_f(z / Zn)
+
+    L = 116 * fy - 16
+    a = 500 * (fx - fy)
+    b = 200 * (fy - fz)
+
+    if rounding:
+        _fix_ties((L, a, b), (x, y, z), color_logic.xyz_to_lab)
+        L, a, b = np.rint(L), np.rint(a), np.rint(b)
+
+    dtype = _default_dtype(dtype, rounding, np.int16)
+    return _output((L, a, b), x.shape, dtype, out)
+
+
+# Lab to XYZ
+def lab_to_xyz_batch(lab, dtype=np.float64, out=None):
+    L, a, b = _channels(lab, 3, "lab")
+    fy = (L + 16) / 116
+    fx = fy + a / 500
+    fz = fy - b / 200
+
+    x = _lab_f_inv(fx)
+    y = _lab_f_inv(fy)
+    z = _lab_f_inv(fz)
+
+    # Reference white D65
+    Xn, Yn, Zn = 0.95047, 1.00000, 1.08883
+
+    return _output((x * Xn, y * Yn, z * Zn), L.shape, dtype, out)
+
+
+# XYZ to RGB
+def xyz_to_rgb_batch(xyz, dtype=None, out=None, rounding=True):
+    x, y, z = _channels(xyz, 3, "xyz")
+    r = x * 3.2406 + y * -1.5372 + z * -0.4986
+    g = x * -0.9689 + y * 1.8758 + z * 0.0415
+    b = x * 0.0557 + y * -0.2040 + z * 1.0570
+
+    r, g, b = _gamma(r) * 255, _gamma(g) * 255, _gamma(b) * 255
+    if rounding:
+        _fix_ties((r, g, b), (x, y, z), color_logic.xyz_to_rgb)
+        r, g, b = np.rint(r), np.rint(g), np.rint(b)
+    r, g, b = (np.clip(v, 0, 255) for v in (r, g, b))
+
+    dtype = _default_dtype(dtype, rounding, np.uint8)
+    return _output((r, g, b), x.shape, dtype, out)
+
+
+def rgb_to_lab_batch(rgb, dtype=None, out=None, rounding=True):
+    return xyz_to_lab_batch(rgb_to_xyz_batch(rgb), dtype=dtype, out=out, rounding=rounding)
+
+
+def lab_to_rgb_batch(lab, dtype=None, out=None, rounding=True):
+    return xyz_to_rgb_batch(lab_to_xyz_batch(lab), dtype=dtype, out=out, rounding=rounding)
+
+
+# -------------------- Any -> any ---------------------------
+
+MODELS = ("rgb", "cmyk", "xyz", "lab")
+CHANNELS = {"rgb": 3, "cmyk": 4, "xyz": 3, "lab": 3}
+
+# Valid (min, max) of every channel, as in the GUI spinboxes. XYZ has no
+# upper bound: colors outside sRGB are clipped when converted to RGB
+RANGES = {
+    "rgb": [(0, 255)] * 3,
+    "cmyk": [(0, 100)] * 4,
+    "xyz": [(0, math.inf)] * 3,
+    "lab": [(0, 100), (-128, 127), (-128, 127)],
+}
+
+# Same chains as the GUI: CMYK and Lab meet through rounded RGB
+_PATHS = {
+    ("rgb", "cmyk"): [rgb_to_cmyk_batch],
+    ("rgb", "xyz"): [rgb_to_xyz_batch],
+    ("rgb", "lab"): [rgb_to_lab_batch],
+    ("cmyk", "rgb"): [cmyk_to_rgb_batch],
+    ("cmyk", "xyz"): [cmyk_to_rgb_batch, rgb_to_xyz_batch],
+    ("cmyk", "lab"): [cmyk_to_rgb_batch, rgb_to_lab_batch],
+    ("xyz", "rgb"): [xyz_to_rgb_batch],
+    ("xyz", "cmyk"): [xyz_to_rgb_batch, rgb_to_cmyk_batch],
+    ("xyz", "lab"): [xyz_to_lab_batch],
+    ("lab", "rgb"): [lab_to_rgb_batch],
+    ("lab", "cmyk"): [lab_to_rgb_batch, rgb_to_cmyk_batch],
+    ("lab", "xyz"): [lab_to_xyz_batch],
+}
+
+# Conversions without a rounding step always return floats
+_UNROUNDED = (rgb_to_xyz_batch, lab_to_xyz_batch)
+
+
+def conversion_path(src, dst):
+    """Returns the list of *_batch functions that convert src to dst."""
+    if src not in MODELS or dst not in MODELS:
+        raise ValueError(f"Unknown color model: {src} -> {dst}. Expected one of {MODELS}")
+    return list(_PATHS.get((src, dst), []))
+
+
+def convert_batch(values, src, dst, dtype=None, out=None, rounding=True):
+    path = conversion_path(src, dst)
+    if not path:
+        values = np.asarray(values)
+        _channels(values, CHANNELS[src], src)
+        return _output([values[..., i] for i in range(CHANNELS[src])], values.shape[:-1],
+                       dtype or values.dtype, out)
+
+    *steps, last = path
+    for step in steps:
+        values = step(values)
+    if last in _UNROUNDED:
+        return last(values, dtype=dtype or np.float64, out=out)
+    return last(values, dtype=dtype, out=out, rounding=rounding)
@@ -0,0 +1,148 @@
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from color_batch import SRGB_TO_LINEAR, rgb_to_cmyk_batch, rgb_to_lab_batch, rgb_to_xyz_batch
+
+# Table-driven RGB conversions.
+#
+# 8-bit RGB has only 256 values per channel, so:
+#   - rgb_to_xyz goes through the 256-entry linearization table
+#     (SRGB_TO_LINEAR from color_batch) instead of pow() per pixel;
+#   - RGB -> Lab and RGB -> CMYK can be answered by a full 256^3 cube,
+#     one gather per pixel.
+#
+# A cube is built once (about 50 MB for Lab, 64 MB for CMYK), saved as .npy
+# in the cache directory and opened with a memory map afterwards, so every
+# process using the same directory shares one copy through the page cache.
+# The cube values are produced by color_batch and therefore equal the
+# scalar color_logic results.
+
+# Bump when the conversion formulas change, old cube files are then ignored
+CUBE_VERSION = 1
+
+# name -> (channels, storage dtype, builder)
+# Lab of 8-bit sRGB stays within L 0..100, a -86..98, b -108..94 -> int8
+_CUBES = {
+    "lab": (3, np.int8, rgb_to_lab_batch),
+    "cmyk": (4, np.uint8, rgb_to_cmyk_batch),
+}
+
+
+def default_cache_dir():
+    path = os.environ.get("COLORCONV_CACHE_DIR")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".cache", "colorconv")
+
+
+def _as_8bit_rgb(rgb):
+    arr = np.asarray(rgb)
+    if arr.ndim == 0 or arr.shape[-1] != 3:
+        raise ValueError(f"rgb: expected last axis of size 3, got shape {arr.shape}")
+    if arr.dtype != np.uint8:
+        if not np.issubdtype(arr.dtype, np.integer):
+            raise ValueError(f"rgb: table lookup needs integer input, got {arr.dtype}")
+        if arr.size and (arr.min() < 0 or arr.max() > 255):
+            raise ValueError("rgb: values must be in [0; 255]")
+    return arr
+
+
+def _flat_index(rgb):
+    idx = rgb[..., 0].astype(np.intp) << 16
+    idx |= rgb[..., 1].astype(np.intp) << 8
+    idx |= rgb[..., 2]
+    return idx
+
+
+def build_cube(name, path):
+    """Computes the RGB -> <name> cube and writes it to path as .npy."""
+    channels, dtype, convert = _CUBES[name]
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+
+    cube = open_memmap(tmp_path, mode="w+", dtype=dtype, shape=(256, 256, 256, channels))
+    g, b = np.meshgrid(np.arange(256, dtype=np.uint8), np.arange(256, dtype=np.uint8), indexing="ij")
+    plane = np.empty((256, 256, 3), dtype=np.uint8)
+    plane[..., 1] = g
+    plane[..., 2] = b
+    # One R plane at a time keeps the temporary arrays small
+    for r in range(256):
+        plane[..., 0] = r
+        convert(plane, out=cube[r])
+    cube.flush()
+    del cube
+
+    # Atomic for concurrent builders: the last one wins, readers never see half a file
+    os.replace(tmp_path, path)
+
+
+class ColorLUT:
+    """Lookup-table engine for 8-bit RGB input."""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.linear = SRGB_TO_LINEAR
+        self._cubes = {}
+
+    def cube_path(self, name):
+        return os.path.join(self.cache_dir, f"rgb_{name}_v{CUBE_VERSION}.npy")
+
+    def cube(self, name):
+        """Returns the memory-mapped cube, building it on first use."""
+        if name in self._cubes:
+            return self._cubes[name]
+        if name not in _CUBES:
+            raise ValueError(f"Unknown cube: {name}")
+
+        channels, dtype, _ = _CUBES[name]
+        path = self.cube_path(name)
+        cube = self._load(path, channels, dtype)
+        if cube is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            build_cube(name, path)
+            cube = self._load(path, channels, dtype)
+
+        self._cubes[name] = cube
+        return cube
+
+    @staticmethod
+    def _load(path, channels, dtype):
+        if not os.path.exists(path):
+            return None
+        try:
+            cube = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        if cube.shape != (256, 256, 256, channels) or cube.dtype != dtype:
+            return None
+        return cube
+
+    def _gather(self, name, rgb, dtype, out):
+        rgb = _as_8bit_rgb(rgb)
+        cube = self.cube(name)
+        flat = cube.reshape(256 ** 3, cube.shape[-1])
+        result_shape = rgb.shape[:-1] + (cube.shape[-1],)
+
+        if out is not None and out.shape != result_shape:
+            raise ValueError(f"out: expected shape {result_shape}, got {out.shape}")
+        if out is not None and out.dtype == cube.dtype:
+            np.take(flat, _flat_index(rgb), axis=0, out=out)
+            return out
+
+        values = np.take(flat, _flat_index(rgb), axis=0)
+        if out is None:
+            return values.astype(dtype or cube.dtype, copy=False)
+        out[...] = values
+        return out
+
+    # -------------------- Conversions --------------------------
+
+    def rgb_to_xyz(self, rgb, dtype=np.float64, out=None):
+        return rgb_to_xyz_batch(_as_8bit_rgb(rgb), dtype=dtype, out=out)
+
+    def rgb_to_lab(self, rgb, dtype=np.int16, out=None):
+        return self._gather("lab", rgb, dtype, out)
+
+    def rgb_to_cmyk(self, rgb, dtype=np.uint8, out=None):
+        return self._gather("cmyk", rgb, dtype, out)
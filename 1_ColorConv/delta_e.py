@@ -0,0 +1,366 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# Color difference (Delta E) between Lab colors and nearest-color search
+# in a palette.
+#
+# All delta_e_* functions broadcast: lab1 and lab2 are arrays of any
+# compatible shapes ending in 3 (L, a, b), e.g. (N, 3) against (3,).
+# lab1 is the reference color where the formula is asymmetric (CIE94).
+#
+# PaletteIndex keeps the palette in a KD-tree over Lab, so queries never
+# build an N x M distance matrix:
+#   cie76     - Euclidean distance, answered by the tree directly (exact);
+#   cie94     - the tree gives a Euclidean radius that is guaranteed to
+#               contain the answer, candidates are re-ranked (exact);
+#   ciede2000 - the same in a second tree with lightness scaled up, with
+#               the looser bound of _ciede2000_bound (exact). With
+#               exact=False only the nearest `candidates` Euclidean
+#               neighbours are re-ranked: much faster, but the answer may
+#               be missed (see check_against_brute_force).
+
+METRICS = ("cie76", "cie94", "ciede2000")
+
+# Queries whose CIEDE2000 ball query runs at once (bounds the candidate lists)
+_BALL_BLOCK = 1024
+
+
+def _lab(values):
+    arr = np.asarray(values, dtype=np.float64)
+    if arr.ndim == 0 or arr.shape[-1] != 3:
+        raise ValueError(f"lab: expected last axis of size 3, got shape {arr.shape}")
+    return arr
+
+
+# -------------------- Delta E formulas ----------------------
+
+def delta_e_cie76(lab1, lab2):
+    lab1, lab2 = _lab(lab1), _lab(lab2)
+    return np.sqrt(np.sum((lab1 - lab2) ** 2, axis=-1))
+
+
+# kL, K1, K2 for graphic arts; textiles use 2, 0.048, 0.014
+def delta_e_cie94(lab1, lab2, kL=1, K1=0.045, K2=0.015):
+    lab1, lab2 = _lab(lab1), _lab(lab2)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    dL = L1 - L2
+    C1 = np.hypot(a1, b1)
+    C2 = np.hypot(a2, b2)
+    dC = C1 - C2
+    da = a1 - a2
+    db = b1 - b2
+    dH2 = np.maximum(da ** 2 + db ** 2 - dC ** 2, 0)
+
+    SC = 1 + K1 * C1
+    SH = 1 + K2 * C1
+
+    return np.sqrt((dL / kL) ** 2 + (dC / SC) ** 2 + dH2 / SH ** 2)
+
+
+def delta_e_ciede2000(lab1, lab2, kL=1, kC=1, kH=1):
+    lab1, lab2 = _lab(lab1), _lab(lab2)
+    L1, a1, b1 = lab1[..., 0], lab1[..., 1], lab1[..., 2]
+    L2, a2, b2 = lab2[..., 0], lab2[..., 1], lab2[..., 2]
+
+    C_mean = (np.hypot(a1, b1) + np.hypot(a2, b2)) / 2
+    C7 = C_mean ** 7
+    G = 0.5 * (1 - np.sqrt(C7 / (C7 + 25 ** 7)))
+
+    a1p = (1 + G) * a1
+    a2p = (1 + G) * a2
+    C1p = np.hypot(a1p, b1)
+    C2p = np.hypot(a2p, b2)
+    h1p = np.degrees(np.arctan2(b1, a1p)) % 360
+    h2p = np.degrees(np.arctan2(b2, a2p)) % 360
+
+    dLp = L2 - L1
+    dCp = C2p - C1p
+
+    chroma_zero = (C1p * C2p) == 0
+    dh = h2p - h1p
+    dh = np.where(dh > 180, dh - 360, np.where(dh < -180, dh + 360, dh))
+    dh = np.where(chroma_zero, 0, dh)
+    dHp = 2 * np.sqrt(C1p * C2p) * np.sin(np.radians(dh / 2))
+
+    Lp_mean = (L1 + L2) / 2
+    Cp_mean = (C1p + C2p) / 2
+
+    h_sum = h1p + h2p
+    hp_mean = np.where(
+        np.abs(h1p - h2p) <= 180, h_sum / 2,
+        np.where(h_sum < 360, (h_sum + 360) / 2, (h_sum - 360) / 2)
+    )
+    hp_mean = np.where(chroma_zero, h_sum, hp_mean)
+
+    T = (1
+         - 0.17 * np.cos(np.radians(hp_mean - 30))
+         + 0.24 * np.cos(np.radians(2 * hp_mean))
+         + 0.32 * np.cos(np.radians(3 * hp_mean + 6))
+         - 0.20 * np.cos(np.radians(4 * hp_mean - 63)))
+
+    d_theta = 30 * np.exp(-(((hp_mean - 275) / 25) ** 2))
+    Cp7 = Cp_mean ** 7
+    RC = 2 * np.sqrt(Cp7 / (Cp7 + 25 ** 7))
+    SL = 1 + (0.015 * (Lp_mean - 50) ** 2) / np.sqrt(20 + (Lp_mean - 50) ** 2)
+    SC = 1 + 0.045 * Cp_mean
+    SH = 1 + 0.015 * Cp_mean * T
+    RT = -np.sin(np.radians(2 * d_theta)) * RC
+
+    L_term = dLp / (kL * SL)
+    C_term = dCp / (kC * SC)
+    H_term = dHp / (kH * SH)
+
+    return np.sqrt(L_term ** 2 + C_term ** 2 + H_term ** 2 + RT * C_term * H_term)
+
+
+_DELTA_E = {
+    "cie76": delta_e_cie76,
+    "cie94": delta_e_cie94,
+    "ciede2000": delta_e_ciede2000,
+}
+
+
+def delta_e(lab1, lab2, metric="cie76"):
+    if metric not in _DELTA_E:
+        raise ValueError(f"Unknown metric: {metric}. Expected one of {METRICS}")
+    return _DELTA_E[metric](lab1, lab2)
+
+
+# -------------------- Palette index ---------------------------
+
+def _best_k(queries, palette, candidates, k, metric):
+    """
+    Re-ranks candidate lists (one index array per query) by the metric and
+    keeps the k best of each. Ties go to the lower palette index.
+    """
+    counts = np.fromiter((len(c) for c in candidates), dtype=np.intp, count=len(candidates))
+    query_idx = np.repeat(np.arange(len(candidates)), counts)
+    palette_idx = np.concatenate(candidates).astype(np.intp) if len(candidates) else np.empty(0, np.intp)
+
+    dist = delta_e(queries[query_idx], palette[palette_idx], metric)
+    order = np.lexsort((palette_idx, dist, query_idx))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    take = (starts[:, None] + np.arange(k)).ravel()
+
+    return dist[order][take].reshape(-1, k), palette_idx[order][take].reshape(-1, k)
+
+
+def _filter_radius(queries, palette, candidates, r, metric):
+    result = []
+    for q, cand in zip(queries, candidates):
+        cand = np.asarray(cand, dtype=np.intp)
+        dist = delta_e(q, palette[cand], metric)
+        keep = dist <= r
+        order = np.lexsort((cand[keep], dist[keep]))
+        result.append(cand[keep][order])
+    return result
+
+
+class PaletteIndex:
+    """
+    Nearest-color search over a palette of Lab colors.
+
+    query() returns (distances, indices) of shape (..., k) for queries of
+    shape (..., 3); query_radius() returns one index array per query,
+    nearest first. Queries are processed in chunks of chunk_size colors.
+    Results are exact for every metric unless exact=False (ciede2000 only).
+    """
+
+    def __init__(self, palette_lab, metric="cie76", candidates=32, workers=1, chunk_size=65536,
+                 exact=True):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Expected one of {METRICS}")
+        self.palette = _lab(palette_lab).reshape(-1, 3)
+        if len(self.palette) == 0:
+            raise ValueError("Palette is empty")
+
+        self.metric = metric
+        self.candidates = candidates
+        self.exact = exact
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.tree = cKDTree(self.palette)
+        if metric == "ciede2000":
+            # CIEDE2000 weighs lightness differences several times more than
+            # a, b differences, so its tree scales L: the search region is
+            # then closer to a ball. Any weight is exact (see _ciede2000_bound),
+            # the weight only changes the number of candidates
+            self._max_chroma = np.hypot(self.palette[:, 1], self.palette[:, 2]).max()
+            self._max_lightness_offset = np.abs(self.palette[:, 0] - 50).max()
+            sl, s = self._ciede2000_scales(self.palette)
+            self._lightness_weight = float(np.median(s / sl))
+            self._scale = np.array([self._lightness_weight, 1.0, 1.0])
+            self._ciede2000_tree = cKDTree(self.palette * self._scale)
+
+    def __len__(self):
+        return len(self.palette)
+
+    def _chunks(self, lab):
+        lab = _lab(lab)
+        flat = lab.reshape(-1, 3)
+        for start in range(0, len(flat), self.chunk_size):
+            yield flat[start:start + self.chunk_size]
+
+    def _euclidean(self, queries, k):
+        dist, idx = self.tree.query(queries, k=k, workers=self.workers)
+        return dist.reshape(len(queries), k), idx.reshape(len(queries), k)
+
+    # SC of the query colors: an upper bound of dE76 / dE94
+    def _cie94_factor(self, queries):
+        return 1 + 0.045 * np.hypot(queries[:, 1], queries[:, 2])
+
+    def _ciede2000_scales(self, queries):
+        """
+        SL and S such that dE00^2 >= dL^2 / SL^2 + (da^2 + db^2) / S^2
+        between the query and any palette color.
+
+        dL' = dL and dC'^2 + dH'^2 = (1 + G)^2 da^2 + db^2 >= da^2 + db^2.
+        SL is largest at the largest mean lightness offset of the pair; SC
+        and SH (SH < SC) at the largest mean chroma C' <= (1 + G) * mean C;
+        the RT cross term takes at most |RT| / 2 of the chroma and hue terms.
+        """
+        offset = (np.abs(queries[:, 0] - 50) + self._max_lightness_offset) / 2
+        sl = 1 + 0.015 * offset ** 2 / np.sqrt(20 + offset ** 2)
+        c_mean = (np.hypot(queries[:, 1], queries[:, 2]) + self._max_chroma) / 2
+        c7 = c_mean ** 7
+        cp_mean = (1 + 0.5 * (1 - np.sqrt(c7 / (c7 + 25 ** 7)))) * c_mean
+        cp7 = cp_mean ** 7
+        rt = np.sin(np.radians(60)) * 2 * np.sqrt(cp7 / (cp7 + 25 ** 7))
+        sc = 1 + 0.045 * cp_mean
+        return sl, sc / np.sqrt(1 - rt / 2)
+
+    def _ciede2000_bound(self, queries):
+        """
+        M such that dE00 >= d / M between the query and any palette color,
+        where d is the distance in the CIEDE2000 tree (L scaled by
+        self._lightness_weight).
+        """
+        sl, s = self._ciede2000_scales(queries)
+        return np.maximum(self._lightness_weight * sl, s)
+
+    def _ciede2000_chunk(self, queries, k):
+        if not self.exact:
+            n_candidates = min(max(self.candidates, k), len(self.palette))
+            _, idx = self._euclidean(queries, n_candidates)
+            return _best_k(queries, self.palette, list(idx), k, "ciede2000")
+
+        # The nearest candidates in the CIEDE2000 tree bound the k-th best
+        # distance from above; the rest of the palette only needs a ball
+        # query where that bound reaches past the last candidate
+        scaled = queries * self._scale
+        n_candidates = min(max(self.candidates, k), len(self.palette))
+        tree_dist, idx = self._ciede2000_tree.query(scaled, k=n_candidates, workers=self.workers)
+        tree_dist = tree_dist.reshape(len(queries), n_candidates)
+        dist, best = _best_k(queries, self.palette, list(idx.reshape(len(queries), n_candidates)), k,
+                             "ciede2000")
+        if n_candidates == len(self.palette):
+            return dist, best
+        radius = dist[:, -1] * self._ciede2000_bound(queries) * (1 + 1e-9) + 1e-9
+        open_queries = np.flatnonzero(radius > tree_dist[:, -1])
+        for start in range(0, len(open_queries), _BALL_BLOCK):
+            rows = open_queries[start:start + _BALL_BLOCK]
+            candidates = self._ciede2000_tree.query_ball_point(scaled[rows], radius[rows], workers=self.workers)
+            dist[rows], best[rows] = _best_k(queries[rows], self.palette, candidates, k, "ciede2000")
+        return dist, best
+
+    def _query_chunk(self, queries, k):
+        if self.metric == "cie76":
+            return self._euclidean(queries, k)
+
+        if self.metric == "cie94":
+            # Any k palette colors bound the k-th best dE94 from above, and
+            # dE94 >= dE76 / SC, so the answer lies within that dE76 radius
+            _, idx = self._euclidean(queries, k)
+            worst = delta_e(queries[:, None, :], self.palette[idx], "cie94").max(axis=1)
+            radius = worst * self._cie94_factor(queries) * (1 + 1e-9) + 1e-9
+            candidates = self.tree.query_ball_point(queries, radius, workers=self.workers)
+            return _best_k(queries, self.palette, candidates, k, "cie94")
+
+        return self._ciede2000_chunk(queries, k)
+
+    def query(self, lab, k=1):
+        if not 1 <= k <= len(self.palette):
+            raise ValueError(f"k must be in [1; {len(self.palette)}], got {k}")
+        shape = np.shape(lab)[:-1]
+
+        parts = [self._query_chunk(chunk, k) for chunk in self._chunks(lab)]
+        if not parts:
+            return np.empty(shape + (k,)), np.empty(shape + (k,), dtype=np.intp)
+        dist = np.concatenate([p[0] for p in parts]).reshape(shape + (k,))
+        idx = np.concatenate([p[1] for p in parts]).astype(np.intp).reshape(shape + (k,))
+        return dist, idx
+
+    def query_radius(self, lab, r, ciede2000_factor=3.0):
+        """
+        Palette colors within distance r of each query. ciede2000_factor is
+        the Euclidean radius multiplier used with exact=False (may miss colors).
+        """
+        result = []
+        for queries in self._chunks(lab):
+            tree, points = self.tree, queries
+            if self.metric == "cie76":
+                radius = r
+            elif self.metric == "cie94":
+                radius = r * self._cie94_factor(queries) * (1 + 1e-9) + 1e-9
+            elif self.exact:
+                radius = r * self._ciede2000_bound(queries) * (1 + 1e-9) + 1e-9
+                tree, points = self._ciede2000_tree, queries * self._scale
+            else:
+                radius = r * ciede2000_factor
+            candidates = tree.query_ball_point(points, radius, workers=self.workers)
+            result.extend(_filter_radius(queries, self.palette, candidates, r, self.metric))
+        return result
+
+
+# -------------------- Brute-force reference -------------------
+
+def brute_force_query(palette_lab, lab, k=1, metric="cie76", chunk_size=1024):
+    """Reference k-nearest search over the full distance matrix, chunk by chunk."""
+    palette = _lab(palette_lab).reshape(-1, 3)
+    flat = _lab(lab).reshape(-1, 3)
+    all_idx = np.arange(len(palette))
+
+    dists, indices = [], []
+    for start in range(0, len(flat), chunk_size):
+        queries = flat[start:start + chunk_size]
+        candidates = [all_idx] * len(queries)
+        d, i = _best_k(queries, palette, candidates, k, metric)
+        dists.append(d)
+        indices.append(i)
+
+    shape = np.shape(lab)[:-1] + (k,)
+    return np.concatenate(dists).reshape(shape), np.concatenate(indices).reshape(shape)
+
+
+def check_against_brute_force(index, lab, k=1, atol=1e-9):
+    """
+    Compares index.query() with brute_force_query() and reports mismatches.
+
+    A result counts as matching when the k distances agree within atol;
+    indices may differ only between palette colors at the same distance.
+    """
+    dist, idx = index.query(lab, k)
+    ref_dist, ref_idx = brute_force_query(index.palette, lab, k, index.metric)
+
+    dist_ok = np.all(np.abs(dist - ref_dist) <= atol, axis=-1)
+    idx_ok = np.all(idx == ref_idx, axis=-1)
+    return {
+        "metric": index.metric,
+        "queries": int(dist_ok.size),
+        "distance_mismatches": int(np.count_nonzero(~dist_ok)),
+        "index_mismatches": int(np.count_nonzero(~idx_ok)),
+        "exact": bool(dist_ok.all()),
+    }
+
+
+if __name__ == "__main__":
+    from color_batch import rgb_to_lab_batch
+
+    rng = np.random.default_rng(0)
+    palette = rgb_to_lab_batch(rng.integers(0, 256, (2000, 3)), rounding=False)
+    samples = rgb_to_lab_batch(rng.integers(0, 256, (5000, 3)), rounding=False)
+    for metric in METRICS:
+        print(check_against_brute_force(PaletteIndex(palette, metric), samples, k=3))
+    print(check_against_brute_force(PaletteIndex(palette, "ciede2000", exact=False), samples, k=3))
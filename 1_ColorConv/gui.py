@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk
 from color_logic import *
 from validation import *
+from palette import PalettePicker
 
 
 class ColorConverterApp:
@@ -10,6 +11,8 @@ class ColorConverterApp:
         self.root.title("Color Model Converter")
 
         self.updating = False  # Prevent recursive updates
+        self.pending_widget = None  # Last edited field, waiting for the idle update
+        self.update_job = None
 
         self.create_ui()
 
@@ -41,6 +44,10 @@ class ColorConverterApp:
         self.a = self.create_spinbox(frame, 2, 2, -128, 127, vcmd)
         self.b_lab = self.create_spinbox(frame, 2, 3, -128, 127, vcmd)
 
+        # Palette
+        self.palette = PalettePicker(frame, self.on_palette_pick)
+        self.palette.grid(row=3, column=0, columnspan=5, pady=(10, 0))
+
         # notification
         self.notification = ttk.Label(self.root, foreground="red")
         self.notification.grid(row=10, column=0, columnspan=5, pady=5)
@@ -73,8 +80,20 @@ class ColorConverterApp:
         if self.updating:
             return
 
-        widget = event.widget
-        if not widget.get():
+        # Bursts of events (held arrow key, fast spinning, palette drag) are
+        # coalesced: only the last edited field is handled, once per idle cycle
+        self.pending_widget = event.widget
+        if self.update_job is None:
+            self.update_job = self.root.after_idle(self.flush_update)
+
+    def on_palette_pick(self, r, g, b):
+        self.set_vals(self.r, r, self.g, g, self.b, b)
+        self.on_change(type("Event", (), {"widget": self.r}))
+
+    def flush_update(self):
+        self.update_job = None
+        widget, self.pending_widget = self.pending_widget, None
+        if widget is None or not widget.get():
             return
 
         self.updating = True
@@ -114,6 +133,8 @@ class ColorConverterApp:
         L, a, b_lab = rgb_to_lab(r, g, b)
         self.set_vals(self.L, L, self.a, a, self.b_lab, b_lab)
 
+        self.palette.show_color(r, g, b)
+
     def update_from_cmyk(self):
         c = safe_int(self.c.get())
         m = safe_int(self.m.get())
@@ -139,6 +160,8 @@ class ColorConverterApp:
         L, a, b_lab = rgb_to_lab(r, g, b)
         self.set_vals(self.L, L, self.a, a, self.b_lab, b_lab)
 
+        self.palette.show_color(r, g, b)
+
     def update_from_lab(self):
         if self.a.get() in "-" or \
                 self.b_lab.get() in "-":
@@ -166,6 +189,8 @@ class ColorConverterApp:
         c, m, y_c, k = rgb_to_cmyk(r, g, b)
         self.set_vals(self.c, c, self.m, m, self.y, y_c, self.k, k)
 
+        self.palette.show_color(r, g, b)
+
     # ---------------------- Helper ----------------------
 
     def notify(self, text, duration=2000):
@@ -181,5 +206,8 @@ class ColorConverterApp:
 
     def set_vals(self, *pairs):
         for entry, value in zip(pairs[::2], pairs[1::2]):
+            # Rewriting an unchanged field only costs a redraw and moves the cursor
+            if entry.get() == str(value):
+                continue
             entry.delete(0, tk.END)
             entry.insert(0, str(value))
\ No newline at end of file
@@ -0,0 +1,185 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import tifffile
+from numpy.lib.format import open_memmap
+
+from color_batch import convert_batch
+
+# Whole-image RGB -> Lab / CMYK / XYZ conversion for images larger than RAM.
+#
+#   python image_convert.py scan.tif scan_lab.tif --to lab
+#   python image_convert.py scan.tif scan_cmyk.tif --to cmyk --dtype uint8
+#
+# Input and output are memory-mapped and the image is processed in tiles
+# of --tile-pixels pixels on a thread pool (NumPy releases the GIL in its
+# array loops), so peak memory is about workers x tile size whatever the
+# image size. Memory-mappable inputs: .npy and uncompressed TIFF. Other
+# files (JPEG, PNG, compressed TIFF) have to be decoded whole with
+# tifffile or Pillow first; the conversion still runs tile by tile.
+#
+# Output is .npy or TIFF (BigTIFF). Channel encodings by --dtype:
+#   float32 - values as color_batch returns them (not rounded)
+#   uint16  - L 0..100 -> 0..65535, a/b -128..127 -> 0..65535 (x257),
+#             CMYK 0..100 -> 0..65535, XYZ x32768 (ICC 1.15 fixed point)
+#   uint8   - CMYK only, 0..100 -> 0..255 ink
+
+TARGETS = ("lab", "cmyk", "xyz")
+
+# (model, dtype) -> (offset, scale): stored = (value + offset) * scale
+ENCODINGS = {
+    ("lab", "float32"): ((0, 0, 0), (1, 1, 1)),
+    ("lab", "uint16"): ((0, 128, 128), (655.35, 257, 257)),
+    ("cmyk", "float32"): ((0, 0, 0, 0), (1, 1, 1, 1)),
+    ("cmyk", "uint16"): ((0, 0, 0, 0), (655.35,) * 4),
+    ("cmyk", "uint8"): ((0, 0, 0, 0), (2.55,) * 4),
+    ("xyz", "float32"): ((0, 0, 0), (1, 1, 1)),
+    ("xyz", "uint16"): ((0, 0, 0), (32768, 32768, 32768)),
+}
+
+DEFAULT_TILE_PIXELS = 1 << 20
+
+
+# ---------------------- Input / output ----------------------
+
+def open_input(path):
+    """Returns an (H, W) or (H, W, C) array, memory-mapped when the format allows it."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.load(path, mmap_mode="r")
+    if ext in (".tif", ".tiff"):
+        try:
+            return tifffile.memmap(path, mode="r")
+        except ValueError:
+            # Compressed or fragmented: no way around decoding it
+            return tifffile.imread(path)
+
+    from PIL import Image
+    with Image.open(path) as img:
+        if img.mode not in ("L", "RGB", "RGBA"):
+            img = img.convert("RGB")
+        return np.asarray(img)
+
+
+def create_output(path, shape, dtype, model):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    if ext in (".tif", ".tiff"):
+        photometric = "separated" if model == "cmyk" else "minisblack"
+        return tifffile.memmap(path, shape=shape, dtype=dtype, photometric=photometric,
+                               planarconfig="contig", bigtiff=True)
+    raise ValueError(f"Unsupported output format: {ext} (use .npy or .tif)")
+
+
+# ---------------------- Tiles ----------------------
+
+def tile_grid(height, width, tile_pixels):
+    """Yields (y0, y1, x0, x1) tiles of at most tile_pixels pixels, row-major."""
+    tile_w = max(1, min(width, tile_pixels))
+    tile_h = max(1, tile_pixels // tile_w)
+    for y0 in range(0, height, tile_h):
+        for x0 in range(0, width, tile_w):
+            yield y0, min(y0 + tile_h, height), x0, min(x0 + tile_w, width)
+
+
+def _rgb_tile(image, y0, y1, x0, x1):
+    tile = np.asarray(image[y0:y1, x0:x1])
+    if tile.ndim == 2:
+        tile = np.repeat(tile[..., None], 3, axis=-1)
+    tile = tile[..., :3]
+    if tile.dtype == np.uint16:
+        return tile / 257.0
+    if tile.dtype != np.uint8:
+        raise ValueError(f"Unsupported input dtype: {tile.dtype} (expected uint8 or uint16)")
+    return tile
+
+
+def _convert_tile(image, output, model, encoding, tile):
+    y0, y1, x0, x1 = tile
+    values = convert_batch(_rgb_tile(image, y0, y1, x0, x1), "rgb", model, rounding=False)
+
+    offset, scale = encoding
+    if any(offset) or any(v != 1 for v in scale):
+        values += offset
+        values *= scale
+    if np.issubdtype(output.dtype, np.integer):
+        info = np.iinfo(output.dtype)
+        np.rint(values, out=values)
+        np.clip(values, info.min, info.max, out=values)
+
+    output[y0:y1, x0:x1] = values
+    return (y1 - y0) * (x1 - x0)
+
+
+def convert_image(src_path, dst_path, model="lab", dtype="float32",
+                  tile_pixels=DEFAULT_TILE_PIXELS, workers=None, progress=None):
+    """
+    Converts an RGB image file to model and writes it to dst_path.
+    progress(done_pixels, total_pixels) is called after every tile.
+    Returns the number of converted pixels.
+    """
+    if model not in TARGETS:
+        raise ValueError(f"Unknown target model: {model}. Expected one of {TARGETS}")
+    if (model, dtype) not in ENCODINGS:
+        raise ValueError(f"dtype {dtype} is not supported for {model}")
+
+    image = open_input(src_path)
+    if image.ndim not in (2, 3):
+        raise ValueError(f"Unsupported image shape: {image.shape}")
+    height, width = image.shape[:2]
+    channels = 4 if model == "cmyk" else 3
+
+    output = create_output(dst_path, (height, width, channels), np.dtype(dtype), model)
+    encoding = ENCODINGS[(model, dtype)]
+    total = height * width
+    done = 0
+
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_convert_tile, image, output, model, encoding, tile)
+                   for tile in tile_grid(height, width, tile_pixels)]
+        for future in futures:
+            done += future.result()
+            if progress is not None:
+                progress(done, total)
+
+    output.flush()
+    del output
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert an RGB image to Lab, CMYK or XYZ tile by tile.")
+    parser.add_argument("input", help="RGB image (.npy or uncompressed TIFF are memory-mapped)")
+    parser.add_argument("output", help=".tif or .npy")
+    parser.add_argument("--to", dest="model", choices=TARGETS, default="lab")
+    parser.add_argument("--dtype", choices=("float32", "uint16", "uint8"), default="float32")
+    parser.add_argument("--tile-pixels", type=int, default=DEFAULT_TILE_PIXELS,
+                        help=f"pixels per tile (default: {DEFAULT_TILE_PIXELS})")
+    parser.add_argument("--workers", type=int, help="threads (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    def report(done, total):
+        print(f"\r{done / total:6.1%}", end="", file=sys.stderr, flush=True)
+
+    try:
+        pixels = convert_image(args.input, args.output, args.model, args.dtype,
+                               args.tile_pixels, args.workers, report)
+    except (OSError, ValueError) as e:
+        print(f"\nerror: {e}", file=sys.stderr)
+        return 1
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{pixels} px in {elapsed:.1f} s ({pixels / elapsed / 1e6:.1f} Mpx/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,14 @@
-from gui import ColorConverterApp
-import tkinter as tk
+import sys
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Any arguments -> headless batch conversion, see cli.py
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
+    from gui import ColorConverterApp
+    import tkinter as tk
+
     root = tk.Tk()
     app = ColorConverterApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
@@ -0,0 +1,98 @@
+import colorsys
+import tkinter as tk
+
+# Palette with continuous drag picking.
+#
+# Field layout: hue runs left to right, the top half goes from white to
+# the pure hue and the bottom half from the pure hue to black.
+# The field is computed once into a list of RGB rows and drawn as one
+# PhotoImage. Dragging only moves the marker and recolors the swatch, so
+# the image itself is never redrawn.
+
+
+def build_field(width, height):
+    """Returns height rows of width (r, g, b) tuples."""
+    half = height / 2
+    rows = []
+    for y in range(height):
+        if y < half:
+            s, v = y / half, 1.0
+        else:
+            s, v = 1.0, 1 - (y - half) / half
+        row = []
+        for x in range(width):
+            r, g, b = colorsys.hsv_to_rgb(x / width, s, v)
+            row.append((round(r * 255), round(g * 255), round(b * 255)))
+        rows.append(row)
+    return rows
+
+
+def to_hex(r, g, b):
+    return f"#{r:02x}{g:02x}{b:02x}"
+
+
+class PalettePicker:
+    def __init__(self, parent, on_pick, width=360, height=120, swatch_size=40):
+        self.on_pick = on_pick
+        self.width = width
+        self.height = height
+        self.field = build_field(width, height)
+        self._picked = None
+        self._swatch_color = None
+
+        self.canvas = tk.Canvas(parent, width=width + swatch_size + 10, height=height,
+                                highlightthickness=0)
+
+        self.image = tk.PhotoImage(width=width, height=height)
+        self.image.put(" ".join(
+            "{" + " ".join(to_hex(*rgb) for rgb in row) + "}" for row in self.field
+        ))
+        self.canvas.create_image(0, 0, image=self.image, anchor="nw")
+
+        self.swatch = self.canvas.create_rectangle(
+            width + 10, 0, width + 10 + swatch_size, swatch_size, fill="#000000", outline="black"
+        )
+        self.marker = self.canvas.create_oval(0, 0, 0, 0, outline="white", width=2)
+        self.move_marker(0, height - 1)
+
+        self.canvas.bind("<ButtonPress-1>", self.on_drag)
+        self.canvas.bind("<B1-Motion>", self.on_drag)
+
+    def grid(self, **kwargs):
+        self.canvas.grid(**kwargs)
+
+    # ---------------------- Events ----------------------
+
+    def on_drag(self, event):
+        x = min(max(event.x, 0), self.width - 1)
+        y = min(max(event.y, 0), self.height - 1)
+        self.move_marker(x, y)
+        self._picked = self.field[y][x]
+        self.on_pick(*self._picked)
+
+    # ---------------------- Drawing ----------------------
+
+    def move_marker(self, x, y, radius=5):
+        self.canvas.coords(self.marker, x - radius, y - radius, x + radius, y + radius)
+
+    def show_color(self, r, g, b):
+        """Shows the current color; moves the marker unless it came from a drag."""
+        color = to_hex(r, g, b)
+        if color != self._swatch_color:
+            self._swatch_color = color
+            self.canvas.itemconfig(self.swatch, fill=color)
+
+        if (r, g, b) != self._picked:
+            self._picked = None
+            self.move_marker(*self.position_of(r, g, b))
+
+    def position_of(self, r, g, b):
+        """Approximate field position of a color (exact for colors on the field)."""
+        h, s, v = colorsys.rgb_to_hsv(r / 255, g / 255, b / 255)
+        half = self.height / 2
+        x = min(round(h * self.width), self.width - 1)
+        if v >= s:
+            y = s * half
+        else:
+            y = half + (1 - v) * half
+        return x, min(round(y), self.height - 1)
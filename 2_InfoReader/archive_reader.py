@@ -0,0 +1,336 @@
+import io
+import lzma
+import os
+import posixpath
+import tarfile
+import threading
+import zipfile
+import zlib
+from collections import OrderedDict, namedtuple
+
+from PIL import Image, UnidentifiedImageError
+
+from file_walker import SUPPORTED_EXTENSIONS, _matches
+from header_reader import SMALL_FILE_SIZE, read_header
+from image_utils import READ_ERRORS
+from records import ImageRecord
+
+# Изображения внутри архивов ZIP и TAR без распаковки на диск.
+#
+# Архив считается виртуальной папкой: файл "photo.jpg" из "a.zip" получает
+# путь "a.zip!/photo.jpg" (member_path). Из каждого члена архива читается
+# только начало (HEADER_SIZE байт, потоковой распаковкой) и разбирается
+# header_reader'ом; целиком член распаковывается, только если заголовок не
+# разобран и нужен Pillow.
+#
+# В ZIP и несжатом TAR члены доступны в любом порядке, поэтому они читаются
+# в пуле извлечения (read_member_record): ZIP - через общий открытый
+# ZipFile, TAR - прямым чтением по смещению данных члена. Сжатый TAR
+# (.tar.gz, .tar.bz2, .tar.xz) читается только подряд, и его члены
+# разбираются по ходу чтения потока (read_stream_record).
+#
+# Чтение по запросу (member_stat, open_member - расширенные поля, хэши)
+# берет члены TAR из оглавления архива (имя -> TarInfo), которое строится
+# одним проходом и хранится, пока архив не изменился. Член сжатого TAR
+# все равно требует распаковки архива до него, поэтому много членов
+# одного такого архива читаются одним проходом (stream_members).
+#
+# Ключ кэша метаданных для члена архива - его размер, mtime и inode самого
+# архива (MemberStat): если архив изменился, все его члены читаются заново.
+
+ARCHIVE_EXTENSIONS = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Архивы, члены которых можно читать независимо (в пуле)
+RANDOM_ACCESS_EXTENSIONS = (".zip", ".tar")
+
+SEPARATOR = "!"
+
+# Сколько начальных байт члена читается для разбора заголовка
+HEADER_SIZE = SMALL_FILE_SIZE
+
+# Сколько открытых ZipFile и оглавлений TAR хранить для чтения членов
+ZIP_CACHE_SIZE = 8
+TAR_INDEX_CACHE_SIZE = 8
+
+# Ошибки чтения архива или его члена
+ARCHIVE_ERRORS = (OSError, EOFError, RuntimeError, NotImplementedError, zipfile.BadZipFile,
+                  tarfile.TarError, zlib.error, lzma.LZMAError)
+
+# Член архива: виртуальный путь, путь архива, имя внутри архива, смещение
+# данных (несжатый TAR, иначе None) и размер после распаковки
+ArchiveMember = namedtuple("ArchiveMember", "path archive name offset size")
+
+# Замена os.stat_result для кэша метаданных
+MemberStat = namedtuple("MemberStat", "st_size st_mtime_ns st_ino")
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def is_stream_archive(path):
+    """Сжатый TAR: члены читаются только подряд."""
+    return is_archive(path) and not path.lower().endswith(RANDOM_ACCESS_EXTENSIONS)
+
+
+def member_path(archive, name):
+    """Виртуальный путь члена name архива archive."""
+    return f"{archive}{SEPARATOR}/{name}"
+
+
+def split_member_path(path):
+    """(путь архива, имя члена) для виртуального пути или None для обычного файла."""
+    start = 0
+    while True:
+        i = path.find(SEPARATOR, start)
+        if i < 0:
+            return None
+        # После abspath (ключи кэша) разделителем может стать os.sep
+        if path[i + 1:i + 2] in ("/", os.sep) and is_archive(path[:i]):
+            return path[:i], path[i + 2:]
+        start = i + 1
+
+
+def _selected(name, include, exclude, extensions):
+    """Проходит ли член архива по маскам и расширениям (как в file_walker)."""
+    parts = name.lower().split("/")
+    if exclude and any(_matches(part, exclude) for part in parts):
+        return False
+    if include and not _matches(parts[-1], include):
+        return False
+    return parts[-1].endswith(extensions)
+
+
+# ---------------------- Open archives ----------------------
+
+_zip_files = OrderedDict()
+_archives_lock = threading.Lock()
+
+
+def _open_zip(archive):
+    """
+    Общий ZipFile архива. Чтение разных членов одного ZipFile из нескольких
+    потоков безопасно, а оглавление разбирается один раз на архив.
+    """
+    with _archives_lock:
+        zf = _zip_files.get(archive)
+        if zf is not None:
+            _zip_files.move_to_end(archive)
+            return zf
+    zf = zipfile.ZipFile(archive)
+    with _archives_lock:
+        _zip_files[archive] = zf
+        while len(_zip_files) > ZIP_CACHE_SIZE:
+            # Не закрываем явно: вытесненный ZipFile может еще читаться
+            # другим потоком и закроется при удалении последней ссылки
+            _zip_files.popitem(last=False)
+    return zf
+
+
+_tar_indexes = OrderedDict()
+
+
+def _tar_index(archive):
+    """
+    Оглавление TAR (имя члена -> TarInfo). Хранится для последних
+    TAR_INDEX_CACHE_SIZE архивов и строится заново, если у архива
+    изменились размер, mtime или inode.
+    """
+    st = os.stat(archive)
+    key = (st.st_size, st.st_mtime_ns, st.st_ino)
+    with _archives_lock:
+        cached = _tar_indexes.get(archive)
+        if cached is not None and cached[0] == key:
+            _tar_indexes.move_to_end(archive)
+            return cached[1]
+    random_access = archive.lower().endswith(RANDOM_ACCESS_EXTENSIONS)
+    with tarfile.open(archive, "r:" if random_access else "r|*") as tar:
+        # Как в tarfile.getmember: при повторе имени действует последний член
+        index = {info.name: info for info in tar}
+    with _archives_lock:
+        _tar_indexes[archive] = (key, index)
+        while len(_tar_indexes) > TAR_INDEX_CACHE_SIZE:
+            _tar_indexes.popitem(last=False)
+    return index
+
+
+def close_archives():
+    """Забывает открытые ZipFile и оглавления TAR (после сканирования)."""
+    with _archives_lock:
+        _zip_files.clear()
+        _tar_indexes.clear()
+
+
+# ---------------------- Listing ----------------------
+
+def iter_members(archive, archive_stat=None, include=(), exclude=(), extensions=SUPPORTED_EXTENSIONS):
+    """
+    Генератор членов архива с поддерживаемыми расширениями.
+
+    Args:
+        archive: Путь к архиву.
+        archive_stat: os.stat архива для ключей кэша (None - без кэша).
+        include: Маски имен файлов для отбора (пусто - все файлы).
+        exclude: Маски имен файлов и папок внутри архива, которые пропускаются.
+        extensions: Поддерживаемые расширения (с точкой, в нижнем регистре).
+
+    Yields:
+        (ArchiveMember, MemberStat или None, поток). Поток - файл с данными
+        члена для сжатого TAR (действителен до следующего члена), иначе None:
+        такие члены читаются read_member_record.
+    """
+    include = [p.lower() for p in include]
+    exclude = [p.lower() for p in exclude]
+    extensions = tuple(ext.lower() for ext in extensions)
+
+    def stat(size):
+        if archive_stat is None:
+            return None
+        return MemberStat(size, archive_stat.st_mtime_ns, archive_stat.st_ino)
+
+    if archive.lower().endswith(".zip"):
+        for info in _open_zip(archive).infolist():
+            if not info.is_dir() and _selected(info.filename, include, exclude, extensions):
+                member = ArchiveMember(member_path(archive, info.filename), archive, info.filename,
+                                       None, info.file_size)
+                yield member, stat(info.file_size), None
+        return
+
+    random_access = archive.lower().endswith(RANDOM_ACCESS_EXTENSIONS)
+    with tarfile.open(archive, "r:" if random_access else "r|*") as tar:
+        while True:
+            info = tar.next()
+            if info is None:
+                break
+            # Заголовки членов не накапливаются в памяти (tar.members)
+            tar.members = []
+            if not info.isfile() or not _selected(info.name, include, exclude, extensions):
+                continue
+            member = ArchiveMember(member_path(archive, info.name), archive, info.name,
+                                   info.offset_data if random_access and not info.issparse() else None,
+                                   info.size)
+            if random_access and member.offset is not None:
+                yield member, stat(info.size), None
+            else:
+                yield member, stat(info.size), tar.extractfile(info)
+
+
+# ---------------------- Reading ----------------------
+
+def _record(name, data, size, reopen):
+    """
+    ImageRecord по начальным байтам data. Если заголовок не разобран,
+    reopen(data) должна вернуть файл со всем членом для Pillow.
+    """
+    filename = posixpath.basename(name)
+    try:
+        header = read_header(data, size) if data else None
+        if header is not None:
+            return ImageRecord.from_image(filename, header["format"], header["width"], header["height"],
+                                          header["mode"], header["info"])
+        with reopen(data) as f, Image.open(f) as img:
+            return ImageRecord.from_image(filename, img.format, img.width, img.height, img.mode, img.info)
+    except UnidentifiedImageError:
+        # Pillow называет в сообщении объект файла, а не член архива
+        return ImageRecord.from_error(filename, f"cannot identify image file '{name}'")
+    except ARCHIVE_ERRORS + READ_ERRORS as e:
+        return ImageRecord.from_error(filename, e)
+
+
+def read_member_record(member):
+    """ImageRecord члена ZIP или несжатого TAR (функция модуля - для пула процессов)."""
+    try:
+        if member.offset is None:
+            zf = _open_zip(member.archive)
+            with zf.open(member.name) as f:
+                data = f.read(HEADER_SIZE)
+            return _record(member.name, data, member.size, lambda data: zf.open(member.name))
+
+        with open(member.archive, "rb") as f:
+            f.seek(member.offset)
+            data = f.read(min(HEADER_SIZE, member.size))
+
+            def reopen(data):
+                f.seek(member.offset)
+                return io.BytesIO(f.read(member.size))
+
+            return _record(member.name, data, member.size, reopen)
+    except ARCHIVE_ERRORS as e:
+        return ImageRecord.from_error(posixpath.basename(member.name), e)
+
+
+def _member_info(path):
+    """(путь архива, ZipInfo или TarInfo) члена по виртуальному пути. KeyError, если члена нет."""
+    archive, name = split_member_path(path)
+    if archive.lower().endswith(".zip"):
+        return archive, _open_zip(archive).getinfo(name)
+    return archive, _tar_index(archive)[name]
+
+
+def member_stat(path):
+    """MemberStat члена архива по виртуальному пути (как в iter_members)."""
+    archive, info = _member_info(path)
+    archive_stat = os.stat(archive)
+    size = info.file_size if isinstance(info, zipfile.ZipInfo) else info.size
+    return MemberStat(size, archive_stat.st_mtime_ns, archive_stat.st_ino)
+
+
+def open_member(path):
+    """
+    Файл в памяти со всем членом архива по виртуальному пути (для чтения
+    по запросу, не для сканирования). KeyError, если члена нет.
+    """
+    archive, info = _member_info(path)
+    if isinstance(info, zipfile.ZipInfo):
+        with _open_zip(archive).open(info) as f:
+            return io.BytesIO(f.read())
+    if not info.isfile():
+        raise KeyError(info.name)
+    if not is_stream_archive(archive) and not info.issparse():
+        with open(archive, "rb") as f:
+            f.seek(info.offset_data)
+            return io.BytesIO(f.read(info.size))
+    # Сжатый TAR: распаковка до члена (много членов - stream_members)
+    with tarfile.open(archive) as tar:
+        return io.BytesIO(tar.extractfile(info).read())
+
+
+def stream_members(archive, paths):
+    """
+    Генератор (виртуальный путь, файл в памяти) для членов paths сжатого
+    TAR - за один проход по архиву, в порядке членов в архиве. Членов,
+    которых нет в архиве, в результате нет.
+    """
+    names = {split_member_path(path)[1]: path for path in paths}
+    with tarfile.open(archive, "r|*") as tar:
+        while names:
+            info = tar.next()
+            if info is None:
+                break
+            tar.members = []
+            path = names.pop(info.name, None) if info.isfile() else None
+            if path is not None:
+                yield path, io.BytesIO(tar.extractfile(info).read())
+
+
+def group_stream_members(paths):
+    """
+    Делит пути на члены сжатых TAR (словарь архив -> пути, для
+    stream_members) и остальные пути (список).
+    """
+    streamed, other = {}, []
+    for path in paths:
+        parts = split_member_path(path)
+        if parts is not None and is_stream_archive(parts[0]):
+            streamed.setdefault(parts[0], []).append(path)
+        else:
+            other.append(path)
+    return streamed, other
+
+
+def read_stream_record(member, stream):
+    """ImageRecord члена сжатого TAR из потока iter_members."""
+    try:
+        data = stream.read(HEADER_SIZE)
+    except ARCHIVE_ERRORS as e:
+        return ImageRecord.from_error(posixpath.basename(member.name), e)
+    return _record(member.name, data, member.size, lambda data: io.BytesIO(data + stream.read()))
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import PIL
+from PIL import Image
+
+from corpus import generate_corpus, load_manifest
+from extended_fields import read_extended
+from extractor import DEFAULT_WORKERS
+from header_reader import read_file_header
+from image_utils import READ_ERRORS, read_image_record
+from metadata_cache import MetadataCache
+from progress import format_key
+from scanner import Scanner
+
+# Замеры скорости чтения метаданных, результат - JSON:
+#
+#   python benchmark.py                          набор из corpus.py во временной папке
+#   python benchmark.py --corpus /tmp/corpus     готовый набор (или любая папка)
+#   python benchmark.py --quick -o new.json      меньший набор, один проход
+#   python benchmark.py --compare old.json       также печатать изменения от old.json
+#
+# Задержка измеряется для каждого файла отдельно (лучшее из --repeat) и
+# сводится в процентили по группам - форматам и видам испорченных файлов
+# из манифеста corpus.py (для папки без манифеста - по расширению).
+# Читатели: record (read_image_record, как при сканировании), header
+# (только разбор заголовка, None для нераспознанных), pillow (Image.open)
+# и extended (все расширенные поля extended_fields - цена чтения по запросу).
+#
+# Сквозная скорость - Scanner по всей папке: последовательно, в пуле
+# потоков, в пуле процессов и повторно с заполненным кэшем метаданных.
+# Файлы набора после генерации и первого прохода лежат в кэше ОС, так что
+# замеры показывают стоимость разбора, а не чтения с диска.
+
+
+# ---------------------- Latency ----------------------
+
+def _read_pillow(path):
+    try:
+        with Image.open(path) as img:
+            return img.format, img.size, img.mode, img.info.get("dpi")
+    except READ_ERRORS:
+        return None
+
+
+READERS = {
+    "record": read_image_record,
+    "header": read_file_header,
+    "pillow": _read_pillow,
+    "extended": read_extended,
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def _list_files(directory, manifest):
+    if manifest is not None:
+        names = sorted(manifest)
+    else:
+        names = sorted(name for name in os.listdir(directory)
+                       if os.path.isfile(os.path.join(directory, name)))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _group(path, manifest):
+    if manifest is not None:
+        return manifest[os.path.basename(path)]["group"]
+    return format_key(path)
+
+
+def _latency_stats(seconds):
+    seconds = np.asarray(seconds)
+    stats = {"files": len(seconds)}
+    for p, value in zip(PERCENTILES, np.percentile(seconds, PERCENTILES)):
+        stats[f"p{p}_ms"] = value * 1000
+    stats["max_ms"] = seconds.max() * 1000
+    stats["mean_ms"] = seconds.mean() * 1000
+    return stats
+
+
+def measure_latency(paths, groups, repeat):
+    """Процентили задержки каждого читателя по группам файлов (и по всем вместе)."""
+    results = []
+    for reader, func in READERS.items():
+        by_group = {}
+        for path, group in zip(paths, groups):
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func(path)
+                best = min(best, time.perf_counter() - start)
+            by_group.setdefault(group, []).append(best)
+
+        by_group["(все)"] = [s for times in by_group.values() for s in times]
+        for group, seconds in sorted(by_group.items()):
+            results.append({"reader": reader, "group": group, **_latency_stats(seconds)})
+    return results
+
+
+# ---------------------- Scan throughput ----------------------
+
+def _scan_configs(workers):
+    # Хотя бы два процесса: с max_workers=1 пул не создается
+    processes = max(2, min(workers, os.cpu_count() or 1))
+    return [
+        # (имя, параметры Scanner, с заполненным кэшем)
+        ("sequential", {"max_workers": 1}, False),
+        ("threads", {"max_workers": workers}, False),
+        ("processes", {"max_workers": processes, "use_processes": True}, False),
+        ("threads-cached", {"max_workers": workers}, True),
+    ]
+
+
+def _scan_once(directory, params, cache):
+    errors = 0
+
+    def emit(path, st, record):
+        nonlocal errors
+        errors += record.error is not None
+
+    scanner = Scanner([directory], **params)
+    start = time.perf_counter()
+    scanner.run(emit, cache)
+    seconds = time.perf_counter() - start
+    return seconds, scanner.progress.files, scanner.progress.bytes, errors
+
+
+def measure_scan(directory, workers, repeat):
+    """Сквозная скорость сканирования папки Scanner'ом в разных режимах."""
+    results = []
+    for name, params, cached in _scan_configs(workers):
+        cache = None
+        if cached:
+            cache = MetadataCache(":memory:")
+            _scan_once(directory, params, cache)
+
+        best = None
+        for _ in range(repeat):
+            run = _scan_once(directory, params, cache)
+            if best is None or run[0] < best[0]:
+                best = run
+        if cache is not None:
+            cache.close()
+
+        seconds, files, size, errors = best
+        results.append({
+            "mode": name,
+            "workers": params["max_workers"],
+            "files": files,
+            "errors": errors,
+            "bytes": size,
+            "seconds": seconds,
+            "files_per_second": files / seconds if seconds else None,
+            "bytes_per_second": size / seconds if seconds else None,
+        })
+    return results
+
+
+# ---------------------- Report ----------------------
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def run_benchmark(directory, repeat=3, workers=DEFAULT_WORKERS, corpus=None):
+    manifest = load_manifest(directory)
+    paths = _list_files(directory, manifest)
+    groups = [_group(path, manifest) for path in paths]
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pillow": PIL.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "corpus": corpus or {"directory": directory},
+        "files": len(paths),
+        "bytes": sum(os.path.getsize(path) for path in paths),
+        "latency": measure_latency(paths, groups, repeat),
+        "scan": measure_scan(directory, workers, repeat),
+    }
+
+
+def compare(report, baseline):
+    """Изменения относительно прошлого отчета в виде текста."""
+    lines = []
+    old = {(r["reader"], r["group"]): r for r in baseline.get("latency", [])}
+    for r in report["latency"]:
+        prev = old.get((r["reader"], r["group"]))
+        if prev and prev["p50_ms"] and prev["p90_ms"]:
+            p50, p90 = r["p50_ms"] / prev["p50_ms"], r["p90_ms"] / prev["p90_ms"]
+            lines.append(f"{r['reader']:<8} {r['group']:<12} p50 {r['p50_ms']:8.3f} ms x{p50:.2f}"
+                         f"  p90 {r['p90_ms']:8.3f} ms x{p90:.2f}")
+
+    old = {r["mode"]: r for r in baseline.get("scan", [])}
+    for r in report["scan"]:
+        prev = old.get(r["mode"])
+        if prev and prev["files_per_second"] and r["files_per_second"]:
+            ratio = r["files_per_second"] / prev["files_per_second"]
+            lines.append(f"scan {r['mode']:<15} {r['files_per_second']:>10,.0f} файлов/с  x{ratio:.2f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры скорости чтения метаданных, вывод в JSON.")
+    parser.add_argument("--corpus", metavar="DIR", help="папка с изображениями (по умолчанию: новый набор corpus.py)")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="размер нового набора (по умолчанию: 1000)")
+    parser.add_argument("--seed", type=int, default=0, help="seed нового набора")
+    parser.add_argument("--quick", action="store_true", help="набор из 200 файлов, один проход")
+    parser.add_argument("--repeat", type=int, default=3, help="проходов на замер (берется лучший)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"обработчиков в пуле потоков (по умолчанию: {DEFAULT_WORKERS})")
+    parser.add_argument("-o", "--output", help="записать JSON сюда вместо stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="прошлый отчет JSON для сравнения")
+    args = parser.parse_args(argv)
+
+    count, repeat = (200, 1) if args.quick else (args.count, args.repeat)
+    if args.corpus:
+        report = run_benchmark(args.corpus, repeat, args.workers)
+    else:
+        with tempfile.TemporaryDirectory(prefix="inforeader-corpus-") as directory:
+            generate_corpus(directory, count, args.seed)
+            report = run_benchmark(directory, repeat, args.workers, {"count": count, "seed": args.seed})
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+
+from extractor import DEFAULT_WORKERS
+from metadata_cache import FailSafeCache, MetadataCache
+from records import display_depth
+from scanner import Scanner
+
+# Консольное сканирование без GUI и без дисплея (например, из cron):
+#
+#   python cli.py /data/photos -r -o inventory.jsonl
+#   python cli.py /mnt/a /mnt/b --format csv > inventory.csv
+#   python cli.py /deliveries --archives     изображения внутри ZIP/TAR
+#
+# Используется тот же обход, кэш и параллельное извлечение, что и в GUI
+# (scanner.Scanner). Записи пишутся по одной на файл сразу по готовности,
+# итог (файлы, ошибки, байты, время) печатается в stderr.
+#
+# С --progress в stderr пишется ход сканирования - строки JSON со снимками
+# progress.ScanProgress (скорость, ETA, время по форматам, самые медленные
+# файлы), последняя с "done": true.
+#
+# Поля записи: path, bytes, filename, format, width, height, dpi_x, dpi_y,
+# mode, depth, compression, error. Размер и DPI - числа (dpi_* пустые, если
+# не указаны), error - текст ошибки чтения или пусто.
+
+FORMATS = ("jsonl", "csv")
+FIELDS = ("path", "bytes", "filename", "format", "width", "height", "dpi_x", "dpi_y",
+          "mode", "depth", "compression", "error")
+_EXTENSIONS = {".jsonl": "jsonl", ".json": "jsonl", ".csv": "csv"}
+
+
+def make_record(path, st, image):
+    """Словарь полей FIELDS для records.ImageRecord image."""
+    values = {
+        "path": path,
+        "bytes": st.st_size if st is not None else None,
+        "depth": display_depth(image.mode) if image.error is None else None,
+    }
+    return {name: values[name] if name in values else getattr(image, name) for name in FIELDS}
+
+
+class RecordWriter:
+    """Пишет записи в JSONL или CSV, по одной строке на файл."""
+
+    def __init__(self, output, fmt):
+        self.output = output
+        if fmt == "csv":
+            self._csv = csv.DictWriter(output, fieldnames=FIELDS, extrasaction="ignore")
+            self._csv.writeheader()
+        else:
+            self._csv = None
+
+    def write(self, path, st, image):
+        record = make_record(path, st, image)
+        if self._csv is not None:
+            self._csv.writerow(record)
+        else:
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def _guess_format(path, default):
+    if path:
+        return _EXTENSIONS.get(os.path.splitext(path)[1].lower(), default)
+    return default
+
+
+def format_summary(progress, complete=True):
+    elapsed = progress.elapsed()
+    rate = progress.files / elapsed if elapsed else 0.0
+    status = "" if complete else " (прервано)"
+    return (f"Файлов: {progress.files}, ошибок: {progress.errors}, из кэша: {progress.cached}, "
+            f"байт: {progress.bytes}, время: {elapsed:.1f} с ({rate:.0f} файлов/с){status}")
+
+
+def _print_progress(snapshot):
+    print(json.dumps(snapshot, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Сканирование папок с изображениями без GUI.")
+    parser.add_argument("roots", nargs="+", help="папки для сканирования")
+    parser.add_argument("-o", "--output", help="файл результата (по умолчанию: stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="по умолчанию: по расширению файла, иначе jsonl")
+    parser.add_argument("-r", "--recursive", action="store_true", help="обходить подпапки")
+    parser.add_argument("--max-depth", type=int, help="предел глубины подпапок")
+    parser.add_argument("--include", action="append", default=[], help="маска имен файлов (можно повторять)")
+    parser.add_argument("--exclude", action="append", default=[], help="маска имен файлов и папок для пропуска")
+    parser.add_argument("--detect-content", action="store_true",
+                        help="искать изображения с любым расширением по сигнатуре")
+    parser.add_argument("--archives", action="store_true",
+                        help="читать изображения внутри архивов ZIP/TAR (путь: архив!/имя)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"параллельных обработчиков (по умолчанию: {DEFAULT_WORKERS})")
+    parser.add_argument("--processes", action="store_true", help="пул процессов вместо потоков")
+    parser.add_argument("--unordered", action="store_true", help="писать записи по готовности")
+    parser.add_argument("--cache", help="файл кэша метаданных (по умолчанию: ~/.cache/inforeader)")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш")
+    parser.add_argument("--precount", action="store_true", help="пересчитать файлы заранее (точный ETA)")
+    parser.add_argument("--progress", action="store_true", help="писать ход сканирования в stderr (JSON)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать итог")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    for root in args.roots:
+        if not os.path.isdir(root):
+            print(f"Некорректный путь к папке: {root}", file=sys.stderr)
+            return 1
+
+    scanner = Scanner(
+        args.roots,
+        max_workers=args.workers,
+        ordered=not args.unordered,
+        use_processes=args.processes,
+        recursive=args.recursive,
+        max_depth=args.max_depth,
+        include=args.include,
+        exclude=args.exclude,
+        detect_by_content=args.detect_content,
+        scan_archives=args.archives,
+        precount=args.precount,
+    )
+
+    cache = None
+    if not args.no_cache:
+        try:
+            # Ошибка SQLite во время работы (база занята, диск заполнен) не прерывает ее
+            cache = FailSafeCache(MetadataCache(args.cache),
+                                  lambda e: print(f"Кэш метаданных отключен: {e}", file=sys.stderr))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Кэш метаданных недоступен: {e}", file=sys.stderr)
+
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    writer = RecordWriter(output, args.format or _guess_format(args.output, "jsonl"))
+    complete = False
+    try:
+        complete = scanner.run(writer.write, cache,
+                               onerror=lambda e: print(f"Папка пропущена: {e}", file=sys.stderr),
+                               on_progress=_print_progress if args.progress else None)
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # Потребитель закрыл канал (например, head): остаток вывода некуда писать
+        os.dup2(os.open(os.devnull, os.O_WRONLY), output.fileno())
+    finally:
+        if cache is not None:
+            cache.close()
+        if output is not sys.stdout:
+            output.close()
+
+    if not args.quiet:
+        print(format_summary(scanner.progress, complete), file=sys.stderr)
+    return 0 if complete else 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+import argparse
+import io
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+from PIL import Image, PngImagePlugin
+
+# Генератор тестового набора изображений для benchmark.py:
+#
+#   python corpus.py /tmp/corpus                     600 файлов
+#   python corpus.py /tmp/corpus -n 5000 --seed 3    другой набор
+#
+# Набор воспроизводим: при одних и тех же --count и --seed получаются одни
+# и те же файлы (при той же версии Pillow). Файлы - JPEG, PNG, GIF, TIFF,
+# BMP и PCX в разных режимах (1, L, P, RGB, RGBA, CMYK, I;16, F), с DPI и
+# без, с разным сжатием (прогрессивный JPEG, TIFF LZW/Deflate/PackBits/JPEG/
+# Group 4, BMP RLE8, ...), большими блоками EXIF/ICC/текста и размерами от
+# 1x1 до 3000x2000. Около десятой части набора - испорченные файлы:
+# обрезанные (в заголовке или в данных), с мусором после сигнатуры, пустые
+# и с чужим расширением.
+#
+# Варианты перебираются по кругу, так что при count >= len(VARIANTS) в
+# наборе есть каждый. Рядом с файлами пишется MANIFEST_NAME - группа
+# (формат или вид порчи) и вариант каждого файла, по нему benchmark.py
+# считает задержки по группам.
+
+MANIFEST_NAME = "corpus.json"
+
+# Размеры и их доли в наборе: в основном небольшие и средние изображения
+SIZES = ((1, 1), (16, 16), (37, 23), (320, 240), (640, 480), (1024, 768), (1920, 1080), (3000, 2000))
+SIZE_WEIGHTS = (1, 3, 3, 6, 6, 4, 2, 1)
+
+DPI_VALUES = (72, 96, 150, 300, 600)
+
+
+# ---------------------- Pictures ----------------------
+
+def _picture(rng, size, mode):
+    """Гладкое изображение (сжимается примерно как фотография) в режиме mode."""
+    tile = rng.integers(0, 256, (4, 4, 3), dtype=np.uint8)
+    img = Image.fromarray(tile, "RGB").resize(size, Image.BICUBIC)
+    if mode == "P":
+        return img.quantize(int(rng.choice((2, 16, 256))))
+    if mode == "I;16":
+        return Image.fromarray(np.asarray(img.convert("L"), dtype=np.uint16) * 257)
+    if mode == "RGBA":
+        img.putalpha(img.convert("L"))
+        return img
+    if mode == "LA":
+        gray = img.convert("L")
+        return Image.merge("LA", (gray, gray))
+    return img.convert(mode)
+
+
+def _dpi(rng):
+    x = int(rng.choice(DPI_VALUES))
+    # Иногда разное разрешение по осям
+    y = x if rng.random() < 0.8 else int(rng.choice(DPI_VALUES))
+    return x, y
+
+
+def _save(img, fmt, **params):
+    buf = io.BytesIO()
+    img.save(buf, fmt, **params)
+    return buf.getvalue()
+
+
+# ---------------------- Variants ----------------------
+
+def _icc_profile(description):
+    """Минимальный профиль ICC v2 с одним тегом desc (для поля "Профиль ICC")."""
+    text = description.encode("ascii") + b"\x00"
+    tag = b"desc" + bytes(4) + struct.pack(">I", len(text)) + text + bytes(12 + 67)
+    size = 128 + 4 + 12 + len(tag)
+    header = struct.pack(">I4sI4s4s4s", size, b"none", 0x02100000, b"mntr", b"RGB ", b"XYZ ")
+    header += bytes(128 - len(header))
+    return header + struct.pack(">I4sII", 1, b"desc", 144, len(tag)) + tag
+
+
+CAMERAS = (("Canon", "Canon EOS 5D Mark IV"), ("NIKON CORPORATION", "NIKON D850"), ("SONY", "ILCE-7M3"))
+
+
+def _jpeg(mode, progressive=False, dpi=False, exif_dpi=False, icc=0, exif_text=0):
+    def make(rng, size):
+        params = {"quality": int(rng.integers(50, 96)), "progressive": progressive}
+        if dpi:
+            params["dpi"] = _dpi(rng)
+        if exif_dpi or exif_text:
+            exif = Image.Exif()
+            if exif_dpi:
+                x, y = _dpi(rng)
+                exif[0x011A], exif[0x011B], exif[0x0128] = float(x), float(y), 2
+                # Камера и дата съемки (DateTimeOriginal во вложенном Exif IFD)
+                exif[0x010F], exif[0x0110] = CAMERAS[rng.integers(len(CAMERAS))]
+                day = int(rng.integers(1, 29))
+                exif.get_ifd(0x8769)[0x9003] = f"2023:{day % 12 + 1:02d}:{day:02d} 12:00:00"
+            if exif_text:
+                # ImageDescription: большой сегмент APP1 перед SOF
+                exif[0x010E] = "x" * exif_text
+            params["exif"] = exif.tobytes()
+        if icc:
+            # Профиль с описанием, а большой - случайные байты без тегов
+            params["icc_profile"] = _icc_profile("Corpus RGB") if icc < 1000 else rng.bytes(icc)
+        return _save(_picture(rng, size, mode), "JPEG", **params)
+    return make
+
+
+def _png(mode, dpi=False, bits=None, text=0, compress_level=6):
+    def make(rng, size):
+        params = {"compress_level": compress_level}
+        img = _picture(rng, size, mode)
+        if bits:
+            img = img.convert("P", palette=Image.ADAPTIVE, colors=1 << bits)
+            params["bits"] = bits
+        if dpi:
+            params["dpi"] = _dpi(rng)
+        if text:
+            info = PngImagePlugin.PngInfo()
+            info.add_text("Comment", "x" * text, zip=True)
+            params["pnginfo"] = info
+        return _save(img, "PNG", **params)
+    return make
+
+
+def _gif(mode, frames=1, transparency=False):
+    def make(rng, size):
+        img = _picture(rng, size, mode)
+        params = {}
+        if transparency and img.mode == "P":
+            params["transparency"] = 0
+        if frames > 1:
+            params["save_all"] = True
+            params["append_images"] = [_picture(rng, size, mode) for _ in range(frames - 1)]
+        return _save(img, "GIF", **params)
+    return make
+
+
+def _tiff(mode, compression=None, dpi=False, cm=False, pages=1, big_tiff=False):
+    def make(rng, size):
+        params = {}
+        if compression:
+            params["compression"] = compression
+        if dpi:
+            params["dpi"] = _dpi(rng)
+        if cm:
+            # Разрешение в пикселях на сантиметр
+            params["resolution"] = float(rng.integers(20, 120))
+            params["resolution_unit"] = 3
+        if big_tiff:
+            params["big_tiff"] = True
+        img = _picture(rng, size, mode)
+        if pages > 1:
+            params["save_all"] = True
+            params["append_images"] = [_picture(rng, size, mode) for _ in range(pages - 1)]
+        return _save(img, "TIFF", **params)
+    return make
+
+
+def _bmp(mode, dpi=False):
+    def make(rng, size):
+        params = {"dpi": _dpi(rng)} if dpi else {}
+        return _save(_picture(rng, size, mode), "BMP", **params)
+    return make
+
+
+def _bmp_rle8(rng, size):
+    """BMP со сжатием RLE8 (Pillow умеет только читать его, заголовок собирается здесь)."""
+    img = _picture(rng, size, "P")
+    width, height = img.size
+    pixels = np.asarray(img)
+    data = bytearray()
+    # Строки хранятся снизу вверх, каждая - пары (длина серии, индекс цвета)
+    for row in pixels[::-1]:
+        start = 0
+        changes = np.flatnonzero(np.diff(row)) + 1
+        for end in list(changes) + [width]:
+            value = int(row[start])
+            while end - start > 0:
+                run = min(255, end - start)
+                data += bytes((run, value))
+                start += run
+        data += b"\x00\x00"
+    data[-2:] = b"\x00\x01"
+
+    palette = img.getpalette()[:768]
+    palette += [0] * (768 - len(palette))
+    colors = b"".join(bytes((palette[i + 2], palette[i + 1], palette[i], 0)) for i in range(0, 768, 3))
+    offset = 14 + 40 + len(colors)
+    header = b"BM" + struct.pack("<IHHI", offset + len(data), 0, 0, offset)
+    info = struct.pack("<IiiHHIIiiII", 40, width, height, 1, 8, 1, len(data), 2835, 2835, 256, 0)
+    return header + info + colors + bytes(data)
+
+
+def _pcx(mode, dpi=False):
+    def make(rng, size):
+        params = {"dpi": _dpi(rng)} if dpi else {}
+        return _save(_picture(rng, size, mode), "PCX", **params)
+    return make
+
+
+# (группа, вариант, расширение, функция(rng, size) -> байты файла)
+VARIANTS = [
+    ("JPEG", "l", ".jpg", _jpeg("L")),
+    ("JPEG", "rgb", ".jpg", _jpeg("RGB")),
+    ("JPEG", "rgb-dpi", ".jpg", _jpeg("RGB", dpi=True)),
+    ("JPEG", "rgb-progressive", ".jpg", _jpeg("RGB", progressive=True)),
+    ("JPEG", "rgb-exif-dpi", ".jpg", _jpeg("RGB", exif_dpi=True)),
+    ("JPEG", "rgb-large-exif", ".jpg", _jpeg("RGB", exif_dpi=True, exif_text=30000)),
+    ("JPEG", "rgb-icc", ".jpg", _jpeg("RGB", icc=1)),
+    ("JPEG", "rgb-large-icc", ".jpg", _jpeg("RGB", dpi=True, icc=200000)),
+    ("JPEG", "cmyk", ".jpeg", _jpeg("CMYK", dpi=True)),
+    ("PNG", "1", ".png", _png("1")),
+    ("PNG", "l-dpi", ".png", _png("L", dpi=True)),
+    ("PNG", "la", ".png", _png("LA")),
+    ("PNG", "p", ".png", _png("P")),
+    ("PNG", "p-4bit", ".png", _png("RGB", bits=4)),
+    ("PNG", "rgb", ".png", _png("RGB")),
+    ("PNG", "rgb-dpi-stored", ".png", _png("RGB", dpi=True, compress_level=0)),
+    ("PNG", "rgba-text", ".png", _png("RGBA", text=20000)),
+    ("PNG", "i16", ".png", _png("I;16", dpi=True)),
+    ("GIF", "l", ".gif", _gif("L")),
+    ("GIF", "p", ".gif", _gif("P")),
+    ("GIF", "p-transparent", ".gif", _gif("P", transparency=True)),
+    ("GIF", "rgb-animated", ".gif", _gif("RGB", frames=3)),
+    ("TIFF", "1-group4", ".tif", _tiff("1", "group4")),
+    ("TIFF", "l-raw", ".tif", _tiff("L", dpi=True)),
+    ("TIFF", "p-packbits", ".tif", _tiff("P", "packbits")),
+    ("TIFF", "rgb-lzw", ".tif", _tiff("RGB", "tiff_lzw", dpi=True)),
+    ("TIFF", "rgb-deflate-cm", ".tiff", _tiff("RGB", "tiff_adobe_deflate", cm=True)),
+    ("TIFF", "rgb-jpeg", ".tif", _tiff("RGB", "jpeg")),
+    ("TIFF", "rgba-multipage", ".tif", _tiff("RGBA", "tiff_lzw", pages=3)),
+    ("TIFF", "cmyk", ".tif", _tiff("CMYK", dpi=True)),
+    ("TIFF", "i16-big-endian", ".tif", _tiff("I;16B")),
+    ("TIFF", "f", ".tif", _tiff("F")),
+    ("TIFF", "rgb-bigtiff", ".tif", _tiff("RGB", big_tiff=True)),
+    ("BMP", "1", ".bmp", _bmp("1")),
+    ("BMP", "l", ".bmp", _bmp("L", dpi=True)),
+    ("BMP", "p", ".bmp", _bmp("P")),
+    ("BMP", "p-rle8", ".bmp", _bmp_rle8),
+    ("BMP", "rgb", ".bmp", _bmp("RGB", dpi=True)),
+    ("BMP", "rgba", ".bmp", _bmp("RGBA")),
+    ("PCX", "1", ".pcx", _pcx("1")),
+    ("PCX", "l", ".pcx", _pcx("L")),
+    ("PCX", "p", ".pcx", _pcx("P", dpi=True)),
+    ("PCX", "rgb", ".pcx", _pcx("RGB")),
+]
+
+
+# ---------------------- Broken files ----------------------
+
+def _source(rng, size):
+    """Исправный файл случайного варианта: (вариант, расширение, байты)."""
+    _, name, ext, make = VARIANTS[rng.integers(len(VARIANTS))]
+    return name, ext, make(rng, size)
+
+
+def _truncated_header(rng, size):
+    name, ext, data = _source(rng, size)
+    return name, ext, data[:int(rng.integers(1, min(len(data), 64)))]
+
+
+def _truncated_data(rng, size):
+    name, ext, data = _source(rng, size)
+    return name, ext, data[:max(1, int(len(data) * rng.uniform(0.2, 0.95)))]
+
+
+def _corrupt(rng, size):
+    """Сигнатура формата сохранена, следующие байты заголовка - мусор."""
+    name, ext, data = _source(rng, size)
+    data = bytearray(data)
+    start = min(8, len(data))
+    end = min(len(data), start + int(rng.integers(16, 512)))
+    data[start:end] = rng.bytes(end - start)
+    return name, ext, bytes(data)
+
+
+def _empty(rng, size):
+    ext = VARIANTS[rng.integers(len(VARIANTS))][2]
+    return "empty", ext, b""
+
+
+def _mislabeled(rng, size):
+    """Исправный файл с расширением другого формата."""
+    name, ext, data = _source(rng, size)
+    others = sorted({v[2] for v in VARIANTS} - {ext})
+    return name, str(rng.choice(others)), data
+
+
+# (группа, функция(rng, size) -> (вариант-источник, расширение, байты))
+BROKEN_VARIANTS = [
+    ("truncated", _truncated_header),
+    ("truncated", _truncated_data),
+    ("corrupt", _corrupt),
+    ("empty", _empty),
+    ("mislabeled", _mislabeled),
+]
+
+# Каждый какой по счету файл набора - испорченный
+BROKEN_EVERY = 10
+
+
+# ---------------------- Corpus ----------------------
+
+def generate_corpus(directory, count=600, seed=0):
+    """
+    Записывает набор из count файлов в папку directory.
+
+    Args:
+        directory: Папка для набора (создается при необходимости).
+        count: Количество файлов.
+        seed: Начальное значение генератора случайных чисел.
+
+    Returns:
+        Манифест: словарь имя файла -> {"group", "variant", "bytes"}.
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    weights = np.array(SIZE_WEIGHTS, dtype=float) / sum(SIZE_WEIGHTS)
+    manifest = {}
+    valid = broken = 0
+
+    for i in range(count):
+        size = SIZES[rng.choice(len(SIZES), p=weights)]
+        if i % BROKEN_EVERY == BROKEN_EVERY - 1:
+            group, make = BROKEN_VARIANTS[broken % len(BROKEN_VARIANTS)]
+            broken += 1
+            source, ext, data = make(rng, size)
+            variant = f"{group}-{source}"
+        else:
+            group, variant, ext, make = VARIANTS[valid % len(VARIANTS)]
+            valid += 1
+            data = make(rng, size)
+
+        name = f"{i:05d}_{group.lower()}_{variant}{ext}"
+        with open(os.path.join(directory, name), "wb") as f:
+            f.write(data)
+        manifest[name] = {"group": group, "variant": variant, "bytes": len(data)}
+
+    with open(os.path.join(directory, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump({"count": count, "seed": seed, "files": manifest}, f, indent=1)
+    return manifest
+
+
+def load_manifest(directory):
+    """Манифест набора (словарь имя файла -> описание) или None, если его нет."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация тестового набора изображений.")
+    parser.add_argument("directory", help="папка для набора")
+    parser.add_argument("-n", "--count", type=int, default=600, help="количество файлов (по умолчанию: 600)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    manifest = generate_corpus(args.directory, args.count, args.seed)
+    total = sum(entry["bytes"] for entry in manifest.values())
+    print(f"Файлов: {len(manifest)}, байт: {total}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,532 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from itertools import combinations
+
+import numpy as np
+from PIL import Image
+
+from archive_reader import ARCHIVE_ERRORS, group_stream_members, is_stream_archive, split_member_path, stream_members
+from extended_fields import open_path
+from extractor import extract_metadata
+from image_utils import READ_ERRORS
+from metadata_cache import FailSafeCache, MetadataCache
+from scanner import Scanner
+
+# Поиск дубликатов и почти-дубликатов (пересохранения, уменьшенные копии,
+# другой формат) по перцептивным хэшам:
+#
+#   python duplicates.py /data/photos -r                      группы в stdout (JSONL)
+#   python duplicates.py /a /b -r --distance 6 -o dups.jsonl  строже порог
+#   python duplicates.py /archive -r --hash dhash --archives
+#
+# Файлы находятся и отбираются сканером InfoReader (scanner.Scanner, с кэшем
+# и архивами); нечитаемые файлы пропускаются. Для каждого изображения
+# считаются три 64-битных хэша: aHash (яркость 8x8 выше средней), dHash
+# (знак разности соседних пикселей 9x8) и pHash (низкие частоты DCT 32x32
+# выше медианы). Хэши считаются по уменьшенному изображению: JPEG
+# декодируется сразу в 1/2-1/8 размера (Image.draft), остальные форматы -
+# с быстрым уменьшением reduce; 16- и 32-битные изображения (I;16, I, F)
+# уменьшаются без потери точности и затем растягиваются в 8 бит по
+# минимуму и максимуму. Хэширование идет в пуле процессов, а хэши
+# сохраняются в кэше метаданных рядом с расширенными полями.
+#
+# У однотонных изображений хэши не зависят от содержимого (все биты
+# aHash и dHash нулевые), поэтому такие изображения не группируются, а
+# считаются отдельно (flat в итоге).
+#
+# Близкие хэши (расстояние Хэмминга <= --distance) находятся через
+# многоиндексное хэширование без сравнения всех пар: хэш делится на
+# CHUNKS частей (CHUNK_BITS), и если два хэша отличаются не больше чем в
+# distance битах, то хотя бы одна часть отличается не больше чем в
+# distance // CHUNKS битах (принцип Дирихле). Для каждой части хэши
+# раскладываются по корзинам ее значения, и кандидаты для всех хэшей
+# сразу (NumPy) берутся из корзин значений на таком расстоянии; полное
+# расстояние проверяется только для кандидатов. Кандидаты проверяются
+# блоками не больше PAIR_BLOCK пар (большая корзина - по частям), а
+# близкие пары сразу объединяются в группы (система непересекающихся
+# множеств), поэтому память не растет с размером корзин и числом пар.
+#
+# Изображения меньше MIN_SIDE пикселей по меньшей стороне не хэшируются:
+# в них меньше пикселей, чем в сетке хэша, и их хэш случайно совпадает с
+# чем угодно (в итоге - small). В группе остаются только изображения с
+# близким соотношением сторон (ASPECT_TOLERANCE): пересохранение и
+# уменьшенная копия его сохраняют, а случайное совпадение хэшей - нет.
+#
+# Группа - строка JSON: файлы от наибольшего разрешения к меньшему, у
+# каждого - путь, размер, байты и расстояние до первого файла группы.
+
+HASHES = ("ahash", "dhash", "phash")
+# Ключ хэшей в расширенных полях кэша метаданных. Номер в ключе
+# увеличивается при изменении вычисления хэшей: старые значения тогда
+# не используются
+CACHE_KEY = "hashes:2"
+
+HASH_BITS = 64
+# Части хэша для поиска: 22, 21 и 21 бит. Чем длиннее часть, тем меньше
+# случайных совпадений в корзине, но тем больше масок при том же радиусе
+CHUNKS = 3
+CHUNK_BITS = [HASH_BITS // CHUNKS + (k < HASH_BITS % CHUNKS) for k in range(CHUNKS)]
+
+# Порог по умолчанию: pHash пересохранений и уменьшенных копий обычно
+# отличается на несколько бит, а разных изображений - примерно на 32
+DEFAULT_DISTANCE = 8
+
+# Наименьшая сторона изображения для поиска (сетка aHash и pHash - 8x8)
+MIN_SIDE = 8
+# Наибольшее относительное различие соотношения сторон (длинная сторона к
+# короткой) изображений одной группы; запас - на округление размеров копий
+ASPECT_TOLERANCE = 0.05
+
+# Сторона изображения для DCT pHash; aHash и dHash считаются по нему же
+_DCT_SIZE = 32
+_LOW_FREQ = 8
+
+
+def _dct_matrix(n):
+    """Матрица DCT-II размера n x n (двумерное DCT: M @ x @ M.T)."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    m[0] /= np.sqrt(2)
+    return m * np.sqrt(2 / n)
+
+
+_DCT = _dct_matrix(_DCT_SIZE)
+
+# Поворот и отражение по тегу EXIF Orientation (как ImageOps.exif_transpose),
+# применяются к уменьшенному изображению
+_ORIENTATION = {
+    2: (Image.Transpose.FLIP_LEFT_RIGHT,),
+    3: (Image.Transpose.ROTATE_180,),
+    4: (Image.Transpose.FLIP_TOP_BOTTOM,),
+    5: (Image.Transpose.TRANSPOSE,),
+    6: (Image.Transpose.ROTATE_270,),
+    7: (Image.Transpose.TRANSVERSE,),
+    8: (Image.Transpose.ROTATE_90,),
+}
+
+
+# ---------------------- Hashing ----------------------
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _small_gray(img):
+    """Изображение _DCT_SIZE x _DCT_SIZE в оттенках серого без полного декодирования, где можно."""
+    # JPEG: декодирование сразу в уменьшенном масштабе (DCT-масштабирование libjpeg)
+    img.draft("L", (2 * _DCT_SIZE, 2 * _DCT_SIZE))
+    orientation = img.getexif().get(0x0112)
+    if img.mode in ("I", "F") or img.mode.startswith("I;"):
+        # Преобразование в L обрезало бы значения больше 255: уменьшение
+        # в числах с плавающей точкой, затем растяжение в 0..255
+        small = img.convert("F").resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.BOX, reducing_gap=2.0)
+        pixels = np.asarray(small, dtype=np.float64)
+        low, high = pixels.min(), pixels.max()
+        scale = 255 / (high - low) if high > low else 0.0
+        small = Image.fromarray(np.round((pixels - low) * scale).astype(np.uint8), "L")
+    else:
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        # reducing_gap: сначала быстрое целочисленное уменьшение, затем точное
+        small = img.resize((_DCT_SIZE, _DCT_SIZE), Image.Resampling.BOX, reducing_gap=2.0).convert("L")
+    for method in _ORIENTATION.get(orientation, ()):
+        small = small.transpose(method)
+    return small
+
+
+_HASH_ERRORS = READ_ERRORS + ARCHIVE_ERRORS + (KeyError, EOFError, SyntaxError)
+
+
+def image_hashes(path):
+    """
+    Перцептивные хэши (aHash, dHash, pHash) файла или члена архива в виде
+    64-битных целых (функция модуля - для пула процессов).
+
+    Returns:
+        Список из трех чисел, пустой список для однотонного изображения или
+        None, если файл не удалось прочитать.
+    """
+    try:
+        with open_path(path) as f:
+            return _file_hashes(f)
+    except _HASH_ERRORS:
+        return None
+
+
+def hash_paths(paths):
+    """
+    Хэши нескольких путей (функция модуля - для пула процессов), список в
+    порядке paths. Члены одного сжатого TAR читаются за один проход по архиву.
+    """
+    parts = split_member_path(paths[0])
+    if parts is None or not is_stream_archive(parts[0]):
+        return [image_hashes(path) for path in paths]
+    found = {}
+    try:
+        for path, f in stream_members(parts[0], paths):
+            found[path] = _file_hashes(f)
+    except ARCHIVE_ERRORS:
+        pass
+    return [found.get(path) for path in paths]
+
+
+def _file_hashes(f):
+    """Хэши открытого файла (см. image_hashes)."""
+    try:
+        with Image.open(f) as img:
+            small = _small_gray(img)
+    except _HASH_ERRORS:
+        return None
+
+    pixels = np.asarray(small, dtype=np.float64)
+    if pixels.min() == pixels.max():
+        return []
+    tiny = np.asarray(small.resize((_LOW_FREQ, _LOW_FREQ), Image.Resampling.BOX), dtype=np.float64)
+    wide = np.asarray(small.resize((_LOW_FREQ + 1, _LOW_FREQ), Image.Resampling.BOX), dtype=np.float64)
+    dct = (_DCT @ pixels @ _DCT.T)[:_LOW_FREQ, :_LOW_FREQ]
+    return [
+        _bits_to_int(tiny > tiny.mean()),
+        _bits_to_int(wide[:, 1:] > wide[:, :-1]),
+        _bits_to_int(dct > np.median(dct)),
+    ]
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+# ---------------------- Index ----------------------
+
+# Сколько хэшей искать за раз и сколько пар-кандидатов проверять за раз
+# (ограничивают память при любом размере корзин)
+QUERY_BLOCK = 1 << 16
+PAIR_BLOCK = 1 << 20
+
+# Число единичных бит в каждом байте (для NumPy без bitwise_count)
+_BYTE_BITS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(values):
+    """Число единичных бит каждого элемента массива uint64."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _BYTE_BITS[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _masks(bits, radius):
+    """Все маски XOR из bits бит с не более чем radius единицами."""
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            masks.append(sum(1 << p for p in positions))
+    return masks
+
+
+def _candidates(query, lo, counts, order, limit):
+    """
+    Пары (номер запроса, номер хэша из его корзины) блоками не больше limit
+    пар. lo и counts - начало и длина корзины каждого запроса в order;
+    корзина больше limit делится на части.
+    """
+    ends = np.cumsum(counts)
+    k = 0
+    while k < len(query):
+        base = ends[k - 1] if k else 0
+        stop = int(np.searchsorted(ends, base + limit, side="right"))
+        if stop == k:
+            for offset in range(0, int(counts[k]), limit):
+                j = order[lo[k] + offset:lo[k] + min(offset + limit, counts[k])]
+                yield np.full(len(j), query[k]), j
+            k += 1
+            continue
+        sizes = counts[k:stop]
+        i = np.repeat(query[k:stop], sizes)
+        offsets = np.arange(len(i)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        yield i, order[np.repeat(lo[k:stop], sizes) + offsets]
+        k = stop
+
+
+def near_pairs(hashes, distance=DEFAULT_DISTANCE):
+    """
+    Пары близких хэшей (многоиндексное хэширование, см. начало модуля).
+
+    Args:
+        hashes: Массив uint64 различных хэшей.
+        distance: Наибольшее расстояние Хэмминга.
+
+    Yields:
+        Массивы (i, j) номеров хэшей, i < j, блоками (см. PAIR_BLOCK); пара
+        может встретиться несколько раз.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+
+    shift = 0
+    for bits in CHUNK_BITS:
+        masks = _masks(bits, distance // CHUNKS)
+        chunks = ((hashes >> np.uint64(shift)) & np.uint64((1 << bits) - 1)).astype(np.intp)
+        shift += bits
+        # Таблица части: номера хэшей, упорядоченные по значению части, и
+        # для каждого значения - начало и длина его участка
+        order = np.argsort(chunks, kind="stable")
+        sizes = np.bincount(chunks, minlength=1 << bits)
+        starts = np.cumsum(sizes) - sizes
+        for start in range(0, len(hashes), QUERY_BLOCK):
+            query = np.arange(start, min(start + QUERY_BLOCK, len(hashes)))
+            for mask in masks:
+                target = chunks[query] ^ mask
+                counts = sizes[target]
+                if not counts.any():
+                    continue
+                for i, j in _candidates(query, starts[target], counts, order, PAIR_BLOCK):
+                    keep = (i < j) & (_popcount(hashes[i] ^ hashes[j]) <= distance)
+                    if keep.any():
+                        yield i[keep], j[keep]
+
+
+def group_near(hashes, distance=DEFAULT_DISTANCE):
+    """
+    Группы близких хэшей: список списков номеров (только группы из двух и
+    более). Близость транзитивна: цепочка A~B~C дает одну группу.
+    """
+    # Одинаковые хэши (точные пересохранения) ищутся один раз
+    unique, inverse = np.unique(np.asarray(hashes, dtype=np.uint64), return_inverse=True)
+    parent = list(range(len(unique)))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for block_i, block_j in near_pairs(unique, distance):
+        for i, j in zip(block_i.tolist(), block_j.tolist()):
+            parent[root(i)] = root(j)
+
+    groups = {}
+    for n, u in enumerate(inverse.ravel().tolist()):
+        groups.setdefault(root(u), []).append(n)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def _aspect(record):
+    """Соотношение длинной стороны к короткой (не зависит от поворота)."""
+    return max(record.width, record.height) / min(record.width, record.height)
+
+
+def split_by_aspect(members, aspects, tolerance=ASPECT_TOLERANCE):
+    """
+    Делит группу на части с близким соотношением сторон: номера members
+    упорядочиваются по aspects[n], и часть прерывается там, где соседние
+    различаются больше чем в 1 + tolerance раз. Возвращает части из двух и
+    более номеров.
+    """
+    members = sorted(members, key=lambda n: aspects[n])
+    parts = [[members[0]]]
+    for previous, n in zip(members, members[1:]):
+        if aspects[n] > aspects[previous] * (1 + tolerance):
+            parts.append([])
+        parts[-1].append(n)
+    return [part for part in parts if len(part) > 1]
+
+
+# ---------------------- Finder ----------------------
+
+class DuplicateFinder:
+    """
+    Сканирует папки (scanner.Scanner), считает хэши изображений в пуле
+    процессов и группирует близкие. Статистика - в self.stats.
+    """
+
+    def __init__(self, roots, hash_name="phash", distance=DEFAULT_DISTANCE,
+                 max_workers=os.cpu_count() or 1, **scan_options):
+        """
+        Args:
+            roots: Папки для поиска.
+            hash_name: Хэш для сравнения: "ahash", "dhash" или "phash".
+            distance: Наибольшее расстояние Хэмминга между почти-дубликатами.
+            max_workers: Процессов для хэширования (1 - в текущем процессе).
+            scan_options: Параметры Scanner (recursive, include, scan_archives, ...).
+        """
+        if hash_name not in HASHES:
+            raise ValueError(f"Неизвестный хэш: {hash_name}")
+        self.roots = list(roots)
+        self.hash_name = hash_name
+        self.distance = distance
+        self.max_workers = max_workers
+        self.scan_options = scan_options
+        self.stats = {"files": 0, "hashed": 0, "cached": 0, "unreadable": 0, "flat": 0, "small": 0,
+                      "groups": 0, "duplicates": 0}
+
+    def _collect(self, cache, onerror):
+        """
+        Читаемые изображения не меньше MIN_SIDE: список (путь, os.stat или
+        MemberStat, ImageRecord).
+        """
+        files = []
+
+        def emit(path, st, record):
+            if record.error is not None:
+                return
+            if min(record.width, record.height) < MIN_SIDE:
+                self.stats["small"] += 1
+                return
+            files.append((path, st, record))
+
+        Scanner(self.roots, **self.scan_options).run(emit, cache, onerror=onerror)
+        return files
+
+    def _hashes(self, files, cache):
+        """Хэши файлов (None для нечитаемых), из кэша или в пуле процессов."""
+        hashes = [None] * len(files)
+        cached_fields = {}
+        pending = []
+        for n, (path, st, _) in enumerate(files):
+            fields = cache.get_extended(path, st) if cache is not None and st is not None else None
+            if fields is not None and CACHE_KEY in fields:
+                hashes[n] = fields[CACHE_KEY]
+                self.stats["cached"] += 1
+            else:
+                cached_fields[n] = fields or {}
+                pending.append(n)
+
+        paths = {files[n][0]: n for n in pending}
+        # Задача пула - один файл или все члены одного сжатого TAR
+        streamed, other = group_stream_members(paths)
+        tasks = [(path,) for path in other] + [tuple(members) for members in streamed.values()]
+        for task, task_values in extract_metadata(tasks, max_workers=self.max_workers,
+                                                  ordered=False, use_processes=True, extract=hash_paths):
+            for path, values in zip(task, task_values):
+                n = paths[path]
+                hashes[n] = values
+                if values is None:
+                    continue
+                self.stats["hashed"] += 1
+                st = files[n][1]
+                if cache is not None and st is not None:
+                    cache.put_extended(path, st, {**cached_fields[n], CACHE_KEY: values})
+        if cache is not None:
+            cache.commit()
+        return hashes
+
+    def run(self, cache=None, onerror=None):
+        """
+        Выполняет поиск.
+
+        Returns:
+            Список групп; группа - список словарей (path, width, height,
+            bytes, distance) от наибольшего разрешения к меньшему.
+        """
+        files = self._collect(cache, onerror)
+        hashes = self._hashes(files, cache)
+        self.stats["files"] = len(files) + self.stats["small"]
+
+        column = HASHES.index(self.hash_name)
+        readable = [n for n, values in enumerate(hashes) if values]
+        self.stats["unreadable"] = sum(values is None for values in hashes)
+        self.stats["flat"] = sum(values == [] for values in hashes)
+        values = [hashes[n][column] for n in readable]
+        aspects = {n: _aspect(files[n][2]) for n in readable}
+
+        groups = []
+        for near in group_near(values, self.distance):
+            for members in split_by_aspect([readable[k] for k in near], aspects):
+                groups.append(self._group(files, hashes, column, members))
+        groups.sort(key=len, reverse=True)
+        self.stats["groups"] = len(groups)
+        self.stats["duplicates"] = sum(len(group) - 1 for group in groups)
+        return groups
+
+    @staticmethod
+    def _group(files, hashes, column, members):
+        """Группа для результата: от наибольшего разрешения к меньшему."""
+        members = sorted(members, key=lambda n: (-files[n][2].pixels, -(files[n][1].st_size if files[n][1] else 0)))
+        best = hashes[members[0]][column]
+        return [{
+            "path": files[n][0],
+            "width": files[n][2].width,
+            "height": files[n][2].height,
+            "bytes": files[n][1].st_size if files[n][1] is not None else None,
+            "distance": hamming(best, hashes[n][column]),
+        } for n in members]
+
+
+# ---------------------- CLI ----------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Поиск дубликатов изображений по перцептивным хэшам.")
+    parser.add_argument("roots", nargs="+", help="папки для поиска")
+    parser.add_argument("-o", "--output", help="файл результата JSONL (по умолчанию: stdout)")
+    parser.add_argument("-r", "--recursive", action="store_true", help="обходить подпапки")
+    parser.add_argument("--max-depth", type=int, help="предел глубины подпапок")
+    parser.add_argument("--include", action="append", default=[], help="маска имен файлов (можно повторять)")
+    parser.add_argument("--exclude", action="append", default=[], help="маска имен файлов и папок для пропуска")
+    parser.add_argument("--archives", action="store_true", help="искать и внутри архивов ZIP/TAR")
+    parser.add_argument("--hash", choices=HASHES, default="phash", help="хэш для сравнения (по умолчанию: phash)")
+    parser.add_argument("--distance", type=int, default=DEFAULT_DISTANCE,
+                        help=f"наибольшее различие хэшей в битах (по умолчанию: {DEFAULT_DISTANCE}, 0 - точные)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="процессов для хэширования (по умолчанию: число ядер)")
+    parser.add_argument("--cache", help="файл кэша метаданных (по умолчанию: ~/.cache/inforeader)")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать итог")
+    args = parser.parse_args(argv)
+
+    for root in args.roots:
+        if not os.path.isdir(root):
+            print(f"Некорректный путь к папке: {root}", file=sys.stderr)
+            return 1
+
+    finder = DuplicateFinder(
+        args.roots,
+        hash_name=args.hash,
+        distance=args.distance,
+        max_workers=args.workers,
+        recursive=args.recursive,
+        max_depth=args.max_depth,
+        include=args.include,
+        exclude=args.exclude,
+        scan_archives=args.archives,
+    )
+
+    cache = None
+    if not args.no_cache:
+        try:
+            # Ошибка SQLite во время работы (база занята, диск заполнен) не прерывает ее
+            cache = FailSafeCache(MetadataCache(args.cache),
+                                  lambda e: print(f"Кэш метаданных отключен: {e}", file=sys.stderr))
+        except (OSError, sqlite3.Error) as e:
+            print(f"Кэш метаданных недоступен: {e}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        groups = finder.run(cache, onerror=lambda e: print(f"Папка пропущена: {e}", file=sys.stderr))
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if cache is not None:
+            cache.close()
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for group in groups:
+            output.write(json.dumps(group, ensure_ascii=False) + "\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    if not args.quiet:
+        stats = finder.stats
+        print(f"Изображений: {stats['files']}, хэшировано: {stats['hashed']}, из кэша: {stats['cached']}, "
+              f"нечитаемых: {stats['unreadable']}, однотонных: {stats['flat']}, мелких: {stats['small']}, "
+              f"групп: {stats['groups']}, лишних копий: {stats['duplicates']}, "
+              f"время: {time.perf_counter() - start:.1f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+import os
+import struct
+from collections import OrderedDict, namedtuple
+
+from PIL import Image
+
+from archive_reader import ARCHIVE_ERRORS, member_stat, open_member, split_member_path
+from image_utils import READ_ERRORS
+
+# Расширенные поля: EXIF (камера, дата съемки), имя профиля ICC, число
+# кадров и бит на канал.
+#
+# При сканировании читаются только основные поля (records.ImageRecord),
+# которые почти всегда есть в заголовке файла. Расширенные поля дороже:
+# EXIF и ICC лежат в блоках перед данными, а для числа кадров GIF нужно
+# пройти весь файл. Поэтому они извлекаются отдельно (read_extended) и
+# только по запросу - для строк, видимых в таблице или выделенных
+# (worker.ExtendedWorker), и сохраняются в кэше метаданных рядом с
+# основной записью.
+#
+# Набор полей расширяемый: register_field(имя, заголовок, функция), где
+# функция получает открытое изображение Pillow и начало файла (HEAD_SIZE
+# байт) и возвращает число, строку или None (значения нет). Столбцы
+# таблицы идут в порядке регистрации.
+
+# Сколько начальных байт файла передается функциям полей
+HEAD_SIZE = 64
+
+# Поле: имя (ключ в кэше), заголовок столбца и функция (img, head) -> значение
+ExtendedField = namedtuple("ExtendedField", "name title extract")
+
+EXTENDED_FIELDS = OrderedDict()
+
+# Ошибки разбора отдельного поля: значение поля - None, остальные поля читаются
+_FIELD_ERRORS = READ_ERRORS + (EOFError, SyntaxError, struct.error, IndexError, KeyError, TypeError)
+
+
+def register_field(name, title, extract):
+    """Добавляет расширенное поле (заменяет поле с тем же именем)."""
+    EXTENDED_FIELDS[name] = ExtendedField(name, title, extract)
+
+
+def display_value(value):
+    return "N/A" if value is None else str(value)
+
+
+# ---------------------- EXIF ----------------------
+
+_EXIF_IFD = 0x8769
+_MAKE, _MODEL, _DATE_TIME, _DATE_TIME_ORIGINAL = 0x010F, 0x0110, 0x0132, 0x9003
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    if not isinstance(value, str):
+        return None
+    return value.strip("\x00 ") or None
+
+
+def exif_camera(img, head):
+    """Производитель и модель камеры (без повтора производителя в модели)."""
+    exif = img.getexif()
+    make, model = _text(exif.get(_MAKE)), _text(exif.get(_MODEL))
+    if make and model and model.lower().startswith(make.lower().split()[0]):
+        return model
+    return " ".join(part for part in (make, model) if part) or None
+
+
+def exif_date(img, head):
+    """Дата съемки в виде "ГГГГ-ММ-ДД чч:мм:сс" (сортируется как текст)."""
+    exif = img.getexif()
+    value = _text(exif.get_ifd(_EXIF_IFD).get(_DATE_TIME_ORIGINAL)) or _text(exif.get(_DATE_TIME))
+    if value is None:
+        return None
+    # В EXIF дата пишется через двоеточия: "2024:05:17 10:30:00"
+    return value[:10].replace(":", "-") + value[10:]
+
+
+# ---------------------- ICC ----------------------
+
+def icc_description(profile):
+    """Описание профиля ICC (тег desc) или None, если его нет."""
+    if len(profile) < 132:
+        return None
+    (count,) = struct.unpack_from(">I", profile, 128)
+    for k in range(min(count, (len(profile) - 132) // 12)):
+        signature, offset, size = struct.unpack_from(">4sII", profile, 132 + 12 * k)
+        if signature != b"desc":
+            continue
+        tag = profile[offset:offset + size]
+        if tag[:4] == b"desc":
+            # ICC v2, textDescriptionType: длина и строка ASCII
+            (length,) = struct.unpack_from(">I", tag, 8)
+            return tag[12:12 + length].split(b"\x00", 1)[0].decode("latin-1").strip() or None
+        if tag[:4] == b"mluc":
+            # ICC v4, multiLocalizedUnicodeType: берется первая запись (UTF-16BE)
+            (records,) = struct.unpack_from(">I", tag, 8)
+            if records:
+                length, start = struct.unpack_from(">II", tag, 20)
+                return tag[start:start + length].decode("utf-16-be", "replace").strip("\x00 ") or None
+    return None
+
+
+def icc_profile(img, head):
+    profile = img.info.get("icc_profile")
+    if not profile:
+        return None
+    return icc_description(profile) or f"без описания ({len(profile)} байт)"
+
+
+# ---------------------- Structure ----------------------
+
+def frame_count(img, head):
+    # Для GIF n_frames проходит по всему файлу - поэтому поле не читается при сканировании
+    return getattr(img, "n_frames", 1)
+
+
+# Бит на канал по режиму Pillow, если формат не хранит точное значение
+_MODE_BITS = {
+    "1": 1, "L": 8, "LA": 8, "P": 8, "PA": 8, "RGB": 8, "RGBA": 8, "RGBX": 8, "CMYK": 8,
+    "YCbCr": 8, "LAB": 8, "HSV": 8, "I;16": 16, "I;16L": 16, "I;16B": 16, "I": 32, "F": 32,
+}
+
+
+def bits_per_sample(img, head):
+    """
+    Бит на канал (для палитры - бит на индекс). Число, если у всех каналов
+    одинаково, иначе строка вида "5,6,5".
+    """
+    fmt = img.format
+    bits = None
+    if fmt == "TIFF":
+        bits = img.tag_v2.get(258)
+    elif fmt == "PNG" and head[12:16] == b"IHDR":
+        bits = head[24]
+    elif fmt == "BMP" and len(head) >= 30:
+        # Бит на пиксель: 24 и 32 - по 8 на канал, 16 - обычно 5-5-5
+        (bpp,) = struct.unpack_from("<H", head, 28)
+        bits = {16: 5, 24: 8, 32: 8}.get(bpp, bpp)
+    elif fmt == "PCX":
+        bits = head[3]
+    elif fmt == "GIF" and head[10] & 0x80:
+        # Размер глобальной палитры
+        bits = (head[10] & 7) + 1
+    elif fmt == "JPEG":
+        # Точность из маркера SOF (8 или 12)
+        bits = getattr(img, "bits", None)
+
+    if bits is None:
+        return _MODE_BITS.get(img.mode)
+    if isinstance(bits, tuple):
+        if len(set(bits)) > 1:
+            return ",".join(str(b) for b in bits)
+        bits = bits[0]
+    return int(bits)
+
+
+register_field("camera", "Камера", exif_camera)
+register_field("date_taken", "Дата съемки", exif_date)
+register_field("icc_profile", "Профиль ICC", icc_profile)
+register_field("frames", "Кадров", frame_count)
+register_field("bits_per_sample", "Бит на канал", bits_per_sample)
+
+
+# ---------------------- Reading ----------------------
+
+def path_stat(path):
+    """os.stat файла или archive_reader.MemberStat члена архива (ключ кэша)."""
+    if split_member_path(path) is not None:
+        return member_stat(path)
+    return os.stat(path)
+
+
+def open_path(path):
+    """Файл или член архива (в памяти) для чтения по пути."""
+    if split_member_path(path) is not None:
+        return open_member(path)
+    return open(path, "rb")
+
+
+def _fields(names):
+    return [EXTENDED_FIELDS[name] for name in names] if names is not None else list(EXTENDED_FIELDS.values())
+
+
+def read_extended_file(f, names=None):
+    """
+    Извлекает расширенные поля из открытого файла (с поддержкой seek).
+    Исключения чтения не перехватываются (см. read_extended).
+    """
+    fields = _fields(names)
+    values = dict.fromkeys(field.name for field in fields)
+    head = f.read(HEAD_SIZE)
+    f.seek(0)
+    with Image.open(f) as img:
+        for field in fields:
+            try:
+                values[field.name] = field.extract(img, head)
+            except _FIELD_ERRORS:
+                pass
+    return values
+
+
+def read_extended(path, names=None):
+    """
+    Извлекает расширенные поля файла или члена архива.
+
+    Args:
+        path: Путь к файлу (или виртуальный путь члена архива).
+        names: Имена полей (по умолчанию - все зарегистрированные).
+
+    Returns:
+        Словарь имя поля -> значение (None, если значения нет или файл не
+        удалось прочитать).
+    """
+    try:
+        with open_path(path) as f:
+            return read_extended_file(f, names)
+    except READ_ERRORS + ARCHIVE_ERRORS + (KeyError,):
+        # Файл не открылся или члена архива больше нет
+        return dict.fromkeys(field.name for field in _fields(names))
+
+
+if __name__ == "__main__":
+    # Проверка модуля: python extended_fields.py файл [файл ...]
+    import sys
+
+    for arg in sys.argv[1:]:
+        print(arg, read_extended(arg))
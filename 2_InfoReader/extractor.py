@@ -0,0 +1,105 @@
+import os
+from collections import deque
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+)
+
+from image_utils import get_image_metadata
+
+# Количество потоков по умолчанию: извлечение упирается в задержки
+# файловой системы (особенно сетевой), а не в процессор
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Период проверки should_stop при ожидании результатов (секунды):
+# остановка не ждет завершения медленного файла
+STOP_POLL_INTERVAL = 0.02
+
+
+def _drain(pending, ordered, block, should_stop):
+    """
+    Забирает готовые результаты из очереди задач.
+
+    Args:
+        pending: deque (ordered) или set (unordered) с парами (путь, future).
+        ordered: Отдавать результаты строго в порядке постановки задач.
+        block: Дождаться хотя бы одного результата (или остановки).
+        should_stop: Функция без аргументов; True - прекратить ожидание.
+    """
+    if ordered:
+        if block and pending:
+            head = [pending[0][1]]
+            while not wait(head, timeout=STOP_POLL_INTERVAL).done:
+                if should_stop():
+                    return
+        while pending and pending[0][1].done():
+            path, future = pending.popleft()
+            yield path, future.result()
+        return
+
+    futures = {future: path for path, future in pending}
+    if block and futures:
+        done = ()
+        while not done and not should_stop():
+            done, _ = wait(futures, timeout=STOP_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+    else:
+        done = [f for f in futures if f.done()]
+    for future in done:
+        path = futures[future]
+        pending.discard((path, future))
+        yield path, future.result()
+
+
+def extract_metadata(paths, max_workers=DEFAULT_WORKERS, ordered=True, max_in_flight=None,
+                     use_processes=False, should_stop=None, extract=get_image_metadata):
+    """
+    Извлекает метаданные файлов в пуле потоков или процессов.
+
+    Генератор отдает пары (путь, метаданные) по мере готовности. Пути
+    читаются из paths лениво, а одновременно в работе находится не больше
+    max_in_flight файлов, так что память не растет, если потребитель
+    (например, GUI) не успевает за пулом.
+
+    Args:
+        paths: Итерируемый набор путей к файлам (может быть генератором).
+        max_workers: Размер пула. 1 - обработка в текущем потоке, без пула.
+        ordered: True - результаты в порядке paths, False - по готовности.
+        max_in_flight: Предел задач в работе (по умолчанию max_workers * 4).
+        use_processes: Пул процессов вместо пула потоков.
+        should_stop: Функция без аргументов; True - прекратить обработку.
+        extract: Функция извлечения (путь -> метаданные).
+    """
+    should_stop = should_stop or (lambda: False)
+
+    if max_workers <= 1:
+        for path in paths:
+            if should_stop():
+                return
+            yield path, extract(path)
+        return
+
+    max_in_flight = max(1, max_in_flight or max_workers * 4)
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    executor = executor_class(max_workers=max_workers)
+    pending = deque() if ordered else set()
+    add = pending.append if ordered else pending.add
+
+    try:
+        for path in paths:
+            if should_stop():
+                return
+            add((path, executor.submit(extract, path)))
+
+            # Противодавление: ждем, пока освободится место в очереди
+            while len(pending) >= max_in_flight:
+                yield from _drain(pending, ordered, True, should_stop)
+                if should_stop():
+                    return
+            yield from _drain(pending, ordered, False, should_stop)
+
+        while pending:
+            yield from _drain(pending, ordered, True, should_stop)
+            if should_stop():
+                return
+    finally:
+        # При остановке незапущенные задачи отменяются, а не дорабатываются
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,97 @@
+import os
+from fnmatch import fnmatchcase
+
+from header_reader import SIGNATURE_SIZE, detect_format
+
+# Потоковый обход папки для InfoReader.
+#
+# Один проход os.scandir на каталог: файлы отдаются генератором сразу по
+# мере чтения каталога, без построения полного списка, поэтому первые строки
+# появляются мгновенно, а память не зависит от числа файлов (в стеке обхода
+# лежат только пути еще не пройденных подпапок). Расширения и маски
+# сравниваются без учета регистра (.JPG == .jpg на любой ОС).
+#
+# С detect_by_content файлы с неподдерживаемым расширением (или без него)
+# проверяются по сигнатуре в первых байтах - так находятся, например,
+# изображения, сохраненные без расширения.
+
+SUPPORTED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".tif", ".tiff", ".bmp", ".pcx")
+
+
+def _matches(name, patterns):
+    """Совпадает ли имя (в нижнем регистре) хотя бы с одной маской."""
+    return any(fnmatchcase(name, pattern) for pattern in patterns)
+
+
+def _is_image(path):
+    try:
+        with open(path, "rb") as f:
+            return detect_format(f.read(SIGNATURE_SIZE)) is not None
+    except OSError:
+        return False
+
+
+def walk_files(root, recursive=False, max_depth=None, include=(), exclude=(),
+               extensions=SUPPORTED_EXTENSIONS, detect_by_content=False, containers=(), onerror=None):
+    """
+    Генератор os.DirEntry изображений в папке root.
+
+    Args:
+        root: Папка для обхода.
+        recursive: Обходить подпапки.
+        max_depth: Предел глубины подпапок при recursive (None - без предела,
+                   1 - только непосредственные подпапки).
+        include: Маски имен файлов (например, "IMG_*"); если заданы,
+                 отдаются только совпадающие файлы.
+        exclude: Маски имен файлов и папок, которые пропускаются
+                 (папки - вместе со всем содержимым).
+        extensions: Поддерживаемые расширения (с точкой, в нижнем регистре).
+        detect_by_content: Проверять сигнатуру файлов с другими расширениями.
+        containers: Расширения архивов; такие файлы отдаются без проверки
+                    include (маски относятся к их содержимому).
+        onerror: Функция(OSError) для ошибок чтения каталогов; по умолчанию
+                 недоступные каталоги пропускаются молча.
+    """
+    include = [p.lower() for p in include]
+    exclude = [p.lower() for p in exclude]
+    extensions = tuple(ext.lower() for ext in extensions)
+    containers = tuple(ext.lower() for ext in containers)
+    if not recursive:
+        max_depth = 0
+
+    # Стек (путь, глубина): обход в глубину без рекурсии Python
+    stack = [(root, 0)]
+    while stack:
+        folder, depth = stack.pop()
+        subfolders = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    name = entry.name.lower()
+                    if exclude and _matches(name, exclude):
+                        continue
+                    try:
+                        # Символические ссылки на папки не обходим (защита от циклов)
+                        if entry.is_dir(follow_symlinks=False):
+                            if max_depth is None or depth < max_depth:
+                                subfolders.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+
+                    if containers and name.endswith(containers):
+                        yield entry
+                        continue
+                    if include and not _matches(name, include):
+                        continue
+                    if name.endswith(extensions) or (detect_by_content and _is_image(entry.path)):
+                        yield entry
+        except OSError as e:
+            if onerror is not None:
+                onerror(e)
+            continue
+
+        # Подпапки в обратном порядке, чтобы обходились в порядке чтения каталога
+        stack.extend((path, depth + 1) for path in reversed(subfolders))
@@ -0,0 +1,497 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+
+from file_walker import SUPPORTED_EXTENSIONS, _is_image, _matches
+
+# Слежение за папкой после сканирования (режим наблюдения InfoReader).
+#
+# FolderWatcher.poll() возвращает пути добавленных или измененных и
+# удаленных изображений с прошлого вызова, с теми же масками, глубиной и
+# расширениями, что и обход file_walker. Источник изменений:
+#
+#   - inotify (Linux, через ctypes): ядро само сообщает о записанных
+#     (IN_CLOSE_WRITE), перемещенных и удаленных файлах, на каждую папку -
+#     одно наблюдение. При переполнении очереди событий папка пересчитывается.
+#   - опрос (остальные ОС или нет свободных наблюдений inotify): раз в
+#     POLL_INTERVAL проверяется только mtime папок - он меняется при
+#     добавлении, удалении и переименовании файлов, и перечитываются только
+#     изменившиеся папки. Перезапись существующего файла mtime папки не
+#     меняет, поэтому размер и mtime всех файлов сверяются реже, раз в
+#     FULL_CHECK_INTERVAL. Новый файл сообщается, когда его размер и mtime
+#     не изменились за интервал опроса (копирование закончено).
+#
+# start() обходит папку (так же, как file_walker) и возвращает найденные
+# файлы: Worker сканирует этот список, а не обходит папку второй раз.
+# Архивы (containers) попадают в список и в poll() как обычные файлы, но
+# изменения внутри них не отслеживаются - Worker их пропускает.
+
+# Период опроса папок (секунды)
+POLL_INTERVAL = 1.0
+# Период полной сверки файлов при опросе (секунды)
+FULL_CHECK_INTERVAL = 30.0
+
+# ---------------------- inotify ----------------------
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+_WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+               | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+_EVENT = struct.Struct("iIII")
+_READ_SIZE = 1 << 20
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch, libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+_libc = _load_libc()
+
+
+def inotify_available():
+    return _libc is not None
+
+
+# ---------------------- Watched tree ----------------------
+
+class _WatchedTree:
+    """
+    Известное состояние папки: изображения по папкам и подпапки.
+    Подклассы задают источник изменений (poll) и что значит "наблюдать" папку.
+    """
+
+    def __init__(self, root, recursive=False, max_depth=None, include=(), exclude=(),
+                 extensions=SUPPORTED_EXTENSIONS, detect_by_content=False, containers=()):
+        self.root = root
+        self.max_depth = max_depth if recursive else 0
+        self.include = [p.lower() for p in include]
+        self.exclude = [p.lower() for p in exclude]
+        self.extensions = tuple(ext.lower() for ext in extensions)
+        self.detect_by_content = detect_by_content
+        self.containers = tuple(ext.lower() for ext in containers)
+        # Папка -> {имя файла: ключ состояния (см. _file_key)}
+        self._files = {}
+        # Папка -> множество путей подпапок
+        self._subdirs = {}
+        self._depths = {}
+
+    def known_paths(self):
+        """Множество путей всех известных изображений."""
+        return {os.path.join(folder, name) for folder, files in self._files.items() for name in files}
+
+    def close(self):
+        pass
+
+    # Переопределяются в подклассах
+
+    def _watch_dir(self, folder):
+        """Начинает наблюдение папки; False - папки уже нет."""
+        return True
+
+    def _unwatch_dir(self, folder):
+        pass
+
+    def _file_key(self, entry):
+        return None
+
+    # Фильтры - как в file_walker.walk_files
+
+    def _wanted_file(self, name, path):
+        name = name.lower()
+        if self.exclude and _matches(name, self.exclude):
+            return False
+        if self.containers and name.endswith(self.containers):
+            return True
+        if self.include and not _matches(name, self.include):
+            return False
+        return name.endswith(self.extensions) or (self.detect_by_content and _is_image(path))
+
+    def _wanted_dir(self, name, parent_depth):
+        if self.max_depth is not None and parent_depth >= self.max_depth:
+            return False
+        return not (self.exclude and _matches(name.lower(), self.exclude))
+
+    def _scan_dir(self, folder, depth):
+        """({имя файла: ключ}, [пути подпапок]) папки."""
+        files, subdirs = {}, []
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self._wanted_dir(entry.name, depth):
+                            subdirs.append(entry.path)
+                    elif entry.is_file() and self._wanted_file(entry.name, entry.path):
+                        files[entry.name] = self._file_key(entry)
+                except OSError:
+                    continue
+        return files, subdirs
+
+    def _add_tree(self, folder, depth):
+        """Добавляет папку с подпапками; возвращает пути найденных изображений."""
+        added = []
+        stack = [(folder, depth)]
+        while stack:
+            path, depth = stack.pop()
+            # Наблюдение - до чтения папки, чтобы не пропустить файлы между ними
+            if not self._watch_dir(path):
+                continue
+            try:
+                files, subdirs = self._scan_dir(path, depth)
+            except OSError:
+                self._unwatch_dir(path)
+                continue
+            self._files[path] = files
+            self._subdirs[path] = set(subdirs)
+            self._depths[path] = depth
+            added += [os.path.join(path, name) for name in files]
+            # Как в file_walker: подпапки обходятся в порядке чтения каталога
+            stack.extend((subdir, depth + 1) for subdir in reversed(subdirs))
+        return added
+
+    def _remove_tree(self, folder):
+        """Забывает папку с подпапками; возвращает пути ее изображений."""
+        removed = []
+        parent = self._subdirs.get(os.path.dirname(folder))
+        if parent is not None:
+            parent.discard(folder)
+        stack = [folder]
+        while stack:
+            path = stack.pop()
+            files = self._files.pop(path, None)
+            if files is None:
+                continue
+            removed += [os.path.join(path, name) for name in files]
+            stack.extend(self._subdirs.pop(path, ()))
+            self._depths.pop(path, None)
+            self._unwatch_dir(path)
+        return removed
+
+
+class PollingWatcher(_WatchedTree):
+    """Изменения по mtime папок (см. описание модуля)."""
+
+    def __init__(self, *args, interval=POLL_INTERVAL, full_check_interval=FULL_CHECK_INTERVAL, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.interval = interval
+        self.full_check_interval = full_check_interval
+        self._mtimes = {}
+        # Новые или измененные файлы, ждущие окончания записи: путь -> ключ
+        self._unsettled = {}
+        self._next_check = 0.0
+        self._next_full_check = 0.0
+
+    def start(self):
+        """Запоминает текущее состояние; возвращает пути найденных изображений."""
+        added = self._add_tree(self.root, 0)
+        now = time.monotonic()
+        self._next_check = now + self.interval
+        self._next_full_check = now + self.full_check_interval
+        return added
+
+    def _watch_dir(self, folder):
+        try:
+            self._mtimes[folder] = os.stat(folder).st_mtime_ns
+        except OSError:
+            return False
+        return True
+
+    def _unwatch_dir(self, folder):
+        self._mtimes.pop(folder, None)
+
+    def _file_key(self, entry):
+        st = entry.stat()
+        return st.st_size, st.st_mtime_ns
+
+    def poll(self, timeout):
+        """
+        Ждет не дольше timeout секунд и возвращает (измененные, удаленные)
+        пути; между проверками - пустые множества.
+        """
+        wait = self._next_check - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set(), set()
+        if wait > 0:
+            time.sleep(wait)
+        self._next_check = time.monotonic() + self.interval
+        full_check = time.monotonic() >= self._next_full_check
+        if full_check:
+            self._next_full_check = time.monotonic() + self.full_check_interval
+        return self._check(full_check)
+
+    def _check(self, full_check):
+        changed, removed = set(), set()
+        # Файлы, найденные в прошлый раз, проверяются на окончание записи
+        unsettled, self._unsettled = self._unsettled, {}
+
+        for folder in list(self._files):
+            if folder not in self._files:
+                # Удалена вместе с родительской папкой в этом же проходе
+                continue
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                removed.update(self._remove_tree(folder))
+                continue
+            if mtime != self._mtimes[folder]:
+                self._mtimes[folder] = mtime
+                removed.update(self._rescan_dir(folder))
+            elif full_check:
+                self._restat_files(folder)
+
+        for path, key in unsettled.items():
+            folder, name = os.path.split(path)
+            current = self._files.get(folder, {}).get(name)
+            if current is None:
+                continue
+            if current == key:
+                changed.add(path)
+            else:
+                self._unsettled[path] = current
+        return changed, removed
+
+    def _rescan_dir(self, folder):
+        """Перечитывает папку; возвращает пути удаленных изображений."""
+        depth = self._depths[folder]
+        try:
+            files, subdirs = self._scan_dir(folder, depth)
+        except OSError:
+            return self._remove_tree(folder)
+
+        removed = []
+        old_files = self._files[folder]
+        for name in old_files.keys() - files.keys():
+            removed.append(os.path.join(folder, name))
+        for name, key in files.items():
+            if old_files.get(name) != key:
+                self._unsettled[os.path.join(folder, name)] = key
+        self._files[folder] = files
+
+        old_subdirs = self._subdirs[folder]
+        for subdir in old_subdirs - set(subdirs):
+            removed += self._remove_tree(subdir)
+        for subdir in set(subdirs) - old_subdirs:
+            for path in self._add_tree(subdir, depth + 1):
+                folder_path, name = os.path.split(path)
+                self._unsettled[path] = self._files[folder_path][name]
+        self._subdirs[folder] = set(subdirs)
+        return removed
+
+    def _restat_files(self, folder):
+        """Сверяет размер и mtime файлов папки (перезапись без смены mtime папки)."""
+        files = self._files[folder]
+        for name, key in files.items():
+            path = os.path.join(folder, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                # Удаление увидит проверка mtime папки
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != key:
+                files[name] = current
+                self._unsettled[path] = current
+
+
+class InotifyWatcher(_WatchedTree):
+    """Изменения по событиям inotify (см. описание модуля)."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fd = None
+        self._paths_by_wd = {}
+        self._wds = {}
+
+    def start(self):
+        fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._fd = fd
+        return self._add_tree(self.root, 0)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def _watch_dir(self, folder):
+        wd = _libc.inotify_add_watch(self._fd, os.fsencode(folder), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR, errno.EACCES):
+                return False
+            # ENOSPC - исчерпан лимит наблюдений (fs.inotify.max_user_watches)
+            raise OSError(err, f"inotify: {os.strerror(err)}", folder)
+        self._paths_by_wd[wd] = folder
+        self._wds[folder] = wd
+        return True
+
+    def _unwatch_dir(self, folder):
+        wd = self._wds.pop(folder, None)
+        if wd is not None:
+            self._paths_by_wd.pop(wd, None)
+            _libc.inotify_rm_watch(self._fd, wd)
+
+    def _read_events(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return b""
+        chunks = []
+        while True:
+            try:
+                chunk = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def poll(self, timeout):
+        """Ждет событий не дольше timeout секунд; возвращает (измененные, удаленные) пути."""
+        data = self._read_events(timeout)
+        changed, removed = set(), set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                return self._resync()
+            folder = self._paths_by_wd.get(wd)
+            if folder is None:
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                if folder == self.root and mask & IN_MOVE_SELF:
+                    # Корень переименован: пути в нем больше не действительны
+                    removed.update(self._remove_tree(folder))
+                continue
+
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    removed.update(self._remove_tree(path))
+                elif mask & (IN_CREATE | IN_MOVED_TO) and self._wanted_dir(name, self._depths[folder]):
+                    self._subdirs[folder].add(path)
+                    changed.update(self._add_tree(path, self._depths[folder] + 1))
+                continue
+
+            files = self._files[folder]
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                if self._wanted_file(name, path):
+                    files[name] = None
+                    changed.add(path)
+                    removed.discard(path)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                if files.pop(name, False) is not False:
+                    removed.add(path)
+                    changed.discard(path)
+        # Удаленная папка могла успеть получить события файлов
+        return {path for path in changed if os.path.dirname(path) in self._files}, removed
+
+    def _resync(self):
+        """Полный пересчет после переполнения очереди событий."""
+        known = self.known_paths()
+        self._remove_tree(self.root)
+        current = set(self._add_tree(self.root, 0))
+        return current, known - current
+
+
+# ---------------------- Facade ----------------------
+
+class FolderWatcher:
+    """
+    Слежение за папкой: inotify, если доступен, иначе опрос. Если inotify
+    отказывает во время работы (например, кончился лимит наблюдений),
+    слежение продолжается опросом.
+    """
+
+    def __init__(self, root, recursive=False, max_depth=None, include=(), exclude=(),
+                 extensions=SUPPORTED_EXTENSIONS, detect_by_content=False, containers=(), use_inotify=True,
+                 poll_interval=POLL_INTERVAL):
+        """
+        Args:
+            root: Папка для слежения.
+            recursive, max_depth, include, exclude, extensions, detect_by_content, containers:
+                Отбор файлов, как в file_walker.walk_files.
+            use_inotify: Использовать inotify, если он доступен.
+            poll_interval: Период опроса папок без inotify (секунды).
+        """
+        self._options = dict(root=root, recursive=recursive, max_depth=max_depth, include=include,
+                             exclude=exclude, extensions=extensions, detect_by_content=detect_by_content,
+                             containers=containers)
+        self.poll_interval = poll_interval
+        self._backend = None
+        self._use_inotify = use_inotify and inotify_available()
+
+    @property
+    def method(self):
+        """"inotify" или "polling"."""
+        return "inotify" if isinstance(self._backend, InotifyWatcher) else "polling"
+
+    def start(self):
+        """
+        Начинает слежение; возвращает список путей изображений (и архивов
+        containers) в папке, как их нашел бы обход file_walker.walk_files.
+        """
+        if self._use_inotify:
+            backend = InotifyWatcher(**self._options)
+            try:
+                paths = backend.start()
+                self._backend = backend
+                return paths
+            except OSError:
+                backend.close()
+        self._backend = PollingWatcher(interval=self.poll_interval, **self._options)
+        return self._backend.start()
+
+    def poll(self, timeout):
+        """
+        Изменения с прошлого вызова: (добавленные или измененные, удаленные)
+        пути. Ждет не дольше timeout секунд.
+        """
+        try:
+            return self._backend.poll(timeout)
+        except OSError:
+            if not isinstance(self._backend, InotifyWatcher):
+                raise
+        # inotify отказал: переходим на опрос и сверяем состояние заново
+        known = self._backend.known_paths()
+        self._backend.close()
+        self._backend = PollingWatcher(interval=self.poll_interval, **self._options)
+        current = set(self._backend.start())
+        return current, known - current
+
+    def close(self):
+        if self._backend is not None:
+            self._backend.close()
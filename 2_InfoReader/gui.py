@@ -1,21 +1,25 @@
 import sys
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
-    QPushButton, QTableWidget, QTableWidgetItem,
+    QPushButton, QTableView,
     QHeaderView, QFileDialog, QAbstractItemView,
-    QMessageBox
+    QMessageBox, QHBoxLayout, QLabel, QSpinBox, QCheckBox, QLineEdit, QProgressBar
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QFileInfo
+from PyQt6.QtCore import Qt, pyqtSignal, QFileInfo, QTimer
+from itertools import islice
 
+from extractor import DEFAULT_WORKERS
+from progress import format_progress
+from table_model import MetadataTableModel, COLUMN_HEADERS, COL_FILENAME
 
-COLUMN_HEADERS = [
-    "Имя файла",
-    "Размер (px)",
-    "Разрешение (DPI)",
-    "Глубина цвета",
-    "Сжатие"
-]
-COL_FILENAME, COL_SIZE_PX, COL_DPI, COL_DEPTH, COL_COMPRESSION = range(len(COLUMN_HEADERS))
+# Задержка применения фильтра после ввода (мс), чтобы не фильтровать
+# миллион строк на каждую нажатую клавишу
+FILTER_DELAY_MS = 250
+
+# Задержка запроса расширенных полей после прокрутки или выделения (мс)
+EXTENDED_DELAY_MS = 100
+# Сколько выделенных строк запрашивать сверх видимых
+EXTENDED_SELECTION_LIMIT = 5000
 
 
 class MainWindow(QMainWindow):
@@ -26,14 +30,20 @@ class MainWindow(QMainWindow):
     # Сигнал для отображения статуса обработки (например, в будущем статус-баре)
     status_update_signal = pyqtSignal(str)
 
+    # Сигнал нажатия кнопки "Отмена"
+    cancel_requested = pyqtSignal()
+
+    # Запрос расширенных полей: пары (индекс записи, путь) и использовать ли кэш
+    extended_requested = pyqtSignal(list, bool)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("2_InfoReader")
         self.setGeometry(100, 100, 1200, 800)
 
+        # Модель хранит все строки, таблица рисует только видимые
+        self.model = MetadataTableModel(self)
         self.init_ui()
-        # Список для хранения данных, пока они обрабатываются и добавляются в таблицу
-        self.file_data = []
 
     def init_ui(self):
         """Инициализация виджетов и компоновки."""
@@ -41,15 +51,125 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(central_widget)
         layout = QVBoxLayout()
 
-        # 1. Кнопка выбора папки
+        # 1. Кнопка выбора папки, ход сканирования и отмена
+        top_layout = QHBoxLayout()
         self.select_folder_button = QPushButton("Выбрать папку для сканирования")
         self.select_folder_button.clicked.connect(self.browse_folder)
-        layout.addWidget(self.select_folder_button)
+        top_layout.addWidget(self.select_folder_button)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1)
+        self.progress_bar.setValue(0)
+        top_layout.addWidget(self.progress_bar, 1)
+
+        self.cancel_button = QPushButton("Отмена")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_requested.emit)
+        top_layout.addWidget(self.cancel_button)
+        layout.addLayout(top_layout)
+
+        self.progress_label = QLabel()
+        layout.addWidget(self.progress_label)
+
+        # 2. Настройки параллельной обработки
+        settings_layout = QHBoxLayout()
+        settings_layout.addWidget(QLabel("Потоков:"))
+        self.spin_workers = QSpinBox()
+        self.spin_workers.setRange(1, 128)
+        self.spin_workers.setValue(DEFAULT_WORKERS)
+        self.spin_workers.setToolTip("1 - последовательная обработка без пула")
+        settings_layout.addWidget(self.spin_workers)
+
+        self.check_ordered = QCheckBox("Сохранять порядок файлов")
+        self.check_ordered.setChecked(True)
+        settings_layout.addWidget(self.check_ordered)
+
+        self.check_processes = QCheckBox("Процессы вместо потоков")
+        settings_layout.addWidget(self.check_processes)
+
+        self.check_cache = QCheckBox("Кэш метаданных")
+        self.check_cache.setChecked(True)
+        self.check_cache.setToolTip("Не перечитывать файлы, не изменившиеся с прошлого сканирования")
+        settings_layout.addWidget(self.check_cache)
+
+        self.check_extended = QCheckBox("Расширенные поля")
+        self.check_extended.setChecked(True)
+        self.check_extended.setToolTip("EXIF, профиль ICC, число кадров и бит на канал. Читаются "
+                                       "в фоне только для видимых и выделенных строк")
+        self.check_extended.toggled.connect(self.show_extended)
+        settings_layout.addWidget(self.check_extended)
+        settings_layout.addStretch(1)
+        layout.addLayout(settings_layout)
+
+        # 3. Настройки обхода папки
+        walk_layout = QHBoxLayout()
+        self.check_recursive = QCheckBox("Включая подпапки")
+        walk_layout.addWidget(self.check_recursive)
+
+        walk_layout.addWidget(QLabel("Глубина:"))
+        self.spin_depth = QSpinBox()
+        self.spin_depth.setRange(0, 1000)
+        self.spin_depth.setSpecialValueText("без ограничений")
+        self.spin_depth.setToolTip("Уровней подпапок (0 - без ограничений)")
+        walk_layout.addWidget(self.spin_depth)
+
+        walk_layout.addWidget(QLabel("Маски:"))
+        self.edit_include = QLineEdit()
+        self.edit_include.setPlaceholderText("например IMG_*; scan*")
+        walk_layout.addWidget(self.edit_include)
+
+        walk_layout.addWidget(QLabel("Исключить:"))
+        self.edit_exclude = QLineEdit()
+        self.edit_exclude.setPlaceholderText("например .*; thumbs")
+        walk_layout.addWidget(self.edit_exclude)
+
+        self.check_content = QCheckBox("Определять формат по содержимому")
+        self.check_content.setToolTip("Находить изображения с любым расширением по сигнатуре файла")
+        walk_layout.addWidget(self.check_content)
+
+        self.check_archives = QCheckBox("Архивы ZIP/TAR")
+        self.check_archives.setToolTip("Читать изображения внутри архивов без распаковки на диск")
+        walk_layout.addWidget(self.check_archives)
+
+        self.check_precount = QCheckBox("Пересчитать файлы заранее")
+        self.check_precount.setToolTip("Точное оставшееся время ценой дополнительного обхода папки")
+        walk_layout.addWidget(self.check_precount)
 
-        # 2. Таблица для отображения данных
-        self.table_widget = QTableWidget()
+        self.check_watch = QCheckBox("Следить за изменениями")
+        self.check_watch.setToolTip("После сканирования обновлять таблицу при добавлении, изменении и "
+                                    "удалении файлов (остановка - кнопкой \"Отмена\")")
+        walk_layout.addWidget(self.check_watch)
+        layout.addLayout(walk_layout)
+
+        # 4. Фильтр строк
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(QLabel("Фильтр:"))
+        self.edit_filter = QLineEdit()
+        self.edit_filter.setPlaceholderText("текст в любом столбце")
+        self.edit_filter.setClearButtonEnabled(True)
+        filter_layout.addWidget(self.edit_filter)
+        layout.addLayout(filter_layout)
+
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.edit_filter.textChanged.connect(self.filter_timer.start)
+
+        # 5. Таблица для отображения данных
+        self.table_view = QTableView()
         self.setup_table()
-        layout.addWidget(self.table_widget)
+        layout.addWidget(self.table_view)
+
+        # Расширенные поля запрашиваются, когда прокрутка или выделение успокоились
+        self.extended_timer = QTimer(self)
+        self.extended_timer.setSingleShot(True)
+        self.extended_timer.setInterval(EXTENDED_DELAY_MS)
+        self.extended_timer.timeout.connect(self.request_extended)
+        self.table_view.verticalScrollBar().valueChanged.connect(self.extended_timer.start)
+        self.table_view.selectionModel().selectionChanged.connect(self.extended_timer.start)
+        for signal in (self.model.rowsInserted, self.model.layoutChanged, self.model.modelReset):
+            signal.connect(self.extended_timer.start)
 
         central_widget.setLayout(layout)
 
@@ -59,17 +179,50 @@ class MainWindow(QMainWindow):
 
     def setup_table(self):
         """Настройка внешнего вида и структуры таблицы."""
-        self.table_widget.setColumnCount(len(COLUMN_HEADERS))
-        self.table_widget.setHorizontalHeaderLabels(COLUMN_HEADERS)
+        self.table_view.setModel(self.model)
+        # Начальный порядок - порядок поступления, без индикатора сортировки
+        # (setSortingEnabled сразу сортирует по текущему индикатору)
+        self.table_view.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.table_view.setSortingEnabled(True)
 
-        # Растягиваем первый столбец, чтобы он занимал доступное пространство
-        header = self.table_widget.horizontalHeader()
+        # Растягиваем первый столбец, чтобы он занимал доступное пространство.
+        # Остальные не подгоняются под содержимое: это проход по всем строкам
+        header = self.table_view.horizontalHeader()
         header.setSectionResizeMode(COL_FILENAME, QHeaderView.ResizeMode.Stretch)
-        for i in range(1, len(COLUMN_HEADERS)):
-            header.setSectionResizeMode(i, QHeaderView.ResizeMode.ResizeToContents)
+        for i in range(1, self.model.columnCount()):
+            header.setSectionResizeMode(i, QHeaderView.ResizeMode.Interactive)
+            header.resizeSection(i, 150 if i < len(COLUMN_HEADERS) else 110)
+
+        # Одинаковая высота строк: таблице не нужно измерять каждую строку
+        rows = self.table_view.verticalHeader()
+        rows.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        rows.setDefaultSectionSize(self.table_view.fontMetrics().height() + 6)
 
         # Запрещаем редактирование ячеек
-        self.table_widget.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table_view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+
+    def scan_settings(self) -> dict:
+        """Параметры обработки, выбранные пользователем (аргументы Worker)."""
+        return {
+            "max_workers": self.spin_workers.value(),
+            "ordered": self.check_ordered.isChecked(),
+            "use_processes": self.check_processes.isChecked(),
+            "use_cache": self.check_cache.isChecked(),
+            "recursive": self.check_recursive.isChecked(),
+            "max_depth": self.spin_depth.value() or None,
+            "include": self._patterns(self.edit_include),
+            "exclude": self._patterns(self.edit_exclude),
+            "detect_by_content": self.check_content.isChecked(),
+            "scan_archives": self.check_archives.isChecked(),
+            "precount": self.check_precount.isChecked(),
+            "watch": self.check_watch.isChecked(),
+        }
+
+    @staticmethod
+    def _patterns(edit) -> list:
+        """Маски из поля ввода, разделенные ';'."""
+        return [p.strip() for p in edit.text().split(";") if p.strip()]
 
     def browse_folder(self):
         """Открывает диалог выбора папки и испускает сигнал."""
@@ -80,30 +233,100 @@ class MainWindow(QMainWindow):
         if folder_path:
             self.status_update_signal.emit(f"Папка выбрана: {folder_path}. Запуск сканирования...")
             # Очищаем таблицу перед новым сканированием
-            self.table_widget.setRowCount(0)
-            self.file_data = []
+            self.model.clear()
             # Испускаем сигнал, который будет перехвачен модулем worker
             self.folder_selected_signal.emit(folder_path)
         else:
             self.status_update_signal.emit("Выбор папки отменен.")
 
-    def add_file_row(self, data: dict):
+    def add_file_rows(self, batch: list):
         """
-        Метод для добавления одной строки данных в таблицу.
-        Вызывается из worker.py через сигналы.
+        Добавляет пачку пар (путь, records.ImageRecord) в таблицу.
+        Вызывается из worker.py через сигнал rows_ready.
         """
-        row_position = self.table_widget.rowCount()
-        self.table_widget.insertRow(row_position)
+        self.model.append_rows(batch)
+
+    def update_file_rows(self, batch: list):
+        """Обновляет строки новых и измененных файлов (режим наблюдения)."""
+        self.model.update_rows(batch)
+
+    def remove_file_rows(self, paths: list):
+        """Убирает строки удаленных файлов (режим наблюдения)."""
+        self.model.remove_rows(paths)
+
+    def show_extended(self, shown: bool):
+        """Показывает или скрывает столбцы расширенных полей."""
+        for i in range(len(COLUMN_HEADERS), self.model.columnCount()):
+            self.table_view.setColumnHidden(i, not shown)
+        if shown:
+            self.extended_timer.start()
+
+    def request_extended(self):
+        """Запрашивает расширенные поля видимых и выделенных строк, которых еще нет."""
+        count = self.model.rowCount()
+        if not self.check_extended.isChecked() or not count:
+            return
+        view = self.table_view
+        first = max(view.rowAt(0), 0)
+        last = view.rowAt(view.viewport().height() - 1)
+        positions = list(range(first, (last if last >= 0 else count - 1) + 1))
+
+        selected = (row for selection in view.selectionModel().selection()
+                    for row in range(selection.top(), selection.bottom() + 1))
+        positions += islice(selected, EXTENDED_SELECTION_LIMIT)
+        # Новый запрос заменяет прежний, даже пустой: прокрученные строки не читаются
+        self.extended_requested.emit(self.model.missing_extended(dict.fromkeys(positions)),
+                                     self.check_cache.isChecked())
+
+    def add_extended_fields(self, batch: list):
+        """Расширенные поля из worker.ExtendedWorker: тройки (индекс, путь, поля)."""
+        self.model.set_extended(batch)
+
+    def apply_filter(self):
+        self.model.set_filter(self.edit_filter.text())
+        shown, total = self.model.rowCount(), self.model.total_count()
+        if shown != total:
+            self.status_update_signal.emit(f"Показано строк: {shown} из {total}")
+
+    def set_scanning(self, scanning: bool):
+        """Переключает кнопки на время сканирования."""
+        self.select_folder_button.setEnabled(not scanning)
+        self.cancel_button.setEnabled(scanning)
+        self.cancel_button.setText("Отмена")
+        if scanning:
+            # Пока общее число файлов неизвестно - индикатор без процентов
+            self.progress_bar.setRange(0, 0)
+            self.progress_label.clear()
+            self.progress_label.setToolTip("")
+
+    def set_watching(self):
+        """Сканирование закончено, Worker следит за папкой до нажатия кнопки."""
+        self.cancel_button.setText("Остановить слежение")
+
+    def show_progress(self, snapshot: dict):
+        """Отображает статистику хода (словарь progress.ScanProgress.snapshot())."""
+        total = snapshot["total"]
+        if snapshot["done"]:
+            self.progress_bar.setRange(0, 1)
+            self.progress_bar.setValue(0 if snapshot["interrupted"] else 1)
+        elif total:
+            # Оценка по кэшу может оказаться меньше фактического числа файлов
+            self.progress_bar.setRange(0, max(total, snapshot["files"]))
+            self.progress_bar.setValue(snapshot["files"])
+        self.progress_label.setText(format_progress(snapshot))
 
-        # Заполнение ячеек данными из словаря
-        self.table_widget.setItem(row_position, COL_FILENAME, QTableWidgetItem(data.get("filename", "N/A")))
-        self.table_widget.setItem(row_position, COL_SIZE_PX, QTableWidgetItem(data.get("size_px", "N/A")))
-        self.table_widget.setItem(row_position, COL_DPI, QTableWidgetItem(data.get("dpi", "N/A")))
-        self.table_widget.setItem(row_position, COL_DEPTH, QTableWidgetItem(data.get("depth", "N/A")))
-        self.table_widget.setItem(row_position, COL_COMPRESSION, QTableWidgetItem(data.get("compression", "N/A")))
+        # Подробности - во всплывающей подсказке
+        lines = ["Время по форматам:"]
+        for fmt, stats in snapshot["formats"].items():
+            lines.append(f"  {fmt}: {stats['files']} файлов, {stats['seconds']:.2f} с")
+        lines.append("Самые медленные файлы:")
+        for item in snapshot["slowest"]:
+            lines.append(f"  {item['seconds'] * 1000:.0f} мс  {item['path']}")
+        self.progress_label.setToolTip("\n".join(lines))
 
     def processing_finished(self, count):
         """Обновление статуса, когда обработка завершена."""
+        self.set_scanning(False)
         QMessageBox.information(self, "Готово", f"Обработка завершена. Найдено {count} файлов.")
         self.status_update_signal.emit(f"Готово. Обработано {count} файлов.")
 
@@ -0,0 +1,459 @@
+import mmap
+import os
+import struct
+
+from PIL.TiffImagePlugin import OPEN_INFO as TIFF_OPEN_INFO, COMPRESSION_INFO as TIFF_COMPRESSION_INFO
+
+# Быстрое чтение заголовков изображений без Image.open.
+#
+# Для таблицы InfoReader нужны только размер, режим (глубина цвета), DPI и
+# сжатие, а они лежат в первых байтах файла. Парсеры ниже повторяют логику
+# соответствующих плагинов Pillow (те же режимы, те же значения
+# info["dpi"] и info["compression"]), поэтому строки в таблице совпадают
+# с результатом Pillow. Все, что выходит за рамки типичных файлов
+# (редкие варианты формата, обрезанные заголовки, BigTIFF, MPO и т.д.),
+# приводит к HeaderError - вызывающий код тогда открывает файл через Pillow.
+
+# Файлы не больше этого размера читаются одним вызовом read(),
+# большие - отображаются в память (читаются только затронутые страницы)
+SMALL_FILE_SIZE = 64 * 1024
+
+
+class HeaderError(ValueError):
+    """Заголовок не распознан или слишком необычен для быстрого пути."""
+
+
+def _header(fmt, width, height, mode, dpi=None, compression=None):
+    info = {}
+    if dpi is not None:
+        info["dpi"] = dpi
+    if compression is not None:
+        info["compression"] = compression
+    return {"format": fmt, "width": width, "height": height, "mode": mode, "info": info}
+
+
+# ---------------------- JPEG ----------------------
+
+_JPEG_SOF = {0xFFC0, 0xFFC1, 0xFFC2, 0xFFC3, 0xFFC5, 0xFFC6, 0xFFC7,
+             0xFFC9, 0xFFCA, 0xFFCB, 0xFFCD, 0xFFCE, 0xFFCF, 0xFFDE}
+
+
+def _exif_dpi(exif):
+    """DPI из IFD0 блока EXIF так же, как JpegImageFile._read_dpi_from_exif."""
+    tiff = exif[6:]
+    endian = {b"II": "<", b"MM": ">"}.get(bytes(tiff[:2]))
+    if endian is None:
+        raise HeaderError("EXIF: неизвестный порядок байтов")
+    (ifd_offset,) = struct.unpack_from(endian + "L", tiff, 4)
+    (count,) = struct.unpack_from(endian + "H", tiff, ifd_offset)
+
+    unit = x_res = None
+    for i in range(count):
+        tag, typ, n, value = struct.unpack_from(endian + "HHL4s", tiff, ifd_offset + 2 + i * 12)
+        if tag == 0x0128 and typ in (3, 4) and n == 1:
+            unit = struct.unpack_from(endian + ("H" if typ == 3 else "L"), value)[0]
+        elif tag == 0x011A and typ == 5 and n == 1:
+            (offset,) = struct.unpack_from(endian + "L", value)
+            num, den = struct.unpack_from(endian + "LL", tiff, offset)
+            if den == 0:
+                raise HeaderError("EXIF: нулевой знаменатель XResolution")
+            x_res = num / den
+        elif tag in (0x0128, 0x011A):
+            raise HeaderError("EXIF: необычный тип тега разрешения")
+
+    if unit is None or x_res is None:
+        # Pillow в этом случае подставляет 72 DPI
+        return 72, 72
+    if unit == 3:
+        x_res *= 2.54
+    return x_res, x_res
+
+
+def parse_jpeg(data, file_size):
+    pos = 2
+    dpi = None
+    exif = None
+    size = mode = None
+
+    while True:
+        if data[pos] != 0xFF:
+            raise HeaderError("JPEG: ожидался маркер")
+        marker = 0xFF00 | data[pos + 1]
+        if marker == 0xFFFF:
+            # Заполняющие байты 0xFF перед маркером
+            pos += 1
+            continue
+        if marker == 0xFFDA:
+            break
+        if marker in (0xFFD8, 0xFFD9, 0xFF01) or 0xFFD0 <= marker <= 0xFFD7:
+            raise HeaderError("JPEG: неожиданный маркер до SOS")
+
+        (length,) = struct.unpack_from(">H", data, pos + 2)
+        segment = data[pos + 4:pos + 2 + length]
+        if len(segment) != length - 2:
+            raise HeaderError("JPEG: сегмент обрезан")
+
+        if marker in _JPEG_SOF:
+            if segment[0] != 8 or segment[5] not in (1, 3, 4):
+                raise HeaderError("JPEG: необычный SOF")
+            height, width = struct.unpack_from(">HH", segment, 1)
+            size = width, height
+            mode = {1: "L", 3: "RGB", 4: "CMYK"}[segment[5]]
+        elif marker == 0xFFE0 and segment[:4] == b"JFIF" and len(segment) >= 12:
+            unit = segment[7]
+            density = struct.unpack_from(">HH", segment, 8)
+            if unit == 1:
+                dpi = density
+            elif unit == 2:
+                dpi = tuple(d * 2.54 for d in density)
+        elif marker == 0xFFE1 and segment[:6] == b"Exif\0\0":
+            if exif is not None:
+                raise HeaderError("JPEG: несколько блоков EXIF")
+            exif = segment
+        elif marker == 0xFFE2 and segment[:4] == b"MPF\0":
+            # Multi-Picture: Pillow открывает такие файлы как MPO
+            raise HeaderError("JPEG: MPO")
+        pos += 2 + length
+
+    if size is None:
+        raise HeaderError("JPEG: нет SOF")
+    if dpi is None and exif is not None:
+        dpi = _exif_dpi(exif)
+    return _header("JPEG", size[0], size[1], mode, dpi)
+
+
+# ---------------------- PNG ----------------------
+
+_PNG_MODES = {
+    (1, 0): "1", (2, 0): "L", (4, 0): "L", (8, 0): "L", (16, 0): "I;16",
+    (8, 2): "RGB", (16, 2): "RGB",
+    (1, 3): "P", (2, 3): "P", (4, 3): "P", (8, 3): "P",
+    (8, 4): "LA", (16, 4): "RGBA",
+    (8, 6): "RGBA", (16, 6): "RGBA",
+}
+
+
+def parse_png(data, file_size):
+    length, chunk = struct.unpack_from(">L4s", data, 8)
+    if chunk != b"IHDR" or length < 13:
+        raise HeaderError("PNG: нет IHDR")
+    width, height, bits, color_type, _, _, _ = struct.unpack_from(">LLBBBBB", data, 16)
+    mode = _PNG_MODES.get((bits, color_type))
+    if mode is None:
+        raise HeaderError("PNG: необычный режим")
+
+    # pHYs Pillow учитывает только до первого IDAT
+    dpi = None
+    pos = 8 + 12 + length
+    while True:
+        length, chunk = struct.unpack_from(">L4s", data, pos)
+        if chunk == b"IDAT":
+            break
+        if chunk == b"pHYs":
+            if length < 9:
+                raise HeaderError("PNG: обрезанный pHYs")
+            px, py, unit = struct.unpack_from(">LLB", data, pos + 8)
+            if unit == 1:
+                dpi = px * 0.0254, py * 0.0254
+        elif chunk in (b"IEND", b"acTL", b"fdAT"):
+            raise HeaderError("PNG: необычная структура")
+        pos += 12 + length
+
+    return _header("PNG", width, height, mode, dpi)
+
+
+# ---------------------- BMP ----------------------
+
+_BMP_BIT_MODES = {1: "P", 4: "P", 8: "P", 16: "RGB", 24: "RGB", 32: "RGB"}
+
+
+def parse_bmp(data, file_size):
+    (header_size,) = struct.unpack_from("<L", data, 14)
+    dpi = None
+    if header_size == 12:
+        width, height, _, bits = struct.unpack_from("<HHHH", data, 18)
+        compression, colors, padding = 0, 0, 3
+    elif header_size in (40, 52, 56, 64, 108, 124):
+        width, height, _, bits, compression, _, ppm_x, ppm_y, colors = \
+            struct.unpack_from("<LLHHLLLLL", data, 18)
+        if data[18 + 7] == 0xFF:
+            # Отрицательная высота (строки сверху вниз)
+            height = 2 ** 32 - height
+        padding = 4
+        dpi = ppm_x / 39.3701, ppm_y / 39.3701
+    else:
+        raise HeaderError("BMP: необычный заголовок")
+
+    mode = _BMP_BIT_MODES.get(bits)
+    if mode is None or compression not in (0, 1, 2):
+        # BITFIELDS и т.п. - пусть разбирается Pillow
+        raise HeaderError("BMP: необычная глубина или сжатие")
+
+    if mode == "P":
+        colors = colors or 1 << bits
+        if not 0 < colors <= 256:
+            raise HeaderError("BMP: необычная палитра")
+        start = 14 + header_size
+        palette = data[start:start + padding * colors]
+        if len(palette) != padding * colors:
+            raise HeaderError("BMP: палитра обрезана")
+        indices = (0, 255) if colors == 2 else range(colors)
+        if all(palette[i * padding:i * padding + 3] == bytes((v, v, v)) for i, v in enumerate(indices)):
+            mode = "1" if colors == 2 else "L"
+
+    return _header("BMP", width, height, mode, dpi, compression)
+
+
+# ---------------------- GIF ----------------------
+
+def _gif_palette_needed(palette):
+    return any(not (i // 3 == palette[i] == palette[i + 1] == palette[i + 2])
+               for i in range(0, len(palette), 3))
+
+
+def parse_gif(data, file_size):
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    pos = 13
+    global_needed = False
+    if flags & 128:
+        size = 3 << ((flags & 7) + 1)
+        palette = data[pos:pos + size]
+        if len(palette) != size:
+            raise HeaderError("GIF: палитра обрезана")
+        global_needed = _gif_palette_needed(palette)
+        pos += size
+
+    # Ищем дескриптор первого кадра, пропуская блоки расширений
+    while True:
+        block = data[pos]
+        if block == 0x21:
+            pos += 2
+            while data[pos]:
+                pos += data[pos] + 1
+            pos += 1
+        elif block == 0x2C:
+            break
+        else:
+            raise HeaderError("GIF: нет первого кадра")
+
+    x0, y0, w, h, frame_flags = struct.unpack_from("<HHHHB", data, pos + 1)
+    width, height = max(x0 + w, width), max(y0 + h, height)
+    pos += 10
+    if frame_flags & 128:
+        size = 3 << ((frame_flags & 7) + 1)
+        palette = data[pos:pos + size]
+        if len(palette) != size:
+            raise HeaderError("GIF: палитра кадра обрезана")
+        needed = _gif_palette_needed(palette)
+        pos += size
+    else:
+        needed = global_needed
+    data[pos]  # размер кода LZW: Pillow тоже требует этот байт
+
+    return _header("GIF", width, height, "P" if needed else "L")
+
+
+# ---------------------- PCX ----------------------
+
+def parse_pcx(data, file_size):
+    version, _, bits = data[1], data[2], data[3]
+    x0, y0, x1, y1, hdpi, vdpi = struct.unpack_from("<HHHHHH", data, 4)
+    planes = data[65]
+    width, height = x1 + 1 - x0, y1 + 1 - y0
+    if width <= 0 or height <= 0:
+        raise HeaderError("PCX: неверный размер")
+
+    if bits == 1 and planes == 1:
+        mode = "1"
+    elif bits == 1 and planes in (2, 4):
+        mode = "P"
+    elif version == 5 and bits == 8 and planes == 1:
+        # Палитра 8-битных PCX лежит в конце файла
+        if len(data) != file_size:
+            raise HeaderError("PCX: нужен конец файла")
+        mode = "L"
+        tail = data[-769:]
+        if len(tail) == 769 and tail[0] == 12:
+            if any(tail[i * 3 + 1:i * 3 + 4] != bytes((i, i, i)) for i in range(256)):
+                mode = "P"
+    elif version == 5 and bits == 8 and planes == 3:
+        mode = "RGB"
+    else:
+        raise HeaderError("PCX: необычный режим")
+
+    return _header("PCX", width, height, mode, (hdpi, vdpi))
+
+
+# ---------------------- TIFF ----------------------
+
+_TIFF_TYPES = {1: "B", 3: "H", 4: "L", 5: "LL", 16: "Q"}
+
+
+def _tiff_tags(data, endian, offset):
+    """Значения тегов первого IFD: {тег: кортеж значений}."""
+    (count,) = struct.unpack_from(endian + "H", data, offset)
+    tags = {}
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        tag, typ, n = struct.unpack_from(endian + "HHL", data, entry)
+        fmt = _TIFF_TYPES.get(typ)
+        if fmt is None:
+            continue
+        item_size = struct.calcsize("=" + fmt)
+        if n * item_size <= 4:
+            value_offset = entry + 8
+        else:
+            (value_offset,) = struct.unpack_from(endian + "L", data, entry + 8)
+        # Длинные массивы (смещения полос и т.п.) не нужны
+        if n > 16:
+            continue
+        values = struct.unpack_from(endian + fmt * n, data, value_offset)
+        if typ == 5:
+            values = tuple(zip(values[::2], values[1::2]))
+        tags[tag] = values
+    return tags
+
+
+def _rational(value):
+    num, den = value
+    if den == 0:
+        raise HeaderError("TIFF: нулевой знаменатель")
+    return num / den
+
+
+def parse_tiff(data, file_size):
+    prefix = bytes(data[:2])
+    endian = "<" if prefix == b"II" else ">"
+    (ifd,) = struct.unpack_from(endian + "L", data, 4)
+    tags = _tiff_tags(data, endian, ifd)
+
+    if 0xBC01 in tags:
+        raise HeaderError("TIFF: Windows Media Photo")
+    compression_code = tags.get(259, (1,))[0]
+    compression = TIFF_COMPRESSION_INFO.get(compression_code)
+    if compression is None:
+        raise HeaderError("TIFF: неизвестное сжатие")
+    planar = tags.get(284, (1,))[0]
+
+    photo = tags.get(262, (0,))[0]
+    if compression == "tiff_jpeg":
+        photo = 6
+    fillorder = tags.get(266, (1,))[0]
+
+    if 256 not in tags or 257 not in tags:
+        raise HeaderError("TIFF: нет размеров")
+    width, height = tags[256][0], tags[257][0]
+    if tags.get(274, (1,))[0] in (5, 6, 7, 8):
+        width, height = height, width
+
+    sample_format = tags.get(339, (1,))
+    if len(sample_format) > 1 and max(sample_format) == min(sample_format):
+        sample_format = (sample_format[0],)
+    bps = tags.get(258, (1,))
+    extra = tags.get(338, ())
+    samples = tags.get(277, (3 if compression == "tiff_jpeg" and photo in (2, 6) else 1,))[0]
+    if planar == 2 and extra and max(extra) == 0:
+        bps = bps[:-len(extra)]
+        samples -= len(extra)
+        extra = ()
+    if samples < len(bps):
+        bps = bps[:samples]
+    elif samples > len(bps) == 1:
+        bps = bps * samples
+    if len(bps) != samples:
+        raise HeaderError("TIFF: неизвестная организация данных")
+
+    mode = TIFF_OPEN_INFO.get((prefix, photo, sample_format, fillorder, bps, extra))
+    if mode is None:
+        raise HeaderError("TIFF: неизвестный режим")
+
+    dpi = None
+    x_res = _rational(tags[282][0]) if 282 in tags else 1
+    y_res = _rational(tags[283][0]) if 283 in tags else 1
+    if x_res and y_res:
+        unit = tags.get(296, (None,))[0]
+        if unit == 2 or unit is None:
+            dpi = x_res, y_res
+        elif unit == 3:
+            dpi = x_res * 2.54, y_res * 2.54
+
+    return _header("TIFF", width, height, mode[0], dpi, compression)
+
+
+# ---------------------- Dispatch ----------------------
+
+_PARSERS = {
+    "JPEG": parse_jpeg,
+    "PNG": parse_png,
+    "BMP": parse_bmp,
+    "GIF": parse_gif,
+    "TIFF": parse_tiff,
+    "PCX": parse_pcx,
+}
+
+# Байтов заголовка, достаточных для detect_format
+SIGNATURE_SIZE = 8
+
+
+def detect_format(data):
+    """Формат изображения по сигнатуре в начале файла или None."""
+    if data[:3] == b"\xff\xd8\xff":
+        return "JPEG"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "PNG"
+    if data[:2] == b"BM":
+        return "BMP"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if data[:4] in (b"II\x2a\x00", b"MM\x00\x2a"):
+        return "TIFF"
+    # У PCX нет настоящей сигнатуры: кроме версии проверяем кодирование
+    # (RLE) и глубину, иначе под PCX попадал бы любой файл, начинающийся с \n
+    if len(data) >= 4 and data[0] == 10 and data[1] in (0, 2, 3, 5) \
+            and data[2] == 1 and data[3] in (1, 2, 4, 8):
+        return "PCX"
+    return None
+
+
+def read_header(data, file_size=None):
+    """
+    Разбирает заголовок изображения из буфера.
+
+    Args:
+        data: Начало файла (bytes или mmap). Если это весь файл,
+              file_size можно не указывать.
+        file_size: Полный размер файла.
+
+    Returns:
+        Словарь {"format", "width", "height", "mode", "info"} как у
+        соответствующих атрибутов Pillow, или None, если нужен Pillow.
+    """
+    if file_size is None:
+        file_size = len(data)
+    fmt = detect_format(data[:SIGNATURE_SIZE])
+    if fmt is None:
+        return None
+    try:
+        return _PARSERS[fmt](data, file_size)
+    except (HeaderError, IndexError, KeyError, struct.error):
+        return None
+
+
+def read_file_header(filepath: str):
+    """
+    Читает заголовок файла одним read() (небольшие файлы) или через mmap.
+
+    Returns:
+        Результат read_header или None, если файл нужно открыть Pillow.
+    """
+    try:
+        with open(filepath, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return None
+            if size <= SMALL_FILE_SIZE:
+                return read_header(f.read(), size)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return read_header(data, size)
+    except (OSError, ValueError):
+        return None
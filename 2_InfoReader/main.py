@@ -2,7 +2,7 @@ import sys
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtCore import QThread
 from gui import MainWindow
-from worker import Worker
+from worker import ExtendedWorker, Worker
 
 
 class Application:
@@ -20,6 +20,17 @@ class Application:
 
         # Подключение сигнала выбора папки из GUI к нашему методу запуска обработки
         self.main_window.folder_selected_signal.connect(self.start_processing)
+        self.main_window.cancel_requested.connect(self.cancel_processing)
+
+        # Фоновое чтение расширенных полей живет все время работы приложения
+        self.extended_thread = QThread()
+        self.extended_logic = ExtendedWorker()
+        self.extended_logic.moveToThread(self.extended_thread)
+        self.extended_logic.fields_ready.connect(self.main_window.add_extended_fields)
+        self.extended_thread.started.connect(self.extended_logic.run)
+        self.main_window.extended_requested.connect(self.request_extended)
+        self.app.aboutToQuit.connect(self.stop_threads)
+        self.extended_thread.start()
 
         self.main_window.show()
 
@@ -36,16 +47,20 @@ class Application:
             # 1. Создаем новый QThread
         self.worker_thread = QThread()
 
-        # 2. Создаем объект логики Worker и передаем ему путь к папке
-        self.worker_logic = Worker(folder_path)
+        # 2. Создаем объект логики Worker и передаем ему путь к папке и настройки пула
+        self.worker_logic = Worker(folder_path, **self.main_window.scan_settings())
 
         # 3. Перемещаем объект Worker в созданный поток
         self.worker_logic.moveToThread(self.worker_thread)
 
         # 4. Соединяем сигналы Worker'а со слотами в MainWindow (GUI)
-        self.worker_logic.data_ready.connect(self.main_window.add_file_row)
+        self.worker_logic.rows_ready.connect(self.main_window.add_file_rows)
+        self.worker_logic.rows_changed.connect(self.main_window.update_file_rows)
+        self.worker_logic.rows_removed.connect(self.main_window.remove_file_rows)
+        self.worker_logic.watching.connect(self.main_window.set_watching)
         self.worker_logic.finished.connect(self.main_window.processing_finished)
         self.worker_logic.progress_update.connect(self.main_window.status_update_signal.emit)
+        self.worker_logic.progress_stats.connect(self.main_window.show_progress)
         self.worker_logic.error.connect(self.main_window.display_error)
 
         # 5. Соединяем сигнал запуска потока с методом, который выполняет работу
@@ -55,8 +70,41 @@ class Application:
         self.worker_logic.finished.connect(self.worker_thread.quit)
 
         # 6. Запускаем поток
+        self.main_window.set_scanning(True)
         self.worker_thread.start()
 
+    def cancel_processing(self):
+        """
+        Останавливает текущее сканирование. stop() вызывается напрямую в потоке
+        GUI: поток Worker'а занят и не обработал бы сигнал до конца сканирования.
+        """
+        if self.worker_logic is not None:
+            self.worker_logic.stop()
+
+    def request_extended(self, rows: list, use_cache: bool):
+        """
+        Передает запрос расширенных полей. Как и stop(), request() вызывается
+        напрямую: поток ExtendedWorker'а занят своим циклом чтения.
+        """
+        self.extended_logic.request(rows, use_cache)
+
+    def stop_extended(self):
+        self.extended_logic.stop()
+        self.extended_thread.quit()
+        self.extended_thread.wait()
+
+    def stop_threads(self):
+        """
+        Останавливает фоновые потоки перед выходом. Сканирование или слежение
+        за папкой дожидается закрытия наблюдения и кэша в Worker'е, иначе
+        QThread уничтожился бы работающим.
+        """
+        if self.worker_thread is not None and self.worker_thread.isRunning():
+            self.worker_logic.stop()
+            self.worker_thread.quit()
+            self.worker_thread.wait()
+        self.stop_extended()
+
     def run(self):
         """
         Запуск основного цикла приложения.
@@ -65,6 +113,11 @@ class Application:
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        # Аргументы командной строки -> сканирование без GUI, см. cli.py
+        from cli import main
+        sys.exit(main(sys.argv[1:]))
+
     # Запуск приложения
     app_instance = Application()
     app_instance.run()
@@ -0,0 +1,323 @@
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from archive_reader import split_member_path
+from records import ImageRecord
+
+# Постоянный кэш метаданных для повторных сканирований.
+#
+# Запись InfoReader (records.ImageRecord) зависит только от содержимого
+# файла, поэтому ее можно сохранить в SQLite и при следующем сканировании вернуть без
+# открытия файла. Ключ записи - путь, а актуальность проверяется по
+# размеру, mtime (в наносекундах) и номеру inode: если хоть одно
+# изменилось, файл читается заново и запись перезаписывается.
+#
+# Каждая проверка отмечает запись номером текущего сканирования, поэтому
+# после полного прохода по папке записи удаленных файлов находятся одним
+# запросом (prune). prune_missing проверяет существование всех файлов
+# кэша - для периодической чистки.
+#
+# Расширенные поля (extended_fields) хранятся в той же строке, в столбце
+# extended, и проверяются по тому же ключу. Они дописываются позже, по
+# запросу (put_extended), а put основной записи их сбрасывает: файл
+# изменился, и поля нужно читать заново.
+#
+# С кэшем одновременно работают несколько соединений (сканирование и
+# чтение расширенных полей в окне, duplicates.py). Поэтому изменения
+# копятся в памяти и записываются одной короткой транзакцией в commit():
+# блокировка записи не держится, пока соединение ждет чтения файлов, а
+# занятая база ожидается до BUSY_TIMEOUT секунд.
+#
+#   python metadata_cache.py                  количество записей
+#   python metadata_cache.py --prune-missing  удалить записи удаленных файлов
+#   python metadata_cache.py --clear          очистить кэш
+
+# Увеличить при изменении полей ImageRecord или схемы:
+# старые записи тогда отбрасываются
+CACHE_VERSION = 3
+
+# Сколько секунд ждать, пока база занята записью другого соединения
+BUSY_TIMEOUT = 30.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    seen INTEGER NOT NULL,
+    metadata TEXT NOT NULL,
+    extended TEXT
+);
+CREATE INDEX IF NOT EXISTS files_folder ON files (folder);
+"""
+
+
+def default_cache_path():
+    path = os.environ.get("INFOREADER_CACHE")
+    if path:
+        return path
+    return os.path.join(os.path.expanduser("~"), ".cache", "inforeader", "metadata.sqlite")
+
+
+class MetadataCache:
+    """
+    Кэш строк метаданных в SQLite.
+
+    Соединение SQLite привязано к потоку, поэтому объект нужно создавать
+    в том потоке, который будет с ним работать (в Worker - в run_processing).
+    Изменения копятся в памяти и записываются каждые commit_every изменений,
+    в commit() и в close(); чтение видит их только после записи.
+    """
+
+    def __init__(self, path=None, commit_every=1000):
+        self.path = path or default_cache_path()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.commit_every = commit_every
+        self.hits = 0
+        self.misses = 0
+        # Отложенные изменения: пары (запрос, параметры)
+        self._writes = []
+        # Номер сканирования для отметки просмотренных записей
+        self.scan_id = time.time_ns()
+
+        # timeout задает busy_timeout соединения
+        self.db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        (version,) = self.db.execute("PRAGMA user_version").fetchone()
+        if version != CACHE_VERSION:
+            self.db.execute("DROP TABLE IF EXISTS files")
+            self.db.execute(f"PRAGMA user_version={CACHE_VERSION}")
+        self.db.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _key(path):
+        return os.path.abspath(path)
+
+    def _write(self, sql, params):
+        self._writes.append((sql, params))
+        if len(self._writes) >= self.commit_every:
+            self.commit()
+
+    def get(self, path, st):
+        """
+        Возвращает сохраненный ImageRecord или None, если файла нет в кэше
+        или он изменился.
+
+        Args:
+            path: Путь к файлу.
+            st: Результат os.stat для файла.
+        """
+        key = self._key(path)
+        row = self.db.execute(
+            "SELECT size, mtime_ns, inode, metadata FROM files WHERE path = ?", (key,)
+        ).fetchone()
+        if row is None or row[:3] != (st.st_size, st.st_mtime_ns, st.st_ino):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._write("UPDATE files SET seen = ? WHERE path = ?", (self.scan_id, key))
+        return ImageRecord.from_list(json.loads(row[3]))
+
+    def put(self, path, st, record):
+        """Сохраняет ImageRecord файла с ключом из os.stat (st)."""
+        key = self._key(path)
+        self._write(
+            "INSERT OR REPLACE INTO files (path, folder, size, mtime_ns, inode, seen, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, os.path.dirname(key), st.st_size, st.st_mtime_ns, st.st_ino,
+             self.scan_id, json.dumps(record.to_list(), ensure_ascii=False)),
+        )
+
+    def get_extended(self, path, st):
+        """
+        Сохраненные расширенные поля файла (словарь имя -> значение, может
+        содержать не все поля) или None, если их нет или файл изменился.
+        """
+        row = self.db.execute(
+            "SELECT size, mtime_ns, inode, extended FROM files WHERE path = ?", (self._key(path),)
+        ).fetchone()
+        if row is None or row[3] is None or row[:3] != (st.st_size, st.st_mtime_ns, st.st_ino):
+            return None
+        return json.loads(row[3])
+
+    def put_extended(self, path, st, fields):
+        """
+        Сохраняет расширенные поля файла (все известные, а не только новые).
+        Поля хранятся только вместе с актуальной основной записью: если ее
+        нет в кэше или файл изменился, поля не сохраняются.
+        """
+        self._write(
+            "UPDATE files SET extended = ? WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+            (json.dumps(fields, ensure_ascii=False), self._key(path), st.st_size, st.st_mtime_ns, st.st_ino),
+        )
+
+    def invalidate(self, path=None):
+        """Удаляет запись файла, а без аргумента - весь кэш."""
+        if path is None:
+            self._writes.append(("DELETE FROM files", ()))
+        else:
+            self._writes.append(("DELETE FROM files WHERE path = ?", (self._key(path),)))
+        self.commit()
+
+    def _folder_condition(self, folder, recursive):
+        """Условие WHERE (и параметры) для записей папки, с подпапками при recursive."""
+        folder = self._key(folder)
+        condition = "folder = ?"
+        params = [folder]
+        if recursive:
+            # Подпапки: folder + sep <= x < folder + (sep + 1), без экранирования LIKE
+            prefix = folder.rstrip(os.sep) + os.sep
+            condition += " OR (folder >= ? AND folder < ?)"
+            params += [prefix, prefix[:-1] + chr(ord(os.sep) + 1)]
+        return f"({condition})", params
+
+    def count(self, folder, recursive=False):
+        """Число записей папки - оценка числа файлов до сканирования."""
+        condition, params = self._folder_condition(folder, recursive)
+        return self.db.execute(f"SELECT COUNT(*) FROM files WHERE {condition}", params).fetchone()[0]
+
+    def prune(self, folder, recursive=False):
+        """
+        Удаляет записи папки, не встреченные в текущем сканировании.
+        Вызывать только после полного (не прерванного) прохода по папке.
+
+        Returns:
+            Количество удаленных записей.
+        """
+        condition, params = self._folder_condition(folder, recursive)
+        # Отметки seen записываются в той же транзакции, до удаления
+        with self.db:
+            self._flush()
+            cursor = self.db.execute(f"DELETE FROM files WHERE seen != ? AND {condition}",
+                                     [self.scan_id] + params)
+        return cursor.rowcount
+
+    def prune_missing(self):
+        """
+        Удаляет записи файлов, которых больше нет на диске. Для членов архивов
+        проверяется только наличие архива.
+        """
+        missing = [(path,) for (path,) in self.db.execute("SELECT path FROM files")
+                   if not os.path.exists((split_member_path(path) or (path,))[0])]
+        self._writes.extend(("DELETE FROM files WHERE path = ?", row) for row in missing)
+        self.commit()
+        return len(missing)
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def _flush(self):
+        writes, self._writes = self._writes, []
+        for sql, params in writes:
+            self.db.execute(sql, params)
+
+    def commit(self):
+        """Записывает накопленные изменения одной транзакцией."""
+        if not self._writes:
+            return
+        with self.db:
+            self._flush()
+
+    def close(self):
+        try:
+            self.commit()
+        finally:
+            self.db.close()
+
+
+class FailSafeCache:
+    """
+    MetadataCache для фоновых потоков и командной строки: ошибка SQLite
+    (база долго занята, повреждена, диск заполнен) не прерывает работу - о
+    ней сообщается один раз через onerror, и дальше кэш ведет себя как пустой.
+    """
+
+    def __init__(self, cache, onerror):
+        self.cache = cache
+        self.onerror = onerror
+        self.failed = False
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    def _call(self, name, *args, default=None):
+        if self.failed:
+            return default
+        try:
+            return getattr(self.cache, name)(*args)
+        except sqlite3.Error as e:
+            self.failed = True
+            self.onerror(e)
+            return default
+
+    def get(self, path, st):
+        return self._call("get", path, st)
+
+    def put(self, path, st, record):
+        self._call("put", path, st, record)
+
+    def get_extended(self, path, st):
+        return self._call("get_extended", path, st)
+
+    def put_extended(self, path, st, fields):
+        self._call("put_extended", path, st, fields)
+
+    def invalidate(self, path=None):
+        self._call("invalidate", path)
+
+    def count(self, folder, recursive=False):
+        return self._call("count", folder, recursive, default=0)
+
+    def prune(self, folder, recursive=False):
+        return self._call("prune", folder, recursive, default=0)
+
+    def commit(self):
+        self._call("commit")
+
+    def close(self):
+        if not self.failed:
+            self._call("commit")
+        try:
+            self.cache.db.close()
+        except sqlite3.Error:
+            pass
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обслуживание кэша метаданных InfoReader.")
+    parser.add_argument("--cache", help=f"файл кэша (по умолчанию: {default_cache_path()})")
+    parser.add_argument("--prune-missing", action="store_true", help="удалить записи удаленных файлов")
+    parser.add_argument("--clear", action="store_true", help="очистить кэш")
+    args = parser.parse_args(argv)
+
+    with MetadataCache(args.cache) as cache:
+        if args.clear:
+            cache.invalidate()
+        if args.prune_missing:
+            print(f"Удалено записей: {cache.prune_missing()}")
+        print(f"{cache.path}: {len(cache)} записей")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import heapq
+import os
+import time
+
+# Статистика хода сканирования: скорость, оценка оставшегося времени,
+# время по форматам и самые медленные файлы.
+#
+# Общее число файлов известно заранее, если папки были предварительно
+# пересчитаны (Scanner(precount=True)), иначе берется оценка - число
+# записей этих папок в кэше с прошлого сканирования. Без того и другого
+# ETA не вычисляется, но скорость показывается всегда.
+#
+# snapshot() возвращает простой словарь (числа, строки, списки), поэтому
+# его можно передать в сигнал Qt или записать строкой JSON.
+
+SLOWEST_COUNT = 10
+
+
+def format_key(path):
+    """Группа для статистики по форматам: расширение файла."""
+    ext = os.path.splitext(path)[1].lower().lstrip(".")
+    return ext or "(без расширения)"
+
+
+class ScanProgress:
+    def __init__(self, total=None, total_estimated=False, slowest_count=SLOWEST_COUNT):
+        """
+        Args:
+            total: Ожидаемое число файлов или None, если неизвестно.
+            total_estimated: total - оценка, а не точный пересчет.
+            slowest_count: Сколько самых медленных файлов хранить.
+        """
+        self.total = total
+        self.total_estimated = total_estimated
+        self.slowest_count = slowest_count
+        self.start_time = time.monotonic()
+
+        self.files = 0
+        self.errors = 0
+        self.bytes = 0
+        self.cached = 0
+        # Формат -> [файлов, секунд извлечения]
+        self.formats = {}
+        # Мин-куча (секунды, путь) из slowest_count самых медленных файлов
+        self._slowest = []
+
+    def add(self, path, size, seconds, error=False, cached=False):
+        """
+        Учитывает обработанный файл.
+
+        Args:
+            path: Путь к файлу.
+            size: Размер файла в байтах (None, если неизвестен).
+            seconds: Время извлечения метаданных (0 для строк из кэша).
+            error: Файл не удалось прочитать.
+            cached: Строка взята из кэша.
+        """
+        self.files += 1
+        if size:
+            self.bytes += size
+        if error:
+            self.errors += 1
+        if cached:
+            self.cached += 1
+            return
+
+        stats = self.formats.setdefault(format_key(path), [0, 0.0])
+        stats[0] += 1
+        stats[1] += seconds
+
+        if len(self._slowest) < self.slowest_count:
+            heapq.heappush(self._slowest, (seconds, path))
+        elif seconds > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (seconds, path))
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def eta(self):
+        """Оценка оставшегося времени в секундах или None."""
+        if not self.total or not self.files:
+            return None
+        remaining = max(self.total - self.files, 0)
+        return remaining * self.elapsed() / self.files
+
+    def snapshot(self, done=False, interrupted=False):
+        """
+        Текущее состояние в виде словаря.
+
+        Args:
+            done: Сканирование закончено (последний снимок).
+            interrupted: Сканирование остановлено до конца.
+        """
+        elapsed = self.elapsed()
+        return {
+            "files": self.files,
+            "errors": self.errors,
+            "cached": self.cached,
+            "bytes": self.bytes,
+            "elapsed": elapsed,
+            "files_per_second": self.files / elapsed if elapsed else 0.0,
+            "bytes_per_second": self.bytes / elapsed if elapsed else 0.0,
+            "total": self.total,
+            "total_estimated": self.total_estimated,
+            "eta": 0.0 if done else self.eta(),
+            "formats": {fmt: {"files": n, "seconds": seconds}
+                        for fmt, (n, seconds) in sorted(self.formats.items())},
+            "slowest": [{"path": path, "seconds": seconds}
+                        for seconds, path in sorted(self._slowest, reverse=True)],
+            "done": done,
+            "interrupted": interrupted,
+        }
+
+
+def format_duration(seconds):
+    """Секунды в виде 1:02:03 или 2:03."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
+
+
+def format_progress(snapshot):
+    """Краткая строка для статус-бара или консоли."""
+    text = (f"Обработано файлов: {snapshot['files']}"
+            f" ({snapshot['files_per_second']:.0f} файлов/с,"
+            f" {snapshot['bytes_per_second'] / 2 ** 20:.1f} МБ/с)")
+    if snapshot["total"]:
+        text += f" из {'~' if snapshot['total_estimated'] else ''}{snapshot['total']}"
+    if snapshot["eta"] is not None and not snapshot["done"]:
+        text += f", осталось {format_duration(snapshot['eta'])}"
+    return text
@@ -0,0 +1,275 @@
+import os
+
+import numpy as np
+
+# Компактное представление метаданных файлов.
+#
+# ImageRecord хранит значения в исходном виде (числа для размера и DPI,
+# короткие строки для режима и сжатия), а строки таблицы вроде "1920x1080"
+# и "300 DPI" получаются только при отображении (display_*). Так строки
+# можно сортировать и фильтровать по числам.
+#
+# Для больших сканирований RecordColumns хранит записи по столбцам в
+# структурированном массиве NumPy: около 34 байт на файл плюс имя файла,
+# вместо словаря из шести строк. Папка, режим, формат и сжатие хранятся
+# кодами в небольших таблицах значений.
+
+# Значение полей строки, если файл не удалось прочитать
+ERROR_VALUE = "Ошибка"
+
+# Режим Pillow -> глубина цвета для таблицы
+# Режим 'L' (8-бит), 'RGB' (24-бит), 'RGBA' (32-бит), 'P' (палитра)
+MODE_TO_DEPTH = {
+    '1': '1-bit (B&W)',
+    'L': '8-bit (Grayscale)',
+    'P': '8-bit (Palette)',
+    'RGB': '24-bit',
+    'RGBA': '32-bit (Alpha)',
+    'CMYK': '32-bit (CMYK)',
+    'I': '32-bit (Integer)',
+    'F': '32-bit (Float)'
+}
+
+
+def compression_name(fmt, info):
+    """Строка сжатия по формату и img.info."""
+    # Эта информация часто хранится в info
+    # Форматы TIFF, PNG, JPEG имеют разные способы хранения этой инфы.
+    if 'compression' in info:
+        return str(info['compression'])
+    if fmt == 'JPEG':
+        # JPEG всегда использует сжатие
+        return "JPEG (Lossy)"
+    if fmt == 'PNG':
+        # PNG всегда использует сжатие без потерь
+        return "PNG (Lossless)"
+    if fmt == 'BMP':
+        # BMP обычно без сжатия, но может быть RLE
+        if info.get('compression', 0) != 0:
+            return f"BMP ({info['compression']})"
+        return "None"
+    if fmt == 'GIF':
+        return "LZW (Lossless)"
+    if fmt == 'PCX':
+        return "RLE (Lossless)"
+    return "N/A or None"
+
+
+def display_size(width, height):
+    return f"{width}x{height}"
+
+
+def display_dpi(dpi_x, dpi_y):
+    if dpi_x is None:
+        return "N/A"
+    if dpi_x == dpi_y:
+        return f"{int(dpi_x)} DPI"
+    return f"{int(dpi_x)}x{int(dpi_y)} DPI"
+
+
+def display_depth(mode):
+    return MODE_TO_DEPTH.get(mode, f"{mode} mode")
+
+
+class ImageRecord:
+    """Метаданные одного файла."""
+
+    __slots__ = ("filename", "format", "width", "height", "mode", "dpi_x", "dpi_y",
+                 "compression", "error")
+
+    def __init__(self, filename, format=None, width=0, height=0, mode=None,
+                 dpi_x=None, dpi_y=None, compression=None, error=None):
+        self.filename = filename
+        self.format = format
+        self.width = width
+        self.height = height
+        self.mode = mode
+        # None - разрешение не указано в файле
+        self.dpi_x = dpi_x
+        self.dpi_y = dpi_y
+        self.compression = compression
+        # Текст ошибки чтения или None
+        self.error = error
+
+    @classmethod
+    def from_image(cls, filename, fmt, width, height, mode, info):
+        """Запись по атрибутам изображения Pillow (format, size, mode, info)."""
+        dpi_x = dpi_y = None
+        if 'dpi' in info:
+            # dpi возвращается как кортеж (x_dpi, y_dpi)
+            dpi_x, dpi_y = (float(v) for v in info['dpi'])
+        return cls(filename, fmt, width, height, mode, dpi_x, dpi_y, compression_name(fmt, info))
+
+    @classmethod
+    def from_error(cls, filename, message):
+        return cls(filename, error=str(message))
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    # ---------------------- Display ----------------------
+
+    def size_text(self):
+        if self.error is not None:
+            return f"Ошибка чтения: {self.error}"
+        return display_size(self.width, self.height)
+
+    def dpi_text(self):
+        return display_dpi(self.dpi_x, self.dpi_y)
+
+    def depth_text(self):
+        return ERROR_VALUE if self.error is not None else display_depth(self.mode)
+
+    def compression_text(self):
+        return ERROR_VALUE if self.error is not None else self.compression
+
+    def to_dict(self):
+        """Строки для таблицы (прежний формат get_image_metadata)."""
+        return {
+            "filename": self.filename,
+            "size_px": self.size_text(),
+            "dpi": self.dpi_text(),
+            "depth": self.depth_text(),
+            "compression": self.compression_text(),
+        }
+
+    # ---------------------- Serialization ----------------------
+
+    def to_list(self):
+        """Значения полей по порядку __slots__ (для JSON)."""
+        return [getattr(self, name) for name in self.__slots__]
+
+    @classmethod
+    def from_list(cls, values):
+        return cls(*values)
+
+    def __eq__(self, other):
+        return isinstance(other, ImageRecord) and self.to_list() == other.to_list()
+
+    def __repr__(self):
+        return f"ImageRecord({', '.join(f'{n}={getattr(self, n)!r}' for n in self.__slots__)})"
+
+
+# ---------------------- Columnar storage ----------------------
+
+RECORD_DTYPE = np.dtype([
+    ("width", np.uint32),
+    ("height", np.uint32),
+    # NaN - разрешение не указано
+    ("dpi_x", np.float64),
+    ("dpi_y", np.float64),
+    # Коды значений в таблицах RecordColumns (-1 - ошибка чтения)
+    ("format", np.int16),
+    ("mode", np.int16),
+    ("compression", np.int16),
+    # Код папки файла (-1 - путь не известен)
+    ("folder", np.int32),
+])
+
+
+class _Codes:
+    """Таблица значений строкового столбца: значение <-> код."""
+
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class RecordColumns:
+    """
+    Набор записей в столбцах NumPy. Массив растет удвоением, так что
+    добавление пачками стоит O(1) в среднем на запись.
+    """
+
+    def __init__(self, capacity=1024):
+        self.data = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self.filenames = []
+        # Номер строки -> текст ошибки (ошибок обычно мало)
+        self.errors = {}
+        self.folders = _Codes()
+        self.formats = _Codes()
+        self.modes = _Codes()
+        self.compressions = _Codes()
+
+    def __len__(self):
+        return len(self.filenames)
+
+    def columns(self):
+        """Представление заполненной части массива."""
+        return self.data[:len(self.filenames)]
+
+    def _row(self, i, record, folder):
+        """Кортеж полей RECORD_DTYPE для записи i."""
+        if record.error is not None:
+            self.errors[i] = record.error
+            return 0, 0, np.nan, np.nan, -1, -1, -1, folder
+        return (
+            record.width, record.height,
+            np.nan if record.dpi_x is None else record.dpi_x,
+            np.nan if record.dpi_y is None else record.dpi_y,
+            self.formats.code(record.format),
+            self.modes.code(record.mode),
+            self.compressions.code(record.compression),
+            folder,
+        )
+
+    def extend(self, records, paths=None):
+        """
+        Добавляет записи (и пути их файлов, если известны).
+
+        Returns:
+            range номеров добавленных записей.
+        """
+        records = list(records)
+        start = len(self.filenames)
+        end = start + len(records)
+        if end > len(self.data):
+            grown = np.zeros(max(end, 2 * len(self.data)), dtype=RECORD_DTYPE)
+            grown[:start] = self.data[:start]
+            self.data = grown
+
+        if paths is None:
+            folders = [-1] * len(records)
+        else:
+            folders = [self.folders.code(os.path.dirname(path)) for path in paths]
+        rows = []
+        for i, record, folder in zip(range(start, end), records, folders):
+            self.filenames.append(record.filename)
+            rows.append(self._row(i, record, folder))
+        self.data[start:end] = rows
+        return range(start, end)
+
+    def set(self, i, record):
+        """Заменяет запись i (файл изменился); путь остается прежним."""
+        self.filenames[i] = record.filename
+        self.errors.pop(i, None)
+        self.data[i] = self._row(i, record, self.data[i]["folder"])
+
+    def path(self, i):
+        """Путь файла записи i или None, если он не был передан в extend."""
+        folder = self.data[i]["folder"]
+        if folder < 0:
+            return None
+        return os.path.join(self.folders.values[folder], self.filenames[i])
+
+    def record(self, i):
+        """ImageRecord строки i."""
+        if i in self.errors:
+            return ImageRecord.from_error(self.filenames[i], self.errors[i])
+        row = self.data[i]
+        dpi_x, dpi_y = float(row["dpi_x"]), float(row["dpi_y"])
+        if np.isnan(dpi_x):
+            dpi_x = dpi_y = None
+        return ImageRecord(
+            self.filenames[i], self.formats.values[row["format"]],
+            int(row["width"]), int(row["height"]), self.modes.values[row["mode"]],
+            dpi_x, dpi_y, self.compressions.values[row["compression"]],
+        )
@@ -0,0 +1,280 @@
+import os
+import time
+
+from archive_reader import (
+    ARCHIVE_ERRORS, ARCHIVE_EXTENSIONS, ArchiveMember, close_archives, is_archive, iter_members,
+    member_path, read_member_record, read_stream_record,
+)
+from extractor import extract_metadata, DEFAULT_WORKERS
+from file_walker import walk_files
+from image_utils import read_image_record
+from progress import ScanProgress
+from records import ImageRecord
+
+# Сканирование папок без Qt: обход (file_walker), кэш (metadata_cache) и
+# параллельное извлечение (extractor) в одном месте. Используется и
+# Worker'ом GUI, и консольным cli.py; записи (records.ImageRecord) - функции emit,
+# а статистика хода (progress.ScanProgress) - функции on_progress.
+#
+# С scan_archives архивы ZIP/TAR обходятся как папки (archive_reader):
+# члены ZIP и несжатого TAR читаются в пуле, как обычные файлы, а члены
+# сжатого TAR - по ходу чтения архива.
+
+# Период вызова on_progress (секунды)
+PROGRESS_INTERVAL = 0.25
+
+
+def timed_metadata(task):
+    """
+    read_image_record (или read_member_record для члена архива) с временем
+    извлечения (функция модуля - для пула процессов).
+    """
+    start = time.perf_counter()
+    if isinstance(task, ArchiveMember):
+        record = read_member_record(task)
+    else:
+        record = read_image_record(task)
+    return record, time.perf_counter() - start
+
+
+class _FileEntry:
+    """Путь файла с нужной Scanner'у частью интерфейса os.DirEntry."""
+    __slots__ = ("path", "name")
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+
+class Scanner:
+    """
+    Сканирует одну или несколько папок и передает каждую строку в emit.
+
+    Файлы, найденные в кэше, отдаются сразу при обходе, остальные - по мере
+    извлечения в пуле. Статистика (self.progress) доступна во время и после
+    run().
+    """
+
+    def __init__(self, roots, max_workers=DEFAULT_WORKERS, ordered=True, max_in_flight=None,
+                 use_processes=False, recursive=False, max_depth=None, include=(), exclude=(),
+                 detect_by_content=False, scan_archives=False, precount=False, should_stop=None, files=None):
+        """
+        Args:
+            roots: Папки для сканирования.
+            max_workers: Количество параллельных обработчиков (1 - последовательно).
+            ordered: True - строки приходят в порядке обхода, False - по готовности.
+            max_in_flight: Предел файлов в работе одновременно (противодавление).
+            use_processes: Использовать пул процессов вместо пула потоков.
+            recursive: Обходить подпапки.
+            max_depth: Предел глубины подпапок (None - без предела).
+            include: Маски имен файлов для отбора (пусто - все файлы).
+            exclude: Маски имен файлов и папок, которые пропускаются.
+            detect_by_content: Искать изображения с любым расширением по сигнатуре.
+            scan_archives: Читать изображения внутри архивов ZIP/TAR (со всеми
+                           папками архива, маски include/exclude - к членам).
+            precount: Пересчитать файлы до сканирования (точный ETA ценой
+                      лишнего обхода папок). Без него ETA оценивается по кэшу.
+            should_stop: Функция без аргументов; True - прекратить сканирование.
+            files: Уже найденные пути файлов и архивов в roots с теми же
+                   настройками отбора (например, FolderWatcher.start()) -
+                   сканируются вместо обхода папок.
+        """
+        self.roots = list(roots)
+        self.max_workers = max_workers
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight
+        self.use_processes = use_processes
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.include = include
+        self.exclude = exclude
+        self.detect_by_content = detect_by_content
+        self.scan_archives = scan_archives
+        self.precount = precount
+        self.should_stop = should_stop or (lambda: False)
+        self.files = files
+        self.progress = ScanProgress()
+        self._archives = []
+
+    def iter_files(self, onerror=None):
+        """Генератор os.DirEntry поддерживаемых файлов (и архивов при scan_archives) всех папок."""
+        if self.files is not None:
+            yield from (_FileEntry(path) for path in self.files)
+            return
+        containers = ARCHIVE_EXTENSIONS if self.scan_archives else ()
+        for root in self.roots:
+            yield from walk_files(
+                root,
+                recursive=self.recursive,
+                max_depth=self.max_depth,
+                include=self.include,
+                exclude=self.exclude,
+                detect_by_content=self.detect_by_content,
+                containers=containers,
+                onerror=onerror,
+            )
+
+    def count_files(self):
+        """Число файлов, которые будут просканированы (отдельный обход)."""
+        count = 0
+        for entry in self.iter_files():
+            if self.should_stop():
+                break
+            if not self._is_archive(entry):
+                count += 1
+                continue
+            try:
+                count += sum(1 for _ in iter_members(entry.path, None, self.include, self.exclude))
+            except ARCHIVE_ERRORS:
+                count += 1
+        return count
+
+    def _is_archive(self, entry):
+        return self.scan_archives and is_archive(entry.name)
+
+    def _expected_total(self, cache):
+        """(число файлов, это оценка) или (None, False), если оценить нечем."""
+        if self.precount:
+            return self.count_files(), False
+        if cache is not None:
+            total = sum(cache.count(root, recursive=self.recursive) for root in self.roots)
+            if total:
+                return total, True
+        return None, False
+
+    def _pending_files(self, entries, cache, stats, emit):
+        """
+        Отдает пути файлов (и ArchiveMember членов архивов), которых нет в
+        кэше (или которые изменились). Строки из кэша передаются в emit сразу,
+        не дожидаясь пула. stats запоминает os.stat отданных файлов.
+        """
+        for entry in entries:
+            if self.should_stop():
+                return
+            path = entry.path
+            try:
+                st = entry.stat()
+            except OSError:
+                st = None
+            if self._is_archive(entry):
+                yield from self._pending_members(path, st, cache, stats, emit)
+                continue
+            if self._from_cache(path, st, cache, emit):
+                continue
+            stats[path] = st
+            yield path
+
+    def _pending_members(self, archive, st, cache, stats, emit):
+        """
+        _pending_files для членов архива. Члены сжатого TAR нельзя прочитать
+        отдельно, поэтому они разбираются здесь же, по ходу чтения архива.
+        """
+        self._archives.append(archive)
+        try:
+            for member, member_st, stream in iter_members(archive, st, self.include, self.exclude):
+                if self.should_stop():
+                    return
+                if self._from_cache(member.path, member_st, cache, emit):
+                    continue
+                if stream is None:
+                    stats[member] = member_st
+                    yield member
+                    continue
+                start = time.perf_counter()
+                record = read_stream_record(member, stream)
+                self._add(member.path, member_st, record, time.perf_counter() - start, cache, emit)
+        except ARCHIVE_ERRORS as e:
+            # Поврежденный или неподдерживаемый архив - строка с ошибкой
+            self._archives.remove(archive)
+            self._add(archive, st, ImageRecord.from_error(os.path.basename(archive), e), 0.0, cache, emit)
+
+    def _from_cache(self, path, st, cache, emit):
+        """Передает в emit запись из кэша; False, если ее там нет."""
+        if st is None or cache is None:
+            return False
+        record = cache.get(path, st)
+        if record is None:
+            return False
+        self.progress.add(path, st.st_size, 0.0, cached=True)
+        emit(path, st, record)
+        return True
+
+    def _add(self, path, st, record, seconds, cache, emit):
+        """Учитывает прочитанную запись: кэш, статистика, emit."""
+        error = record.error is not None
+        if cache is not None and st is not None and not error:
+            cache.put(path, st, record)
+        self.progress.add(path, st.st_size if st is not None else None, seconds, error=error)
+        emit(path, st, record)
+
+    def run(self, emit, cache=None, onerror=None, on_progress=None,
+            progress_interval=PROGRESS_INTERVAL):
+        """
+        Выполняет сканирование.
+
+        Args:
+            emit: Функция (путь, os.stat_result или None, ImageRecord).
+            cache: Открытый MetadataCache или None.
+            onerror: Функция(OSError) для недоступных папок.
+            on_progress: Функция(словарь ScanProgress.snapshot()); вызывается
+                         не чаще раза в progress_interval секунд и в конце.
+
+        Returns:
+            True, если все папки пройдены полностью (не было остановки).
+        """
+        total, estimated = self._expected_total(cache)
+        self.progress = ScanProgress(total, estimated)
+        # Архивы, содержимое которых было прочитано (для prune)
+        self._archives = []
+        complete = False
+        try:
+            complete = self._scan(emit, cache, onerror, on_progress, progress_interval)
+        finally:
+            close_archives()
+            if on_progress is not None:
+                on_progress(self.progress.snapshot(done=True, interrupted=not complete))
+        return complete
+
+    def _scan(self, emit, cache, onerror, on_progress, progress_interval):
+        progress = self.progress
+        last_report = time.monotonic()
+
+        def emit_row(path, st, record):
+            nonlocal last_report
+            emit(path, st, record)
+            if on_progress is not None and time.monotonic() - last_report >= progress_interval:
+                last_report = time.monotonic()
+                on_progress(progress.snapshot())
+
+        stats = {}
+        # Метаданные извлекаются параллельно и приходят по мере готовности
+        results = extract_metadata(
+            self._pending_files(self.iter_files(onerror), cache, stats, emit_row),
+            max_workers=self.max_workers,
+            ordered=self.ordered,
+            max_in_flight=self.max_in_flight,
+            use_processes=self.use_processes,
+            should_stop=self.should_stop,
+            extract=timed_metadata,
+        )
+        for task, (record, seconds) in results:
+            if self.should_stop():
+                results.close()
+                return False
+
+            path = task.path if isinstance(task, ArchiveMember) else task
+            self._add(path, stats.pop(task, None), record, seconds, cache, emit_row)
+
+        if self.should_stop():
+            return False
+        if cache is not None and not (self.include or self.exclude):
+            # Папки пройдены полностью: записи удаленных файлов больше не нужны.
+            # Подпапки чистятся, только если обход не ограничен по глубине
+            for root in self.roots:
+                cache.prune(root, recursive=self.recursive and self.max_depth is None)
+            for archive in self._archives:
+                cache.prune(member_path(archive, ""), recursive=True)
+        return True
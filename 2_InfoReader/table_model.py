@@ -0,0 +1,562 @@
+import os
+from bisect import bisect_left, bisect_right
+from itertools import compress, groupby
+
+import numpy as np
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+from extended_fields import EXTENDED_FIELDS, display_value
+from records import ERROR_VALUE, RecordColumns, display_depth, display_dpi, display_size
+
+# Модель таблицы InfoReader для QTableView.
+#
+# Представление запрашивает данные только для видимых строк, поэтому стоимость
+# перерисовки не зависит от общего числа строк. Записи хранятся по столбцам в
+# records.RecordColumns (числа и коды значений), а текст ячеек вроде
+# "1920x1080" собирается только для видимых строк. Сортировка и фильтр меняют
+# только self._order - список индексов видимых строк. None в _order означает
+# "все строки в порядке поступления" и не занимает памяти.
+#
+# _order всегда упорядочен по возрастанию (убывание - чтение с конца), а рядом
+# хранится _order_keys с ключами сортировки тех же строк. Новые строки при
+# активной сортировке вставляются бинарным поиском по _order_keys и
+# копированием срезов, без повторной сортировки всего списка.
+#
+# В режиме наблюдения строки обновляются на месте (update_rows) и удаляются
+# (remove_rows) по пути файла. Удаленные записи остаются в хранилище, но
+# больше не попадают в _order.
+#
+# После основных столбцов идут расширенные поля (extended_fields.EXTENDED_FIELDS).
+# Их значения приходят позже и только для запрошенных строк (set_extended),
+# поэтому хранятся отдельно: словарь индекс записи -> поля. Пока значений
+# нет, ячейка пуста, а при сортировке по такому столбцу строка идет в конце.
+
+COLUMN_HEADERS = [
+    "Имя файла",
+    "Размер (px)",
+    "Разрешение (DPI)",
+    "Глубина цвета",
+    "Сжатие"
+]
+COL_FILENAME, COL_SIZE_PX, COL_DPI, COL_DEPTH, COL_COMPRESSION = range(len(COLUMN_HEADERS))
+
+# Ключ строк без числа (N/A, ошибки): они идут после числовых
+_NOT_A_NUMBER = float("inf")
+# Ключ расширенного поля без значения (или еще не прочитанного)
+_NO_VALUE = (2, "")
+# Символы текста размера ("1920x1080"): фильтр с другими символами его не проверяет
+_SIZE_CHARS = frozenset("0123456789x")
+# Сколько строк убирать из _order по одной (бинарным поиском); больше -
+# одним проходом по всему _order
+_REBUILD_THRESHOLD = 64
+# Сколько отдельных мест вставки новых строк в отсортированный _order
+# сообщать представлению вставками строк; больше - одной сменой раскладки
+_INSERT_RUNS = 64
+
+
+def _select(records, rows):
+    """(столбцы, имена файлов) записей rows - range или список индексов."""
+    if isinstance(rows, range):
+        return records.data[rows.start:rows.stop], records.filenames[rows.start:rows.stop]
+    return records.data[rows], [records.filenames[i] for i in rows]
+
+
+def _sort_keys(column, records, rows=None):
+    """
+    Ключи сортировки столбца для записей rows (range или список индексов,
+    по умолчанию - все). Размер сортируется по числу пикселей, DPI - по
+    числу, остальное - по тексту ячейки без учета регистра.
+    """
+    data, filenames = _select(records, range(len(records)) if rows is None else rows)
+    if column == COL_FILENAME:
+        return [name.lower() for name in filenames]
+
+    error = data["format"] < 0
+    if column == COL_SIZE_PX:
+        keys = data["width"].astype(np.float64) * data["height"]
+        keys[error] = _NOT_A_NUMBER
+        return keys.tolist()
+    if column == COL_DPI:
+        return np.nan_to_num(data["dpi_x"], nan=_NOT_A_NUMBER).tolist()
+
+    if column == COL_DEPTH:
+        codes, values = data["mode"], [display_depth(mode) for mode in records.modes.values]
+    else:
+        codes, values = data["compression"], records.compressions.values
+    # Код -1 (ошибка чтения) берет последний элемент таблицы
+    table = np.array([value.lower() for value in values] + [ERROR_VALUE.lower()], dtype=object)
+    return table[codes].tolist()
+
+
+def _extended_key(value):
+    """Ключ сортировки значения расширенного поля: числа, затем строки, затем пустые."""
+    if value is None:
+        return _NO_VALUE
+    if isinstance(value, str):
+        return 1, value.lower()
+    return 0, value
+
+
+class MetadataTableModel(QAbstractTableModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._records = RecordColumns()
+        self._order = None
+        self._order_keys = []
+        self._sort_column = None
+        self._descending = False
+        # Ключи сортировки по индексу строки (для текущего столбца сортировки)
+        self._sort_keys = []
+        self._filter = ""
+        # Код режима -> текст глубины цвета
+        self._depths = {}
+        # Индексы удаленных записей (файлы удалены при наблюдении)
+        self._deleted = set()
+        # Путь -> индекс записи; строится при первом обновлении
+        self._positions = None
+        # Расширенные поля (столбцы после COLUMN_HEADERS) и их значения:
+        # индекс записи -> словарь имя поля -> значение
+        self._fields = list(EXTENDED_FIELDS.values())
+        self._extended = {}
+
+    # ---------------------- Qt interface ----------------------
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._records) if self._order is None else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMN_HEADERS) + len(self._fields)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        return self._cell(self._index(index.row()), index.column())
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole:
+            return None
+        if orientation == Qt.Orientation.Horizontal:
+            if section >= len(COLUMN_HEADERS):
+                return self._fields[section - len(COLUMN_HEADERS)].title
+            return COLUMN_HEADERS[section]
+        return section + 1
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        """Сортировка по столбцу; column < 0 - порядок поступления строк."""
+        self.layoutAboutToBeChanged.emit()
+        descending = order == Qt.SortOrder.DescendingOrder
+        if column >= 0 and column == self._sort_column:
+            # Тот же столбец: меняется только направление чтения _order
+            self._descending = descending
+            self.layoutChanged.emit()
+            return
+
+        self._sort_column = column if column >= 0 else None
+        self._descending = descending and self._sort_column is not None
+        if self._sort_column is None:
+            self._sort_keys = []
+        else:
+            self._sort_keys = self._keys(column)
+        self._set_order(self._visible_indices())
+        self.layoutChanged.emit()
+
+    # ---------------------- Rows ----------------------
+
+    def _index(self, position):
+        """Индекс записи видимой строки position."""
+        if self._order is None:
+            return position
+        return self._order[~position if self._descending else position]
+
+    def _cell(self, i, column):
+        """Текст ячейки записи i."""
+        records = self._records
+        if column >= len(COLUMN_HEADERS):
+            fields = self._extended.get(i)
+            if fields is None:
+                return ""
+            return display_value(fields.get(self._fields[column - len(COLUMN_HEADERS)].name))
+        if column == COL_FILENAME:
+            return records.filenames[i]
+        error = records.errors.get(i)
+        row = records.data[i]
+        if column == COL_SIZE_PX:
+            if error is not None:
+                return f"Ошибка чтения: {error}"
+            return display_size(int(row["width"]), int(row["height"]))
+        if column == COL_DPI:
+            dpi_x = row["dpi_x"]
+            return display_dpi(None if np.isnan(dpi_x) else dpi_x, row["dpi_y"])
+        if error is not None:
+            return ERROR_VALUE
+        if column == COL_DEPTH:
+            code = int(row["mode"])
+            depth = self._depths.get(code)
+            if depth is None:
+                depth = self._depths[code] = display_depth(records.modes.values[code])
+            return depth
+        return records.compressions.values[row["compression"]]
+
+    def row(self, position):
+        """Кортеж текстов ячеек видимой строки position."""
+        i = self._index(position)
+        return tuple(self._cell(i, column) for column in range(self.columnCount()))
+
+    def record(self, position):
+        """records.ImageRecord видимой строки position."""
+        return self._records.record(self._index(position))
+
+    def total_count(self):
+        """Число строк без учета фильтра."""
+        return len(self._records) - len(self._deleted)
+
+    def append_rows(self, batch):
+        """Добавляет пачку пар (путь, ImageRecord) (один сигнал на пачку)."""
+        if not batch:
+            return
+        paths, records = zip(*batch)
+        if self._order is None:
+            # Все записи видимы: строки появляются вместе с записями
+            first = len(self._records)
+            self.beginInsertRows(QModelIndex(), first, first + len(records) - 1)
+            self._extend(paths, records)
+            self.endInsertRows()
+            return
+
+        # Строки видимы только через _order: новые записи не видны
+        # представлению, пока их индексы не вставлены в _order
+        visible = self._visible(self._extend(paths, records))
+        if not visible:
+            return
+        if self._sort_column is None:
+            first = len(self._order)
+            self.beginInsertRows(QModelIndex(), first, first + len(visible) - 1)
+            self._order.extend(visible)
+            self.endInsertRows()
+        else:
+            self._insert_sorted(visible)
+
+    def _extend(self, paths, records):
+        """Добавляет записи, их пути и ключи сортировки; возвращает range индексов."""
+        new = self._records.extend(records, paths)
+        if self._positions is not None:
+            self._positions.update(zip(paths, new))
+        if self._sort_column is not None:
+            self._sort_keys.extend(self._keys(self._sort_column, new))
+        return new
+
+    def update_rows(self, batch):
+        """
+        Обновляет строки измененных файлов по пачке пар (путь, ImageRecord).
+        Файлы, которых еще нет в таблице, добавляются.
+        """
+        positions = self._position_map()
+        changed, new = {}, []
+        for path, record in batch:
+            i = positions.get(path)
+            if i is None:
+                new.append((path, record))
+            else:
+                changed[i] = record
+
+        if changed and self._order is None:
+            # Порядок поступления без фильтра: строки остаются на месте
+            last = self.columnCount() - 1
+            for i, record in changed.items():
+                self._records.set(i, record)
+                # Расширенные поля прежнего содержимого файла больше не верны
+                self._extended.pop(i, None)
+                self.dataChanged.emit(self.index(i, 0), self.index(i, last))
+        elif changed:
+            # Строка может сдвинуться при сортировке или выпасть из фильтра
+            indices = sorted(changed)
+            self.layoutAboutToBeChanged.emit()
+            self._hide(indices)
+            for i in indices:
+                self._records.set(i, changed[i])
+                self._extended.pop(i, None)
+            if self._sort_column is not None:
+                for i, key in zip(indices, self._keys(self._sort_column, indices)):
+                    self._sort_keys[i] = key
+            self._show(indices)
+            self.layoutChanged.emit()
+        self.append_rows(new)
+
+    def remove_rows(self, paths):
+        """Убирает строки удаленных файлов."""
+        positions = self._position_map()
+        indices = sorted({positions.pop(path) for path in paths if path in positions})
+        if not indices:
+            return
+        self.layoutAboutToBeChanged.emit()
+        if self._order is None:
+            self._order = list(range(len(self._records)))
+        self._hide(indices)
+        self._deleted.update(indices)
+        for i in indices:
+            self._extended.pop(i, None)
+        self.layoutChanged.emit()
+
+    def _keys(self, column, rows=None):
+        """Ключи сортировки столбца column для записей rows (по умолчанию - всех)."""
+        if column < len(COLUMN_HEADERS):
+            return _sort_keys(column, self._records, rows)
+        name = self._fields[column - len(COLUMN_HEADERS)].name
+        extended = self._extended
+        if rows is None:
+            rows = range(len(self._records))
+        return [_extended_key(extended[i].get(name)) if i in extended else _NO_VALUE for i in rows]
+
+    # ---------------------- Extended fields ----------------------
+
+    def missing_extended(self, positions):
+        """
+        Пары (индекс записи, путь) видимых строк positions, для которых еще
+        нет расширенных полей (запрос для worker.ExtendedWorker).
+        """
+        if not self._fields:
+            return []
+        rows = []
+        for position in positions:
+            i = self._index(position)
+            if i not in self._extended:
+                path = self._records.path(i)
+                if path is not None:
+                    rows.append((i, path))
+        return rows
+
+    def set_extended(self, batch):
+        """
+        Сохраняет расширенные поля по пачке троек (индекс записи, путь, поля).
+        Результаты для строк, которых уже нет (новое сканирование, удаление),
+        отбрасываются по несовпадению пути.
+        """
+        records = self._records
+        fields = {}
+        for i, path, values in batch:
+            if i < len(records) and i not in self._deleted and records.path(i) == path:
+                fields[i] = values
+        if not fields:
+            return
+
+        first, last = len(COLUMN_HEADERS), self.columnCount() - 1
+        sorted_here = self._sort_column is not None and self._sort_column >= first
+        if self._order is None or not (self._filter or sorted_here):
+            # Строки остаются на месте: перерисовка столбцов расширенных полей
+            self._extended.update(fields)
+            if self.rowCount():
+                self.dataChanged.emit(self.index(0, first), self.index(self.rowCount() - 1, last))
+            return
+
+        # Строка может сдвинуться при сортировке по полю или попасть под фильтр
+        indices = sorted(fields)
+        self.layoutAboutToBeChanged.emit()
+        self._hide(indices)
+        self._extended.update(fields)
+        if sorted_here:
+            for i, key in zip(indices, self._keys(self._sort_column, indices)):
+                self._sort_keys[i] = key
+        self._show(indices)
+        self.layoutChanged.emit()
+
+    def _position_map(self):
+        """Путь -> индекс записи для update_rows и remove_rows."""
+        records = self._records
+        if self._positions is None:
+            # Папка с разделителем на конце + имя = os.path.join, но втрое быстрее
+            prefixes = [os.path.join(folder, "") for folder in records.folders.values]
+            deleted = self._deleted
+            self._positions = {
+                prefixes[folder] + name: i
+                for i, (folder, name) in enumerate(zip(records.columns()["folder"].tolist(), records.filenames))
+                if folder >= 0 and i not in deleted
+            }
+        return self._positions
+
+    def clear(self):
+        self.beginResetModel()
+        self._records = RecordColumns()
+        self._sort_keys = []
+        self._depths = {}
+        self._deleted = set()
+        self._positions = None
+        self._extended = {}
+        self._set_order([])
+        self.endResetModel()
+
+    # ---------------------- Filter ----------------------
+
+    def set_filter(self, text):
+        """Оставляет строки, в любой ячейке которых есть text (без учета регистра)."""
+        text = text.strip().lower()
+        if text == self._filter:
+            return
+        self.beginResetModel()
+        self._filter = text
+        self._set_order(self._visible_indices())
+        self.endResetModel()
+
+    def _match(self, rows):
+        """
+        Маска записей rows (range или список индексов), подходящих под фильтр.
+        Текст проверяется один раз для каждого различного размера, DPI и кода
+        значения, а не в каждой строке.
+        """
+        text = self._filter
+        records = self._records
+        data, filenames = _select(records, rows)
+        mask = np.fromiter((text in name.lower() for name in filenames), dtype=bool, count=len(data))
+
+        if set(text) <= _SIZE_CHARS:
+            # Пара (ширина, высота) как одно число для np.unique.
+            # У строк с ошибкой вместо размера текст ошибки (проверяется ниже)
+            sizes, inverse = np.unique((data["width"].astype(np.uint64) << np.uint64(32)) | data["height"],
+                                       return_inverse=True)
+            matched = np.array([text in display_size(size >> 32, size & 0xFFFFFFFF)
+                                for size in sizes.tolist()], dtype=bool)
+            mask |= matched[inverse.ravel()] & (data["format"] >= 0)
+
+        # Пара DPI как одно комплексное число; -1 - разрешение не указано
+        dpis, inverse = np.unique(np.nan_to_num(data["dpi_x"], nan=-1.0)
+                                  + 1j * np.nan_to_num(data["dpi_y"], nan=-1.0), return_inverse=True)
+        matched = np.array([text in display_dpi(None if dpi.real < 0 else dpi.real, dpi.imag).lower()
+                            for dpi in dpis.tolist()], dtype=bool)
+        mask |= matched[inverse.ravel()]
+
+        # Код -1 (ошибка) берет последний элемент: ERROR_VALUE
+        for codes, values in ((data["mode"], [display_depth(mode) for mode in records.modes.values]),
+                              (data["compression"], records.compressions.values)):
+            matched = [text in value.lower() for value in values] + [text in ERROR_VALUE.lower()]
+            mask |= np.array(matched, dtype=bool)[codes]
+
+        if isinstance(rows, range):
+            errors = ((i - rows.start, error) for i, error in records.errors.items() if i in rows)
+            extended = ((i - rows.start, fields) for i, fields in self._extended.items() if i in rows)
+        else:
+            errors = ((k, records.errors[i]) for k, i in enumerate(rows) if i in records.errors)
+            extended = ((k, self._extended[i]) for k, i in enumerate(rows) if i in self._extended)
+        for k, error in errors:
+            if text in f"Ошибка чтения: {error}".lower():
+                mask[k] = True
+        # Расширенные поля - только уже прочитанные
+        for k, fields in extended:
+            if any(value is not None and text in str(value).lower() for value in fields.values()):
+                mask[k] = True
+        return mask
+
+    def _visible(self, indices):
+        """Индексы из indices (range или список), подходящие под фильтр."""
+        if not self._filter:
+            return list(indices)
+        return np.asarray(indices)[self._match(indices)].tolist()
+
+    def _visible_indices(self):
+        all_rows = range(len(self._records))
+        if self._filter:
+            mask = self._match(all_rows)
+            mask[list(self._deleted)] = False
+            return np.flatnonzero(mask).tolist()
+        if self._deleted:
+            return [i for i in all_rows if i not in self._deleted]
+        return list(all_rows)
+
+    # ---------------------- Order ----------------------
+
+    def _set_order(self, indices):
+        """Задает видимые строки (индексы в порядке поступления) с учетом сортировки."""
+        if self._is_identity():
+            self._order, self._order_keys = None, []
+        elif self._sort_column is None:
+            self._order, self._order_keys = indices, []
+        else:
+            keys = self._sort_keys
+            self._order = sorted(indices, key=keys.__getitem__)
+            self._order_keys = [keys[i] for i in self._order]
+
+    def _merge(self, indices):
+        """Вставляет индексы новых строк в отсортированный _order."""
+        keys = self._sort_keys
+        order, order_keys = self._order, self._order_keys
+        merged, merged_keys = [], []
+        start = 0
+        for i in sorted(indices, key=keys.__getitem__):
+            key = keys[i]
+            end = bisect_right(order_keys, key, start)
+            merged += order[start:end]
+            merged_keys += order_keys[start:end]
+            merged.append(i)
+            merged_keys.append(key)
+            start = end
+        merged += order[start:]
+        merged_keys += order_keys[start:]
+        self._order, self._order_keys = merged, merged_keys
+
+    def _insert_sorted(self, indices):
+        """
+        Вставляет индексы новых строк в отсортированный _order. Каждое место
+        вставки - отдельная вставка строк представления; если мест больше
+        _INSERT_RUNS, строки вставляются слиянием при смене раскладки.
+        """
+        keys = self._sort_keys
+        indices = sorted(indices, key=keys.__getitem__)
+        points = [bisect_right(self._order_keys, keys[i]) for i in indices]
+        if len(set(points)) > _INSERT_RUNS:
+            self.layoutAboutToBeChanged.emit()
+            self._merge(indices)
+            self.layoutChanged.emit()
+            return
+
+        inserted = 0
+        for point, run in groupby(zip(points, indices), key=lambda pair: pair[0]):
+            run = [i for _, i in run]
+            position = point + inserted
+            # При убывании строка position видна с конца
+            first = len(self._order) - position if self._descending else position
+            self.beginInsertRows(QModelIndex(), first, first + len(run) - 1)
+            self._order[position:position] = run
+            self._order_keys[position:position] = [keys[i] for i in run]
+            self.endInsertRows()
+            inserted += len(run)
+
+    def _hide(self, indices):
+        """
+        Убирает строки indices из _order. Вызывается до изменения их записей
+        и ключей сортировки (по ним строки находятся в _order).
+        """
+        indices = self._visible(indices)
+        order, order_keys = self._order, self._order_keys
+        if len(indices) > _REBUILD_THRESHOLD:
+            hidden = set(indices)
+            keep = [i not in hidden for i in order]
+            self._order = list(compress(order, keep))
+            if self._sort_column is not None:
+                self._order_keys = list(compress(order_keys, keep))
+            return
+
+        for i in indices:
+            if self._sort_column is None:
+                # Без сортировки _order возрастает
+                position = bisect_left(order, i)
+            else:
+                # Строка - среди строк с тем же ключом
+                position = order.index(i, bisect_left(order_keys, self._sort_keys[i]))
+            del order[position]
+            if self._sort_column is not None:
+                del order_keys[position]
+
+    def _show(self, indices):
+        """Возвращает в _order строки indices, подходящие под фильтр."""
+        indices = self._visible(indices)
+        if not indices:
+            return
+        if self._sort_column is None:
+            # Две возрастающие последовательности: sort сливает их за O(n)
+            self._order.extend(indices)
+            self._order.sort()
+        else:
+            self._merge(indices)
+
+    def _is_identity(self):
+        return self._sort_column is None and not self._filter and not self._deleted
@@ -1,7 +1,31 @@
 import os
-import glob
+import sqlite3
+import threading
+import time
+from itertools import chain
 from PyQt6.QtCore import QObject, QThread, pyqtSignal
-from image_utils import get_image_metadata
+from archive_reader import ARCHIVE_ERRORS, ARCHIVE_EXTENSIONS, group_stream_members, is_archive, stream_members
+from extended_fields import EXTENDED_FIELDS, path_stat, read_extended, read_extended_file
+from extractor import DEFAULT_WORKERS, extract_metadata
+from folder_watcher import FolderWatcher
+from image_utils import READ_ERRORS, read_image_record
+from metadata_cache import FailSafeCache, MetadataCache
+from progress import format_progress
+from scanner import Scanner
+
+# Строки отправляются в GUI пачками: не больше BATCH_SIZE строк и не реже,
+# чем раз в BATCH_INTERVAL секунд, вместо одного сигнала на файл
+BATCH_SIZE = 1000
+BATCH_INTERVAL = 0.1
+
+# Наибольшее ожидание изменений в режиме наблюдения (секунды): с таким
+# периодом проверяется остановка
+WATCH_TIMEOUT = 0.2
+
+# Расширенные поля: сколько строк читать за один проход (результаты
+# отправляются в GUI после каждого прохода) и сколько параллельно
+EXTENDED_BATCH = 32
+EXTENDED_WORKERS = 8
 
 
 class Worker(QObject):
@@ -9,19 +33,107 @@ class Worker(QObject):
     Класс-исполнитель (Worker), который выполняет тяжелую работу в фоновом потоке.
     Наследуется от QObject, чтобы иметь возможность использовать сигналы/слоты.
     """
-    # Сигнал, который отправляет словарь с данными одного обработанного файла
-    data_ready = pyqtSignal(dict)
+    # Сигнал, который отправляет список пар (путь, records.ImageRecord) обработанных файлов
+    rows_ready = pyqtSignal(list)
+    # Режим наблюдения: пары (путь, ImageRecord) новых и измененных файлов
+    rows_changed = pyqtSignal(list)
+    # Режим наблюдения: пути удаленных файлов
+    rows_removed = pyqtSignal(list)
+    # Сканирование закончено, началось наблюдение за папкой
+    watching = pyqtSignal()
     # Сигнал о завершении работы, отправляет общее количество обработанных файлов
     finished = pyqtSignal(int)
     # Сигнал для обновления статус-бара в реальном времени
     progress_update = pyqtSignal(str)
+    # Статистика хода (словарь progress.ScanProgress.snapshot()): скорость, ETA,
+    # время по форматам, самые медленные файлы
+    progress_stats = pyqtSignal(dict)
     # Сигнал для сообщения об ошибках в основной поток
     error = pyqtSignal(str)
 
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, max_workers=DEFAULT_WORKERS, ordered=True,
+                 max_in_flight=None, use_processes=False, use_cache=True, cache_path=None,
+                 recursive=False, max_depth=None, include=(), exclude=(), detect_by_content=False,
+                 scan_archives=False, precount=False, watch=False):
+        """
+        Args:
+            folder_path: Папка для сканирования.
+            max_workers: Количество параллельных обработчиков (1 - последовательно).
+            ordered: True - строки приходят в порядке обхода, False - по готовности.
+            max_in_flight: Предел файлов в работе одновременно (противодавление).
+            use_processes: Использовать пул процессов вместо пула потоков.
+            use_cache: Брать строки неизмененных файлов из кэша метаданных.
+            cache_path: Файл кэша (по умолчанию - metadata_cache.default_cache_path()).
+            recursive: Обходить подпапки.
+            max_depth: Предел глубины подпапок (None - без предела).
+            include: Маски имен файлов для отбора (пусто - все файлы).
+            exclude: Маски имен файлов и папок, которые пропускаются.
+            detect_by_content: Искать изображения с любым расширением по сигнатуре.
+            scan_archives: Читать изображения внутри архивов ZIP/TAR.
+            precount: Пересчитать файлы до сканирования для точного ETA.
+            watch: После сканирования следить за папкой и обновлять строки
+                   добавленных, измененных и удаленных файлов до stop().
+        """
         super().__init__()
         self.folder_path = folder_path
+        self.max_workers = max_workers
+        self.ordered = ordered
+        self.max_in_flight = max_in_flight
+        self.use_processes = use_processes
+        self.use_cache = use_cache
+        self.cache_path = cache_path
+        self.recursive = recursive
+        self.max_depth = max_depth
+        self.include = include
+        self.exclude = exclude
+        self.detect_by_content = detect_by_content
+        self.scan_archives = scan_archives
+        self.precount = precount
+        self.watch = watch
         self._is_running = True
+        self._count = 0
+        self._batch = []
+        self._batch_time = 0.0
+
+    def make_scanner(self, files=None):
+        """Сканер папки с настройками Worker (без Qt); files - см. Scanner."""
+        return Scanner(
+            [self.folder_path],
+            max_workers=self.max_workers,
+            ordered=self.ordered,
+            max_in_flight=self.max_in_flight,
+            use_processes=self.use_processes,
+            recursive=self.recursive,
+            max_depth=self.max_depth,
+            include=self.include,
+            exclude=self.exclude,
+            detect_by_content=self.detect_by_content,
+            scan_archives=self.scan_archives,
+            precount=self.precount,
+            should_stop=lambda: not self._is_running,
+            files=files,
+        )
+
+    def _emit_row(self, path, st, record):
+        """Добавляет запись в пачку для основного потока."""
+        self._batch.append((path, record))
+        if len(self._batch) >= BATCH_SIZE or time.monotonic() - self._batch_time >= BATCH_INTERVAL:
+            self._flush_rows()
+        self._count += 1
+
+    def _emit_progress(self, snapshot):
+        """Отправляет статистику хода; строки до нее уже должны быть в таблице."""
+        self._flush_rows()
+        self.progress_stats.emit(snapshot)
+        if not snapshot["done"]:
+            self.progress_update.emit(format_progress(snapshot))
+
+    def _flush_rows(self):
+        """Отправляет накопленную пачку строк в основной поток."""
+        if self._batch:
+            self.rows_ready.emit(self._batch)
+            self._batch = []
+        self._batch_time = time.monotonic()
 
     def run_processing(self):
         """
@@ -33,36 +145,273 @@ class Worker(QObject):
             self.finished.emit(0)
             return
 
-        supported_extensions = ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.tif', '*.tiff', '*.bmp', '*.pcx']
-        count = 0
+        self._count = 0
+        self._batch = []
+        self._batch_time = time.monotonic()
 
         self.progress_update.emit(f"Начато сканирование папки: {self.folder_path}")
 
-        # Ищем файлы, поддерживаемые нашими форматами
-        for ext in supported_extensions:
-            # glob.glob находит все файлы, соответствующие маске
-            # Используем os.path.join для создания абсолютного пути
-            for filepath in glob.glob(os.path.join(self.folder_path, ext), recursive=False):
-                if not self._is_running:
-                    self.progress_update.emit(f"Обработка прервана пользователем после {count} файлов.")
-                    self.finished.emit(count)
-                    return
+        cache = None
+        if self.use_cache:
+            # Без кэша сканирование просто читает все файлы
+            try:
+                cache = FailSafeCache(MetadataCache(self.cache_path),
+                                      lambda e: self.progress_update.emit(f"Кэш метаданных отключен: {e}"))
+            except (OSError, sqlite3.Error) as e:
+                self.progress_update.emit(f"Кэш метаданных недоступен: {e}")
 
-                # Получаем метаданные, используя нашу функцию из image_utils.py
-                metadata = get_image_metadata(filepath)
+        watcher = None
+        files = None
+        if self.watch:
+            # Слежение начинается до сканирования: изменения во время него
+            # не потеряются, а придут первой пачкой наблюдения. Обход папки
+            # для слежения дает и список файлов для сканирования
+            watcher = self.make_watcher()
+            files = watcher.start()
 
-                # Отправляем данные обратно в основной поток через сигнал
-                self.data_ready.emit(metadata)
+        scanner = self.make_scanner(files)
+        watched = False
+        try:
+            scanner.run(
+                self._emit_row, cache,
+                onerror=lambda e: self.progress_update.emit(f"Папка пропущена: {e}"),
+                on_progress=self._emit_progress,
+            )
+            self._flush_rows()
+            if watcher is not None and self._is_running:
+                watched = True
+                self._watch(watcher, cache, scanner.progress)
+        finally:
+            self._flush_rows()
+            if watcher is not None:
+                watcher.close()
+            if cache is not None:
+                cache.close()
 
-                count += 1
-                if count % 100 == 0:
-                    # Периодически обновляем статус (например, каждые 100 файлов)
-                    self.progress_update.emit(f"Обработано файлов: {count}...")
+        count = self._count
+        if watched:
+            self.progress_update.emit(f"Слежение за папкой остановлено. Просканировано файлов: {count}.")
+            self.finished.emit(count)
+            return
+        if not self._is_running:
+            self.progress_update.emit(f"Обработка прервана пользователем после {count} файлов.")
+            self.finished.emit(count)
+            return
 
-        self.progress_update.emit(f"Обработка завершена. Всего файлов: {count}")
+        progress = scanner.progress
+        summary = (f"Обработка завершена. Всего файлов: {count} за {progress.elapsed():.1f} с"
+                   f" (ошибок: {progress.errors}")
+        if cache is not None and not cache.failed:
+            summary += f", из кэша: {cache.hits}, прочитано: {cache.misses}"
+        summary += ")"
+        self.progress_update.emit(summary)
         # Отправляем сигнал о полном завершении работы
         self.finished.emit(count)
 
+    def make_watcher(self):
+        """Слежение за папкой с отбором файлов, как у сканера."""
+        return FolderWatcher(
+            self.folder_path,
+            recursive=self.recursive,
+            max_depth=self.max_depth,
+            include=self.include,
+            exclude=self.exclude,
+            detect_by_content=self.detect_by_content,
+            containers=ARCHIVE_EXTENSIONS if self.scan_archives else (),
+        )
+
+    def _watch(self, watcher, cache, progress):
+        """Обновляет строки по изменениям в папке, пока не вызван stop()."""
+        self.progress_update.emit(
+            f"Сканирование завершено: {self._count} файлов за {progress.elapsed():.1f} с. "
+            f"Слежение за папкой ({watcher.method})..."
+        )
+        self.watching.emit()
+        updated = removed = 0
+        while self._is_running:
+            try:
+                changed_paths, removed_paths = watcher.poll(WATCH_TIMEOUT)
+            except OSError as e:
+                self.error.emit(f"Слежение за папкой остановлено: {e}")
+                return
+            # Содержимое архивов не отслеживается: их строки обновит новое сканирование
+            changed_paths = {path for path in changed_paths if not is_archive(path)}
+            removed_paths = {path for path in removed_paths if not is_archive(path)}
+            if not (changed_paths or removed_paths):
+                continue
+
+            rows, gone = self._read_changed(changed_paths, cache)
+            removed_paths |= gone
+            if removed_paths:
+                if cache is not None:
+                    for path in removed_paths:
+                        cache.invalidate(path)
+                self.rows_removed.emit(sorted(removed_paths))
+            if rows:
+                self.rows_changed.emit(rows)
+            updated += len(rows)
+            removed += len(removed_paths)
+            self.progress_update.emit(f"Слежение за папкой ({watcher.method}): "
+                                      f"обновлено файлов: {updated}, удалено: {removed}")
+
+    def _read_changed(self, paths, cache):
+        """
+        Метаданные измененных файлов (из кэша или из файла).
+
+        Returns:
+            (список пар (путь, ImageRecord), множество путей уже удаленных файлов)
+        """
+        rows, gone, stats = [], set(), {}
+        for path in sorted(paths):
+            try:
+                st = os.stat(path)
+            except OSError:
+                gone.add(path)
+                continue
+            record = cache.get(path, st) if cache is not None else None
+            if record is None:
+                stats[path] = st
+            else:
+                rows.append((path, record))
+
+        # Пачки изменений обычно малы: пул потоков без процессов
+        for path, record in extract_metadata(list(stats), max_workers=self.max_workers,
+                                             should_stop=lambda: not self._is_running,
+                                             extract=read_image_record):
+            if cache is not None and record.error is None:
+                cache.put(path, stats[path], record)
+            rows.append((path, record))
+        if cache is not None:
+            cache.commit()
+        return rows, gone
+
     def stop(self):
-        """Метод для безопасной остановки потока, если это потребуется."""
+        """
+        Останавливает сканирование или наблюдение. Вызывается напрямую из потока GUI (не через
+        очередь сигналов потока Worker'а, который занят run_processing).
+        Ожидание результатов пула прерывается за extractor.STOP_POLL_INTERVAL.
+        """
         self._is_running = False
+
+
+class ExtendedWorker(QObject):
+    """
+    Фоновое чтение расширенных полей (extended_fields) по запросу таблицы.
+
+    GUI вызывает request() со строками, которые сейчас видны или выделены;
+    новый запрос заменяет еще не начатый остаток прежнего (строки, которые
+    пользователь уже пролистал, не читаются). Поля берутся из кэша
+    метаданных, а прочитанные сохраняются в него.
+    """
+    # Список троек (индекс записи, путь, словарь полей)
+    fields_ready = pyqtSignal(list)
+
+    def __init__(self, max_workers=EXTENDED_WORKERS, cache_path=None):
+        super().__init__()
+        self.max_workers = max_workers
+        self.cache_path = cache_path
+        self._condition = threading.Condition()
+        self._pending = []
+        self._use_cache = True
+        self._is_running = True
+
+    def request(self, rows, use_cache=True):
+        """
+        Задает строки для чтения: список пар (индекс записи, путь). Вызывается
+        напрямую из потока GUI.
+        """
+        with self._condition:
+            self._pending = list(rows)
+            self._use_cache = use_cache
+            self._condition.notify()
+
+    def stop(self):
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+    def _next_batch(self):
+        """Следующая пачка строк (ждет запроса) или None после stop()."""
+        with self._condition:
+            while self._is_running and not self._pending:
+                self._condition.wait()
+            if not self._is_running:
+                return None
+            batch = self._pending[:EXTENDED_BATCH]
+            del self._pending[:EXTENDED_BATCH]
+            return batch, self._use_cache
+
+    def run(self):
+        """Цикл чтения до stop() (запускается в отдельном QThread)."""
+        # Без кэша поля просто читаются каждый раз
+        cache = None
+        try:
+            cache = FailSafeCache(MetadataCache(self.cache_path), lambda e: None)
+        except (OSError, sqlite3.Error):
+            pass
+
+        names = list(EXTENDED_FIELDS)
+        try:
+            while True:
+                task = self._next_batch()
+                if task is None:
+                    break
+                batch, use_cache = task
+                self.fields_ready.emit(self._read(batch, names, cache if use_cache else None))
+        finally:
+            if cache is not None:
+                cache.close()
+
+    def _read(self, batch, names, cache):
+        """Тройки (индекс, путь, поля) для пачки пар (индекс, путь)."""
+        results, pending = [], {}
+        for i, path in batch:
+            try:
+                st = path_stat(path)
+            except ARCHIVE_ERRORS + (KeyError,):
+                # Файл удален: полей нет, строку уберет слежение или новое сканирование
+                results.append((i, path, dict.fromkeys(names)))
+                continue
+            fields = cache.get_extended(path, st) if cache is not None else None
+            missing = [name for name in names if fields is None or name not in fields]
+            if missing:
+                pending[path] = (i, st, fields or {}, missing)
+            else:
+                results.append((i, path, {name: fields[name] for name in names}))
+
+        # Члены сжатых TAR читаются одним проходом по архиву, остальные - в пуле
+        streamed, other = group_stream_members(pending)
+        for path, values in chain(
+                self._read_streamed(streamed, pending),
+                extract_metadata(other, max_workers=self.max_workers,
+                                 should_stop=lambda: not self._is_running,
+                                 extract=lambda path: read_extended(path, pending[path][3]))):
+            i, st, fields, _ = pending[path]
+            # В кэше рядом могут лежать и другие данные (хэши duplicates.py)
+            fields = {**fields, **values}
+            if cache is not None:
+                cache.put_extended(path, st, fields)
+            results.append((i, path, {name: fields[name] for name in names}))
+        if cache is not None:
+            cache.commit()
+        return results
+
+    def _read_streamed(self, streamed, pending):
+        """Пары (путь, поля) членов сжатых TAR (словарь архив -> пути), по архиву за проход."""
+        for archive, paths in streamed.items():
+            left = set(paths)
+            try:
+                for path, f in stream_members(archive, paths):
+                    if not self._is_running:
+                        return
+                    left.discard(path)
+                    try:
+                        values = read_extended_file(f, pending[path][3])
+                    except READ_ERRORS:
+                        values = dict.fromkeys(pending[path][3])
+                    yield path, values
+            except ARCHIVE_ERRORS:
+                pass
+            # Члены, которых нет или которые не прочитаны из-за ошибки архива
+            for path in sorted(left):
+                yield path, dict.fromkeys(pending[path][3])
@@ -0,0 +1,334 @@
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from pipeline import describe_step, parse_step, run_step
+
+# Пакетная обработка папок одной цепочкой шагов:
+#
+#   python batch.py scans -r -o out --step threshold --step open:cross:5
+#   python batch.py a.png b.png -o out --step gauss:5 --format png --report report.jsonl
+#   python batch.py --list files.txt -o out --step close:ellipse:7 --workers 8
+#
+# Работа идет конвейером из трех стадий, которые выполняются одновременно
+# для разных файлов: чтение файлов (потоки, с опережением на --prefetch
+# файлов), декодирование + шаги + кодирование (пул процессов, между
+# процессами передаются сжатые байты, а не массивы) и запись результатов
+# (отдельный поток). Файлов в работе не больше, чем процессов плюс
+# опережение чтения, поэтому память не зависит от размера пакета.
+#
+# Процессы запускаются через spawn: fork процесса с потоками (GUI, потоки
+# чтения и записи) может унаследовать захваченные блокировки. Если процесс
+# пула падает (например, нехватка памяти), его файлы и все оставшиеся
+# отмечаются ошибкой, а уже готовые результаты сохраняются.
+#
+# Пути результатов повторяют пути исходных файлов относительно общей
+# родительской папки входов: файлы из одной папки (или одна папка) дают
+# имена без папок, а одноименные файлы из разных папок - a/x.png и
+# b/x.png. Если два исходных файла все же дают один файл результата
+# (например, x.png и x.jpg с --format png), пакет не запускается.
+#
+# Для каждого файла выводится строка JSON со временем стадий или ошибкой,
+# в конце - итог в stderr.
+
+IMAGE_EXTENSIONS = (".bmp", ".jpg", ".jpeg", ".png", ".tif", ".tiff", ".webp", ".pbm", ".pgm", ".ppm", ".pnm")
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Способ запуска процессов пула (см. начало модуля)
+MP_CONTEXT = "spawn"
+
+# Потоков чтения файлов и сколько файлов читать наперед
+READ_THREADS = 2
+DEFAULT_PREFETCH = 4
+
+# Итог одного файла: пути, время стадий (с) и ошибка (None - успешно)
+FileResult = namedtuple("FileResult", "src dst read decode compute encode write total error")
+
+
+# ---------------------- Files ----------------------
+
+def list_images(inputs, recursive=False, exclude_dir=None):
+    """
+    Пары (исходный файл, путь относительно папки результата).
+
+    Args:
+        inputs: Папки и файлы. Из папок берутся файлы с расширениями
+            IMAGE_EXTENSIONS, файлы берутся как есть; повторы пропускаются.
+        recursive: Обходить подпапки.
+        exclude_dir: Папка, файлы из которой пропускаются (папка результата).
+
+    Относительный путь - от общей родительской папки входов (для файла -
+    его папки, см. начало модуля).
+    """
+    exclude_dir = os.path.abspath(exclude_dir) if exclude_dir else None
+    found = []
+    bases = []
+    for path in inputs:
+        if not os.path.isdir(path):
+            found.append(path)
+            bases.append(os.path.dirname(os.path.abspath(path)))
+            continue
+        bases.append(os.path.abspath(path))
+        for root, dirs, names in os.walk(path):
+            if exclude_dir is not None and os.path.abspath(root) == exclude_dir:
+                dirs[:] = []
+                continue
+            dirs.sort()
+            if not recursive:
+                dirs[:] = []
+            for name in sorted(names):
+                if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                    found.append(os.path.join(root, name))
+    if not found:
+        return []
+
+    try:
+        base = os.path.commonpath(bases)
+    except ValueError:
+        # Разные диски (Windows): общей папки нет, остаются имена файлов
+        base = None
+    files = []
+    seen = set()
+    for path in found:
+        full = os.path.abspath(path)
+        if full in seen:
+            continue
+        seen.add(full)
+        files.append((path, os.path.basename(path) if base is None else os.path.relpath(full, base)))
+    return files
+
+
+def plan_outputs(files, output_dir, output_format=None):
+    """
+    Задания (исходный файл, файл результата). Расширение результата - как у
+    исходного или output_format ("png", ".jpg", ...).
+
+    Raises:
+        ValueError: Два исходных файла дают один файл результата.
+    """
+    jobs = []
+    sources = {}
+    for src, relative in files:
+        if output_format:
+            relative = os.path.splitext(relative)[0] + "." + output_format.lstrip(".")
+        dst = os.path.join(output_dir, relative)
+        key = os.path.normcase(os.path.abspath(dst))
+        if key in sources:
+            raise ValueError(f"Файлы {sources[key]} и {src} дают один результат {dst}")
+        sources[key] = src
+        jobs.append((src, dst))
+    return jobs
+
+
+def _read_file(path):
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    return data, time.perf_counter() - start
+
+
+def _write_file(path, data):
+    start = time.perf_counter()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return time.perf_counter() - start
+
+
+# ---------------------- Processing ----------------------
+
+def process_encoded(data, steps, extension):
+    """
+    Декодирует файл, применяет шаги и кодирует результат (функция модуля -
+    для пула процессов).
+
+    Returns:
+        (байты результата, время декодирования, шагов и кодирования в секундах).
+    """
+    start = time.perf_counter()
+    image_data = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if image_data is None:
+        raise ValueError("Не удалось декодировать изображение")
+    decoded = time.perf_counter()
+    for step in steps:
+        image_data = run_step(image_data, step)
+    computed = time.perf_counter()
+    ok, encoded = cv2.imencode(extension, image_data)
+    if not ok:
+        raise ValueError(f"Не удалось закодировать результат в {extension}")
+    return encoded.tobytes(), decoded - start, computed - decoded, time.perf_counter() - computed
+
+
+def run_batch(jobs, steps, max_workers=DEFAULT_WORKERS, prefetch=DEFAULT_PREFETCH,
+              on_result=None, should_stop=None):
+    """
+    Обрабатывает файлы конвейером (см. начало модуля).
+
+    Args:
+        jobs: Пары (исходный файл, файл результата).
+        steps: Последовательность pipeline.Step.
+        max_workers: Процессов обработки (1 - поток в текущем процессе).
+        prefetch: Сколько файлов читать наперед.
+        on_result: Функция (FileResult), вызывается по готовности каждого файла.
+        should_stop: Функция без аргументов; True - новые файлы не начинаются.
+
+    Returns:
+        Список FileResult в порядке готовности.
+    """
+    steps = list(steps)
+    results = []
+    queue = deque(jobs)
+    # Прочитанные файлы, ждущие свободного процесса
+    ready = deque()
+    # Future -> (стадия, исходный файл, файл результата, время стадий, начало)
+    active = {}
+    busy = 0
+
+    def finish(src, dst, timings, started, error=None):
+        timings = {**dict.fromkeys(("read", "decode", "compute", "encode", "write")), **timings}
+        result = FileResult(src, dst, total=time.perf_counter() - started, error=error, **timings)
+        results.append(result)
+        if on_result is not None:
+            on_result(result)
+
+    if max_workers > 1:
+        pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(MP_CONTEXT))
+    else:
+        pool = ThreadPoolExecutor(max_workers=1)
+    with ThreadPoolExecutor(max_workers=READ_THREADS) as readers, pool, \
+            ThreadPoolExecutor(max_workers=1) as writer:
+        while queue or ready or active:
+            stopping = should_stop is not None and should_stop()
+            if stopping:
+                queue.clear()
+                ready.clear()
+
+            # Чтение наперед: файлов в работе не больше max_workers + prefetch
+            while queue and len(active) + len(ready) < max_workers + prefetch:
+                src, dst = queue.popleft()
+                active[readers.submit(_read_file, src)] = ("read", src, dst, {}, time.perf_counter())
+            while ready and busy < max_workers:
+                data, src, dst, timings, started = ready.popleft()
+                extension = os.path.splitext(dst)[1] or os.path.splitext(src)[1]
+                try:
+                    future = pool.submit(process_encoded, data, steps, extension)
+                except BrokenProcessPool as e:
+                    # Пул уже не примет ни одного файла
+                    finish(src, dst, timings, started, f"{type(e).__name__}: {e}")
+                    continue
+                active[future] = ("process", src, dst, timings, started)
+                busy += 1
+            if not active:
+                continue
+
+            done, _ = wait(active, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage, src, dst, timings, started = active.pop(future)
+                busy -= stage == "process"
+                try:
+                    value = future.result()
+                except Exception as e:
+                    finish(src, dst, timings, started, f"{type(e).__name__}: {e}")
+                    continue
+                if stage == "read":
+                    data, timings["read"] = value
+                    if not stopping:
+                        ready.append((data, src, dst, timings, started))
+                elif stage == "process":
+                    encoded, timings["decode"], timings["compute"], timings["encode"] = value
+                    active[writer.submit(_write_file, dst, encoded)] = ("write", src, dst, timings, started)
+                else:
+                    timings["write"] = value
+                    finish(src, dst, timings, started)
+    return results
+
+
+def summarize(results, seconds):
+    """Итог пакета: число файлов, ошибок, время и сумма времени по стадиям."""
+    summary = {"files": len(results), "failed": sum(r.error is not None for r in results), "seconds": seconds}
+    for stage in ("read", "decode", "compute", "encode", "write"):
+        summary[stage] = sum(getattr(r, stage) or 0 for r in results)
+    return summary
+
+
+def result_json(result):
+    record = result._asdict()
+    for stage in ("read", "decode", "compute", "encode", "write", "total"):
+        if record[stage] is not None:
+            record[stage] = round(record[stage] * 1000, 3)
+    return json.dumps(record, ensure_ascii=False)
+
+
+# ---------------------- CLI ----------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Пакетная обработка изображений одной цепочкой шагов.")
+    parser.add_argument("inputs", nargs="*", help="папки и файлы изображений")
+    parser.add_argument("--list", metavar="FILE", help="файл со списком изображений (по одному пути в строке)")
+    parser.add_argument("-o", "--output-dir", required=True, help="папка результатов")
+    parser.add_argument("-r", "--recursive", action="store_true", help="обходить подпапки")
+    parser.add_argument("--step", action="append", required=True, type=parse_step,
+                        help="шаг обработки (можно повторять): threshold[:порог[:noinv]], "
+                             "erode|dilate|open|close:rect|ellipse|cross|disk:размер, gauss|blur:размер")
+    parser.add_argument("--format", help="формат результатов, например png (по умолчанию: как у исходных)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="процессов обработки (по умолчанию: число ядер)")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH,
+                        help=f"файлов читать наперед (по умолчанию: {DEFAULT_PREFETCH})")
+    parser.add_argument("--report", help="файл отчета JSONL (по умолчанию: stdout)")
+    parser.add_argument("-q", "--quiet", action="store_true", help="не печатать итог")
+    args = parser.parse_args(argv)
+
+    inputs = list(args.inputs)
+    if args.list:
+        with open(args.list, encoding="utf-8") as f:
+            inputs.extend(line.strip() for line in f if line.strip())
+    if not inputs:
+        parser.error("не заданы папки или файлы")
+    if args.workers < 1 or args.prefetch < 0:
+        parser.error("--workers должно быть положительным, --prefetch - неотрицательным")
+
+    try:
+        jobs = plan_outputs(list_images(inputs, args.recursive, args.output_dir), args.output_dir, args.format)
+    except ValueError as e:
+        parser.error(str(e))
+    report = open(args.report, "w", encoding="utf-8") if args.report else sys.stdout
+
+    def on_result(result):
+        report.write(result_json(result) + "\n")
+        if result.error is not None and report is not sys.stdout:
+            print(f"{result.src}: {result.error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        results = run_batch(jobs, args.step, args.workers, args.prefetch, on_result)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if report is not sys.stdout:
+            report.close()
+
+    summary = summarize(results, time.perf_counter() - start)
+    if not args.quiet:
+        print(f"Шаги: {'; '.join(describe_step(step) for step in args.step)}", file=sys.stderr)
+        print(f"Файлов: {summary['files']}, ошибок: {summary['failed']}, время: {summary['seconds']:.1f} с "
+              f"(чтение {summary['read']:.1f} с, декодирование {summary['decode']:.1f} с, "
+              f"шаги {summary['compute']:.1f} с, кодирование {summary['encode']:.1f} с, "
+              f"запись {summary['write']:.1f} с)", file=sys.stderr)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
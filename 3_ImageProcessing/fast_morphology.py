@@ -0,0 +1,198 @@
+import math
+
+import cv2
+import numpy as np
+
+# Эрозия и дилатация с большими ядрами за время на пиксель, не зависящее
+# от размера ядра.
+#
+# Скользящий минимум (максимум) по окну ширины w считается алгоритмом ван
+# Херка - Гил-Вермана: строка делится на блоки по w, в каждом блоке
+# считаются накопленные минимумы слева направо (g) и справа налево (h), и
+# минимум окна, начинающегося в x, равен min(h[x], g[x + w - 1]) - три
+# сравнения на пиксель при любом w. Прямоугольное ядро раскладывается на
+# проход по строкам и проход по столбцам.
+#
+# Ядро другой формы раскладывается на прямоугольники: эрозия по
+# объединению прямоугольников - минимум эрозий по каждому. Крест - два
+# прямоугольника (строка и столбец), эллипс OpenCV - по прямоугольнику на
+# каждую различную ширину строки, приближенный круг (disk_element) - всегда
+# DISK_RECTANGLES прямоугольников. Результат совпадает с cv2.erode и
+# cv2.dilate с тем же ядром и центром бит в бит, включая края (за краем
+# изображения - нейтральное значение, как по умолчанию в OpenCV).
+
+# Из скольких прямоугольников складывается приближенный круг
+DISK_RECTANGLES = 4
+
+# Формы ядер: "rect", "cross", "ellipse" (как в OpenCV) и "disk" (disk_element)
+SHAPES = ("rect", "cross", "ellipse", "disk")
+
+# С какого размера ядра разложение быстрее OpenCV (замер на одном ядре
+# процессора, изображение 2000x2000). Прямоугольник и крест OpenCV и сам
+# считает раздельно по строкам и столбцам, поэтому выигрыш начинается
+# только с сотен пикселей; эллипс и круг OpenCV обходит по всем точкам ядра
+FAST_MIN_SIZE = {"rect": 451, "cross": 251, "ellipse": 101, "disk": 45}
+
+_CV_SHAPES = {"rect": cv2.MORPH_RECT, "cross": cv2.MORPH_CROSS, "ellipse": cv2.MORPH_ELLIPSE}
+
+
+# ---------------------- Structuring elements ----------------------
+
+def disk_element(size):
+    """
+    Приближенный круг диаметра size - объединение DISK_RECTANGLES
+    прямоугольников, вписанных в круг, в ядре size x size. При четном size
+    центр круга - между пикселями, а стороны прямоугольников четные; центр
+    ядра (anchor) по умолчанию, как у ядер OpenCV, - пиксель size // 2.
+    """
+    parity = size % 2
+    # От центра круга до центра крайнего пикселя
+    radius = (size - 1) / 2
+    kernel = np.zeros((size, size), dtype=np.uint8)
+    for j in range(DISK_RECTANGLES):
+        angle = (j + 0.5) * math.pi / (2 * DISK_RECTANGLES)
+        # Стороны той же четности, что и size: прямоугольник симметричен
+        width = max(2 - parity, 2 * round(radius * math.cos(angle) + (1 - parity) / 2) + parity)
+        height = max(2 - parity, 2 * round(radius * math.sin(angle) + (1 - parity) / 2) + parity)
+        x0 = (size - width) // 2
+        y0 = (size - height) // 2
+        kernel[y0:y0 + height, x0:x0 + width] = 1
+    return kernel
+
+
+def structuring_element(shape, size):
+    """Ядро формы shape (см. SHAPES) размера size."""
+    if shape == "disk":
+        return disk_element(size)
+    return cv2.getStructuringElement(_CV_SHAPES[shape], (size, size))
+
+
+def decompose(kernel, anchor=None):
+    """
+    Раскладывает ядро на прямоугольники (y0, y1, x0, x1) - границы смещений
+    от центра включительно.
+
+    Каждая строка ядра должна быть одним непрерывным отрезком, а строки,
+    содержащие отрезок, - идти подряд (так у прямоугольника, креста,
+    эллипса и выпуклых фигур); иначе ValueError.
+    """
+    kernel = np.asarray(kernel) != 0
+    height, width = kernel.shape
+    ax, ay = anchor if anchor is not None else (width // 2, height // 2)
+
+    runs = {}
+    for y in range(height):
+        columns = np.flatnonzero(kernel[y])
+        if len(columns) == 0:
+            continue
+        if columns[-1] - columns[0] + 1 != len(columns):
+            raise ValueError("Строка ядра не является непрерывным отрезком")
+        runs[y] = (int(columns[0]), int(columns[-1]))
+
+    rectangles = []
+    for x0, x1 in set(runs.values()):
+        # Строки, отрезки которых содержат данный
+        rows = [y for y, (c0, c1) in runs.items() if c0 <= x0 and x1 <= c1]
+        if rows[-1] - rows[0] + 1 != len(rows):
+            raise ValueError("Ядро не раскладывается на прямоугольники")
+        rectangles.append((rows[0] - ay, rows[-1] - ay, x0 - ax, x1 - ax))
+    return rectangles
+
+
+# ---------------------- Running extremes ----------------------
+
+def _running(image, lo, hi, reduce, fill):
+    """
+    Скользящий минимум или максимум по столбцам: out[y] = reduce(image[y + lo .. y + hi]),
+    за краем - fill (алгоритм ван Херка - Гил-Вермана).
+    """
+    n = image.shape[0]
+    w = hi - lo + 1
+    rest = image.shape[1:]
+
+    # padded[k] = image[k + lo]; длина кратна w и покрывает все окна
+    blocks = -(-(n + w - 1) // w)
+    padded = np.empty((blocks * w,) + rest, dtype=image.dtype)
+    start, stop = max(0, lo), min(n, n + hi)
+    padded[:max(0, start - lo)] = fill
+    padded[max(0, stop - lo):] = fill
+    if start < stop:
+        padded[start - lo:stop - lo] = image[start:stop]
+    if w == 1:
+        return padded[:n]
+
+    # Накопление внутри блоков: цикл по w позициям блока, каждая - одна
+    # векторная операция над целыми строками всех блоков сразу
+    p = padded.reshape((blocks, w) + rest)
+    g = np.empty_like(p)
+    h = np.empty_like(p)
+    g[:, 0] = p[:, 0]
+    for i in range(1, w):
+        reduce(g[:, i - 1], p[:, i], out=g[:, i])
+    h[:, w - 1] = p[:, w - 1]
+    for i in range(w - 2, -1, -1):
+        reduce(h[:, i + 1], p[:, i], out=h[:, i])
+    g = g.reshape(padded.shape)
+    h = h.reshape(padded.shape)
+    return reduce(h[:n], g[w - 1:w - 1 + n])
+
+
+def _transpose(image):
+    return np.ascontiguousarray(image.swapaxes(0, 1))
+
+
+def _extreme_fill(dtype, reduce):
+    # Нейтральное значение за краем: максимум типа для эрозии, минимум - для дилатации
+    info = np.iinfo(dtype) if np.issubdtype(dtype, np.integer) else np.finfo(dtype)
+    return info.max if reduce is np.minimum else info.min
+
+
+def _apply(image, rectangles, reduce):
+    fill = _extreme_fill(image.dtype, reduce)
+    result = None
+    # Проход по строкам - это проход по столбцам транспонированного изображения
+    transposed = _transpose(image)
+    for y0, y1, x0, x1 in rectangles:
+        rows = _transpose(_running(transposed, x0, x1, reduce, fill))
+        part = _running(rows, y0, y1, reduce, fill)
+        result = part if result is None else reduce(result, part, out=result)
+    return result
+
+
+def erode(image, kernel, anchor=None):
+    """Эрозия, совпадающая с cv2.erode(image, kernel, anchor=anchor)."""
+    return _apply(image, decompose(kernel, anchor), np.minimum)
+
+
+def dilate(image, kernel, anchor=None):
+    """Дилатация, совпадающая с cv2.dilate(image, kernel, anchor=anchor)."""
+    return _apply(image, decompose(kernel, anchor), np.maximum)
+
+
+def morphology(image, operation, shape, size):
+    """
+    Морфологическая операция ("erode", "dilate", "open", "close") с ядром
+    формы shape (см. SHAPES) размера size. Маленькие ядра обрабатывает
+    OpenCV, большие (FAST_MIN_SIZE) - разложение на прямоугольники;
+    результат одинаковый.
+    """
+    kernel = structuring_element(shape, size)
+    if size < FAST_MIN_SIZE[shape]:
+        if operation == "erode":
+            return cv2.erode(image, kernel)
+        if operation == "dilate":
+            return cv2.dilate(image, kernel)
+        if operation in ("open", "close"):
+            return cv2.morphologyEx(image, cv2.MORPH_OPEN if operation == "open" else cv2.MORPH_CLOSE, kernel)
+        raise ValueError(f"Неизвестная операция: {operation}")
+
+    rectangles = decompose(kernel)
+    if operation == "erode":
+        return _apply(image, rectangles, np.minimum)
+    if operation == "dilate":
+        return _apply(image, rectangles, np.maximum)
+    if operation == "open":
+        return _apply(_apply(image, rectangles, np.minimum), rectangles, np.maximum)
+    if operation == "close":
+        return _apply(_apply(image, rectangles, np.maximum), rectangles, np.minimum)
+    raise ValueError(f"Неизвестная операция: {operation}")
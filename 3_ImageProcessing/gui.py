@@ -1,12 +1,28 @@
+import os
+
 import cv2
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QPushButton, QLabel, QFileDialog, QSizePolicy,
-                             QComboBox, QSpinBox, QGroupBox, QMenu, QMessageBox, QLineEdit)
+                             QComboBox, QSpinBox, QGroupBox, QMenu, QMessageBox, QLineEdit,
+                             QCheckBox, QListWidget)
 from PyQt6.QtGui import QImage, QPixmap, QAction
-from PyQt6.QtCore import Qt
+from PyQt6.QtCore import Qt, QThread, QTimer
+
+from image_processor import DEFAULT_THRESHOLD
+from pipeline import Step, describe_step
+from batch import list_images, plan_outputs, result_json
+from worker import PROXY_SIZE, BatchWorker, ProcessingWorker
+
+# Автоприменение: через сколько мс после последнего изменения параметров
+# предпросмотр сменяется обработкой в полном разрешении
+FULL_RENDER_DELAY = 400
 
-# Импортируем обе функции
-from image_processor import apply_morphological_operation, apply_filter
+# Наибольший размер ядра морфологии: большие ядра считаются за время, не
+# зависящее от размера (fast_morphology)
+MAX_MORPH_SIZE = 501
+
+# Отчет пакетной обработки (JSONL, по строке на файл) в папке результатов
+BATCH_REPORT_NAME = "batch_report.jsonl"
 
 
 class ImageProcessorWindow(QMainWindow):
@@ -16,8 +32,37 @@ class ImageProcessorWindow(QMainWindow):
         self.setGeometry(100, 100, 1200, 600)
 
         self.original_image_data = None
+        # Ключ загруженного изображения для кэша промежуточных результатов
+        self.source_key = None
+        # Шаги цепочки обработки (Step); пустая цепочка - только текущий метод
+        self.steps = []
+        # Номер последнего запроса обработки: результаты прежних не показываются
+        self.job_id = 0
+        # Параметры выбранного шага загружаются в элементы управления (не изменение)
+        self.loading_step = False
         self.initUI()
 
+        # Обработка идет в фоновом потоке, окно не блокируется
+        self.processing_thread = QThread()
+        self.processing_logic = ProcessingWorker()
+        self.processing_logic.moveToThread(self.processing_thread)
+        self.processing_thread.started.connect(self.processing_logic.run)
+        self.processing_logic.finished.connect(self.show_result)
+        self.processing_logic.failed.connect(self.show_error)
+        self.processing_thread.start()
+
+        # Пакетная обработка: поток и исполнитель создаются на каждый пакет
+        self.batch_thread = None
+        self.batch_logic = None
+        self.batch_results = []
+        self.batch_total = 0
+        self.batch_output_dir = None
+
+        self.full_render_timer = QTimer(self)
+        self.full_render_timer.setSingleShot(True)
+        self.full_render_timer.setInterval(FULL_RENDER_DELAY)
+        self.full_render_timer.timeout.connect(self.apply_current_method)
+
     def initUI(self):
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -44,6 +89,7 @@ class ImageProcessorWindow(QMainWindow):
         self.combo_method_selector = QComboBox()
         self.combo_method_selector.addItem("Морфологическая обработка")
         self.combo_method_selector.addItem("Низкочастотная фильтрация")
+        self.combo_method_selector.addItem("Пороговая обработка")
         # Подключаем функцию, которая будет переключать видимость параметров
         self.combo_method_selector.currentIndexChanged.connect(self.toggle_parameter_groups)
         control_panel_layout.addWidget(self.combo_method_selector)
@@ -59,18 +105,20 @@ class ImageProcessorWindow(QMainWindow):
 
         morph_layout.addWidget(QLabel("Форма ядра:"))
         self.combo_shape = QComboBox()
-        self.combo_shape.addItems(['Прямоугольник', 'Окружность', 'Крест'])
+        self.combo_shape.addItems(['Прямоугольник', 'Окружность', 'Крест', 'Круг (быстрый)'])
         morph_layout.addWidget(self.combo_shape)
 
         morph_layout.addWidget(QLabel("Размер ядра:"))
         self.spinbox_size_morph = QSpinBox()
-        self.spinbox_size_morph.setRange(1, 21)
+        self.spinbox_size_morph.setRange(1, MAX_MORPH_SIZE)
         self.spinbox_size_morph.setSingleStep(2)
         self.spinbox_size_morph.setValue(3)
-        # Делаем read-only только поле ввода, оставляя стрелки рабочими
-        line_edit_morph = self.spinbox_size_morph.findChild(QLineEdit)
-        if line_edit_morph is not None:
-            line_edit_morph.setReadOnly(True)
+        # Размер до сотен пикселей удобнее ввести, чем набрать стрелками;
+        # четное значение после ввода заменяется следующим нечетным. Без
+        # отслеживания ввода valueChanged (и автоприменение) приходит после
+        # ввода числа целиком, а не на каждую цифру ("1", "15", "151")
+        self.spinbox_size_morph.setKeyboardTracking(False)
+        self.spinbox_size_morph.editingFinished.connect(self.make_morph_size_odd)
         morph_layout.addWidget(self.spinbox_size_morph)
 
         self.morph_group.setLayout(morph_layout)
@@ -101,11 +149,66 @@ class ImageProcessorWindow(QMainWindow):
         # Изначально скрываем эту группу
         self.filter_group.setVisible(False)
 
+        # 4. Группа настроек пороговой обработки (скрыта по умолчанию)
+        self.threshold_group = QGroupBox("Параметры порога")
+        threshold_layout = QVBoxLayout()
+
+        threshold_layout.addWidget(QLabel("Порог:"))
+        self.spinbox_threshold = QSpinBox()
+        self.spinbox_threshold.setRange(0, 255)
+        self.spinbox_threshold.setValue(DEFAULT_THRESHOLD)
+        threshold_layout.addWidget(self.spinbox_threshold)
+
+        self.checkbox_invert = QCheckBox("Инвертировать (темные объекты - белые)")
+        self.checkbox_invert.setChecked(True)
+        threshold_layout.addWidget(self.checkbox_invert)
+
+        self.threshold_group.setLayout(threshold_layout)
+        control_panel_layout.addWidget(self.threshold_group)
+        self.threshold_group.setVisible(False)
+
+        # 5. Цепочка шагов: результат каждого шага - вход следующего
+        steps_group = QGroupBox("Цепочка обработки")
+        steps_layout = QVBoxLayout()
+
+        self.list_steps = QListWidget()
+        # Выбор шага загружает его параметры в элементы управления
+        self.list_steps.currentRowChanged.connect(self.show_step)
+        steps_layout.addWidget(self.list_steps)
+
+        steps_buttons = QHBoxLayout()
+        for text, slot in (("Добавить", self.add_step), ("Изменить", self.replace_step),
+                           ("Удалить", self.remove_step), ("Очистить", self.clear_steps)):
+            button = QPushButton(text)
+            button.clicked.connect(slot)
+            steps_buttons.addWidget(button)
+        steps_layout.addLayout(steps_buttons)
+
+        steps_group.setLayout(steps_layout)
+        control_panel_layout.addWidget(steps_group)
+
         # Кнопка применения
         btn_apply = QPushButton("Применить обработку")
         btn_apply.clicked.connect(self.apply_current_method)
         control_panel_layout.addWidget(btn_apply)
 
+        # Пакетная обработка папки текущей цепочкой шагов
+        self.btn_batch = QPushButton("Пакетная обработка папки...")
+        self.btn_batch.clicked.connect(self.toggle_batch)
+        control_panel_layout.addWidget(self.btn_batch)
+
+        # Автоприменение: при изменении параметров сразу показывается
+        # предпросмотр на уменьшенной копии, затем полный результат
+        self.checkbox_auto_apply = QCheckBox("Автоприменение (предпросмотр)")
+        self.checkbox_auto_apply.toggled.connect(self.parameters_changed)
+        control_panel_layout.addWidget(self.checkbox_auto_apply)
+
+        for signal in (self.combo_method_selector.currentIndexChanged, self.combo_operation.currentIndexChanged,
+                       self.combo_shape.currentIndexChanged, self.spinbox_size_morph.valueChanged,
+                       self.combo_filter_type.currentIndexChanged, self.spinbox_size_filter.valueChanged,
+                       self.spinbox_threshold.valueChanged, self.checkbox_invert.toggled):
+            signal.connect(self.parameters_changed)
+
         control_panel_layout.addStretch(1)  # Заполнитель пустого пространства
         main_layout.addLayout(control_panel_layout, 0)
 
@@ -114,6 +217,8 @@ class ImageProcessorWindow(QMainWindow):
         self.lbl_result = QLabel("Результат")
         self.setup_label(self.lbl_result)
         right_panel.addWidget(self.lbl_result)
+        self.lbl_status = QLabel("")
+        right_panel.addWidget(self.lbl_status)
         main_layout.addLayout(right_panel, 1)
 
     def setup_label(self, label):
@@ -123,19 +228,98 @@ class ImageProcessorWindow(QMainWindow):
 
     def toggle_parameter_groups(self, index):
         """Переключает видимость групп параметров в зависимости от выбранного метода."""
-        if self.combo_method_selector.currentText() == "Морфологическая обработка":
-            self.morph_group.setVisible(True)
-            self.filter_group.setVisible(False)
-        elif self.combo_method_selector.currentText() == "Низкочастотная фильтрация":
-            self.morph_group.setVisible(False)
-            self.filter_group.setVisible(True)
+        method = self.combo_method_selector.currentText()
+        self.morph_group.setVisible(method == "Морфологическая обработка")
+        self.filter_group.setVisible(method == "Низкочастотная фильтрация")
+        self.threshold_group.setVisible(method == "Пороговая обработка")
+
+    def make_morph_size_odd(self):
+        size = self.spinbox_size_morph.value()
+        if size % 2 == 0:
+            self.spinbox_size_morph.setValue(min(size + 1, MAX_MORPH_SIZE))
+
+    def current_step(self):
+        """Шаг по выбранному методу и его параметрам."""
+        method = self.combo_method_selector.currentText()
+        if method == "Морфологическая обработка":
+            # Нечетный размер, как после make_morph_size_odd (MAX_MORPH_SIZE нечетный):
+            # введенное четное значение не запускает лишнюю обработку
+            args = (self.combo_operation.currentText(), self.combo_shape.currentText(),
+                    self.spinbox_size_morph.value() | 1)
+        elif method == "Низкочастотная фильтрация":
+            args = (self.combo_filter_type.currentText(), self.spinbox_size_filter.value())
+        else:
+            args = (self.spinbox_threshold.value(), self.checkbox_invert.isChecked())
+        return Step(method, args)
+
+    def show_step(self, row):
+        """Загружает параметры шага цепочки в элементы управления."""
+        if not 0 <= row < len(self.steps):
+            return
+        step = self.steps[row]
+        self.loading_step = True
+        self.combo_method_selector.setCurrentText(step.method)
+        if step.method == "Морфологическая обработка":
+            operation, shape, size = step.args
+            self.combo_operation.setCurrentText(operation)
+            self.combo_shape.setCurrentText(shape)
+            self.spinbox_size_morph.setValue(size)
+        elif step.method == "Низкочастотная фильтрация":
+            filter_type, size = step.args
+            self.combo_filter_type.setCurrentText(filter_type)
+            self.spinbox_size_filter.setValue(size)
+        else:
+            threshold, invert = step.args
+            self.spinbox_threshold.setValue(threshold)
+            self.checkbox_invert.setChecked(invert)
+        self.loading_step = False
+
+    def update_steps_list(self, row):
+        self.list_steps.blockSignals(True)
+        self.list_steps.clear()
+        self.list_steps.addItems([f"{n + 1}. {describe_step(step)}" for n, step in enumerate(self.steps)])
+        self.list_steps.setCurrentRow(row)
+        self.list_steps.blockSignals(False)
+        self.schedule_preview()
+
+    def add_step(self):
+        """Добавляет текущий метод в конец цепочки."""
+        self.steps.append(self.current_step())
+        self.update_steps_list(len(self.steps) - 1)
+
+    def replace_step(self):
+        """Заменяет выбранный шаг текущим методом (шаги до него не пересчитываются)."""
+        row = self.list_steps.currentRow()
+        if not 0 <= row < len(self.steps):
+            self.add_step()
+            return
+        self.steps[row] = self.current_step()
+        self.update_steps_list(row)
+
+    def remove_step(self):
+        row = self.list_steps.currentRow()
+        if 0 <= row < len(self.steps):
+            del self.steps[row]
+            self.update_steps_list(min(row, len(self.steps) - 1))
+
+    def clear_steps(self):
+        self.steps = []
+        self.update_steps_list(-1)
 
     def load_image(self):
         fname, _ = QFileDialog.getOpenFileName(self, 'Открыть изображение', './', "Image files (*.jpg *.png *.bmp)")
         if fname:
             self.original_image_data = cv2.imread(fname)
+            if self.original_image_data is None:
+                QMessageBox.warning(self, "Ошибка", "Не удалось прочитать изображение.")
+                return
+            self.source_key = (fname, os.path.getmtime(fname))
             self.display_image(self.original_image_data, self.lbl_original)
             self.lbl_result.clear()
+            self.lbl_status.clear()
+            # Результаты для прежнего изображения больше не нужны
+            self.job_id += 1
+            self.schedule_preview()
 
     def display_image(self, img_data, label):
         # ... (функция display_image остается прежней, она умеет отображать и цветное и монохромное)
@@ -158,40 +342,152 @@ class ImageProcessorWindow(QMainWindow):
                                Qt.TransformationMode.SmoothTransformation)
         label.setPixmap(pixmap)
 
+    def parameters_changed(self, *args):
+        """
+        Параметры изменены. При автоприменении изменение сразу относится к
+        выбранному шагу цепочки и запускает предпросмотр.
+        """
+        if self.loading_step or not self.checkbox_auto_apply.isChecked():
+            return
+        row = self.list_steps.currentRow()
+        if 0 <= row < len(self.steps):
+            step = self.current_step()
+            if step.method == self.steps[row].method:
+                self.steps[row] = step
+                self.list_steps.item(row).setText(f"{row + 1}. {describe_step(step)}")
+            else:
+                # Выбран другой метод - это новый шаг, а не правка выбранного
+                self.list_steps.setCurrentRow(-1)
+        self.schedule_preview()
+
+    def schedule_preview(self):
+        """Автоприменение: предпросмотр сейчас, полное разрешение - после паузы в изменениях."""
+        if not self.checkbox_auto_apply.isChecked() or self.original_image_data is None:
+            return
+        if max(self.original_image_data.shape[:2]) > PROXY_SIZE:
+            self.request_processing(preview=True)
+            self.full_render_timer.start()
+        else:
+            # Маленькое изображение обрабатывается сразу целиком
+            self.apply_current_method()
+
+    def request_processing(self, preview):
+        self.job_id += 1
+        steps = self.steps or [self.current_step()]
+        # request() потокобезопасен и вызывается напрямую: очередь событий потока
+        # обработки занята циклом run
+        self.processing_logic.request(self.job_id, self.original_image_data, steps, self.source_key, preview)
+        self.lbl_status.setText("Предпросмотр..." if preview else "Обработка...")
+
     def apply_current_method(self):
-        """Определяет, какой метод выбран в общем комбобоксе, и вызывает его обработчик."""
+        """
+        Применяет цепочку шагов (или только выбранный метод, если цепочка
+        пуста) в фоновом потоке. Результаты шагов, которые не изменились,
+        берутся из кэша; результаты устаревших запросов не показываются.
+        """
+        self.full_render_timer.stop()
         if self.original_image_data is None:
-            QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение.")
+            if not self.checkbox_auto_apply.isChecked():
+                QMessageBox.warning(self, "Ошибка", "Сначала загрузите изображение.")
             return
+        self.request_processing(preview=False)
 
-        selected_method = self.combo_method_selector.currentText()
-
-        try:
-            if selected_method == "Морфологическая обработка":
-                self.apply_morphology_processing()
-            elif selected_method == "Низкочастотная фильтрация":
-                self.apply_filter_processing()
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка обработки", f"Произошла ошибка: {e}")
-
-    def apply_morphology_processing(self):
-        """Вызывает логику морфологии."""
-        operation = self.combo_operation.currentText()
-        shape = self.combo_shape.currentText()
-        size = self.spinbox_size_morph.value()
-
-        result_image_data = apply_morphological_operation(
-            self.original_image_data, operation, shape, size
-        )
+    def show_result(self, job_id, result_image_data, preview, seconds):
+        if job_id != self.job_id:
+            return
         self.display_image(result_image_data, self.lbl_result)
+        kind = "Предпросмотр (уменьшенная копия)" if preview else "Готово"
+        self.lbl_status.setText(f"{kind}: {seconds * 1000:.0f} мс")
 
-    def apply_filter_processing(self):
-        """Вызывает логику фильтрации."""
-        filter_type = self.combo_filter_type.currentText()
-        size = self.spinbox_size_filter.value()
+    def show_error(self, job_id, preview, message):
+        if job_id != self.job_id:
+            return
+        self.lbl_status.setText(f"Ошибка: {message}")
+        if not preview:
+            QMessageBox.critical(self, "Ошибка обработки", f"Произошла ошибка: {message}")
+
+    def toggle_batch(self):
+        """Запускает пакетную обработку папки или останавливает идущую."""
+        if self.batch_logic is not None:
+            self.batch_logic.stop()
+            self.btn_batch.setEnabled(False)
+            self.lbl_status.setText("Пакет: остановка (начатые файлы дорабатываются)...")
+            return
 
-        result_image_data = apply_filter(
-            self.original_image_data, filter_type, size
-        )
-        self.display_image(result_image_data, self.lbl_result)
+        input_dir = QFileDialog.getExistingDirectory(self, "Папка с изображениями")
+        if not input_dir:
+            return
+        output_dir = QFileDialog.getExistingDirectory(self, "Папка для результатов")
+        if not output_dir:
+            return
+        if os.path.abspath(output_dir) == os.path.abspath(input_dir):
+            QMessageBox.warning(self, "Ошибка", "Папка результатов должна отличаться от папки изображений.")
+            return
 
+        try:
+            jobs = plan_outputs(list_images([input_dir], exclude_dir=output_dir), output_dir)
+        except ValueError as e:
+            QMessageBox.warning(self, "Ошибка", str(e))
+            return
+        if not jobs:
+            QMessageBox.information(self, "Пакетная обработка", "В папке нет изображений.")
+            return
+
+        self.batch_results = []
+        self.batch_total = len(jobs)
+        self.batch_output_dir = output_dir
+        self.batch_thread = QThread()
+        self.batch_logic = BatchWorker(jobs, self.steps or [self.current_step()])
+        self.batch_logic.moveToThread(self.batch_thread)
+        self.batch_thread.started.connect(self.batch_logic.run)
+        self.batch_logic.file_done.connect(self.batch_file_done)
+        self.batch_logic.finished.connect(self.batch_finished)
+        self.batch_thread.start()
+
+        self.btn_batch.setText("Остановить пакет")
+        self.lbl_status.setText(f"Пакет: 0/{self.batch_total}")
+
+    def batch_file_done(self, result):
+        self.batch_results.append(result)
+        failed = sum(r.error is not None for r in self.batch_results)
+        self.lbl_status.setText(f"Пакет: {len(self.batch_results)}/{self.batch_total}, ошибок: {failed}")
+
+    def batch_finished(self, summary):
+        self.batch_thread.quit()
+        self.batch_thread.wait()
+        self.batch_thread = None
+        self.batch_logic = None
+        self.btn_batch.setText("Пакетная обработка папки...")
+        self.btn_batch.setEnabled(True)
+
+        report_path = os.path.join(self.batch_output_dir, BATCH_REPORT_NAME)
+        try:
+            with open(report_path, "w", encoding="utf-8") as f:
+                for result in self.batch_results:
+                    f.write(result_json(result) + "\n")
+        except OSError as e:
+            report_path = f"не записан ({e})"
+
+        text = (f"Обработано файлов: {summary['files']} из {self.batch_total}, ошибок: {summary['failed']}, "
+                f"время: {summary['seconds']:.1f} с.\nОтчет: {report_path}")
+        if summary.get("error"):
+            text += f"\n\nПакет прерван: {summary['error']}"
+        failures = [r for r in self.batch_results if r.error is not None]
+        if failures:
+            text += "\n\nОшибки:\n" + "\n".join(f"{os.path.basename(r.src)}: {r.error}" for r in failures[:10])
+            if len(failures) > 10:
+                text += f"\n... и еще {len(failures) - 10}"
+        self.lbl_status.setText(f"Пакет: готово {summary['files'] - summary['failed']}/{self.batch_total}, "
+                                f"ошибок: {summary['failed']}")
+        QMessageBox.information(self, "Пакетная обработка", text)
+
+    def closeEvent(self, event):
+        if self.batch_logic is not None:
+            self.batch_logic.stop()
+            self.batch_thread.quit()
+            self.batch_thread.wait()
+        self.full_render_timer.stop()
+        self.processing_logic.stop()
+        self.processing_thread.quit()
+        self.processing_thread.wait()
+        super().closeEvent(event)
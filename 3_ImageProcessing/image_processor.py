@@ -1,38 +1,58 @@
 import cv2
 import numpy as np
 
+from fast_morphology import morphology
+
+
+DEFAULT_THRESHOLD = 127
+
+
+def apply_threshold(image_data, threshold=DEFAULT_THRESHOLD, invert=True):
+    """
+    Переводит изображение в оттенки серого и бинаризует его по порогу.
+    С invert=True объекты темнее порога становятся белыми (255).
+    """
+    if image_data is None:
+        return None
+
+    gray = cv2.cvtColor(image_data, cv2.COLOR_BGR2GRAY) if image_data.ndim == 3 else image_data
+    mode = cv2.THRESH_BINARY_INV if invert else cv2.THRESH_BINARY
+    _, binary_img = cv2.threshold(gray, threshold, 255, mode)
+    return binary_img
+
 
 def apply_morphological_operation(image_data, operation_type, kernel_shape, kernel_size):
     # ... код морфологии остается прежним, только обновляем mapping'и под русские названия ...
     if image_data is None:
         return None
 
-    gray = cv2.cvtColor(image_data, cv2.COLOR_BGR2GRAY)
-    # Для морфологии обычно используют бинарные изображения, оставляем пороговую обработку
-    _, binary_img = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV)
+    # Для морфологии обычно используют бинарные изображения: цветное
+    # изображение бинаризуется с порогом по умолчанию, а серое или уже
+    # бинарное (например, после шага "Пороговая обработка") берется как есть
+    binary_img = apply_threshold(image_data) if image_data.ndim == 3 else image_data
 
     shape_map = {
-        'Прямоугольник': cv2.MORPH_RECT,
-        'Окружность': cv2.MORPH_ELLIPSE,
-        'Крест': cv2.MORPH_CROSS
+        'Прямоугольник': 'rect',
+        'Окружность': 'ellipse',
+        'Крест': 'cross',
+        'Круг (быстрый)': 'disk'
     }
     # Используем .get() с запасным вариантом на случай, если ключ не найден
-    shape = shape_map.get(kernel_shape, cv2.MORPH_RECT)
-
-    k_size = (kernel_size, kernel_size)
-    kernel = cv2.getStructuringElement(shape, k_size)
-
-    if operation_type == 'Эрозия':
-        result = cv2.erode(binary_img, kernel, iterations=1)
-    elif operation_type == 'Дилатация':
-        result = cv2.dilate(binary_img, kernel, iterations=1)
-    elif operation_type == 'Открытие':
-        result = cv2.morphologyEx(binary_img, cv2.MORPH_OPEN, kernel)
-    elif operation_type == 'Закрытие':
-        result = cv2.morphologyEx(binary_img, cv2.MORPH_CLOSE, kernel)
-    else:
+    shape = shape_map.get(kernel_shape, 'rect')
+
+    operation_map = {
+        'Эрозия': 'erode',
+        'Дилатация': 'dilate',
+        'Открытие': 'open',
+        'Закрытие': 'close'
+    }
+    if operation_type not in operation_map:
         raise ValueError("Неверный тип операции морфологии")
 
+    # Большие ядра обрабатываются за время, не зависящее от размера ядра
+    # (fast_morphology), результат тот же, что у cv2.erode/cv2.dilate
+    result = morphology(binary_img, operation_map[operation_type], shape, kernel_size)
+
     return result
 
 
@@ -0,0 +1,162 @@
+from collections import OrderedDict, namedtuple
+
+from image_processor import DEFAULT_THRESHOLD, apply_threshold, apply_morphological_operation, apply_filter
+
+# Цепочка шагов обработки (например, порог -> открытие -> закрытие -> размытие)
+# с кэшем промежуточных результатов.
+#
+# Результат каждого шага кэшируется по ключу (исходное изображение, шаги до
+# него включительно). При изменении шага цепочки все результаты до него
+# берутся из кэша, и пересчитываются только он и следующие шаги. Кэш
+# вытесняет давно не использованные результаты, когда их общий размер
+# превышает заданный предел в байтах.
+
+# Шаг: метод (название, как в списке методов окна) и кортеж его параметров
+Step = namedtuple("Step", "method args")
+
+STEP_FUNCTIONS = {
+    "Пороговая обработка": apply_threshold,
+    "Морфологическая обработка": apply_morphological_operation,
+    "Низкочастотная фильтрация": apply_filter,
+}
+
+# Предел кэша промежуточных результатов по умолчанию
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def run_step(image_data, step):
+    """Применяет один шаг к изображению."""
+    try:
+        func = STEP_FUNCTIONS[step.method]
+    except KeyError:
+        raise ValueError(f"Неизвестный шаг обработки: {step.method}") from None
+    return func(image_data, *step.args)
+
+
+def scale_step(step, scale):
+    """
+    Шаг для изображения, уменьшенного в 1/scale раз: размеры ядер
+    уменьшаются пропорционально (остаются нечетными и не меньше 1).
+    """
+    if scale == 1.0 or step.method not in ("Морфологическая обработка", "Низкочастотная фильтрация"):
+        return step
+    *args, size = step.args
+    size = max(1, round(size * scale))
+    if size % 2 == 0:
+        size += 1
+    return Step(step.method, tuple(args) + (size,))
+
+
+# Запись шагов в командной строке: "threshold[:порог[:noinv]]",
+# "erode|dilate|open|close:rect|ellipse|cross|disk:размер", "gauss|blur:размер"
+_MORPH_ALIASES = {"erode": "Эрозия", "dilate": "Дилатация", "open": "Открытие", "close": "Закрытие"}
+_SHAPE_ALIASES = {"rect": "Прямоугольник", "ellipse": "Окружность", "cross": "Крест", "disk": "Круг (быстрый)"}
+_FILTER_ALIASES = {"gauss": "Фильтр Гаусса", "blur": "Усредняющий фильтр"}
+
+
+def parse_step(text):
+    """Шаг из записи командной строки, например "open:cross:5" или "threshold:100"."""
+    name, *args = text.lower().split(":")
+    try:
+        if name == "threshold" and len(args) <= 2:
+            threshold = int(args[0]) if args else DEFAULT_THRESHOLD
+            invert = len(args) < 2 or {"inv": True, "noinv": False}[args[1]]
+            return Step("Пороговая обработка", (threshold, invert))
+        if name in _MORPH_ALIASES and len(args) == 2:
+            return Step("Морфологическая обработка", (_MORPH_ALIASES[name], _SHAPE_ALIASES[args[0]], int(args[1])))
+        if name in _FILTER_ALIASES and len(args) == 1:
+            return Step("Низкочастотная фильтрация", (_FILTER_ALIASES[name], int(args[0])))
+    except (KeyError, ValueError):
+        pass
+    raise ValueError(f"Неверная запись шага: {text}")
+
+
+def _describe_arg(arg):
+    if isinstance(arg, bool):
+        return "инверсия" if arg else "без инверсии"
+    return str(arg)
+
+
+def describe_step(step):
+    """Подпись шага для списка: "Морфологическая обработка: Открытие, Крест, 5"."""
+    return f"{step.method}: " + ", ".join(_describe_arg(arg) for arg in step.args)
+
+
+class ResultCache:
+    """LRU-кэш изображений (массивов NumPy) с пределом общего размера в байтах."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items = OrderedDict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        """Результат по ключу (становится последним использованным) или None."""
+        image_data = self._items.get(key)
+        if image_data is not None:
+            self._items.move_to_end(key)
+        return image_data
+
+    def put(self, key, image_data):
+        """Сохраняет результат, вытесняя самые старые; больше предела - не сохраняется."""
+        if key in self._items:
+            self.nbytes -= self._items.pop(key).nbytes
+        if image_data.nbytes > self.max_bytes:
+            return
+        # Результат общий для всех, кто его получит из кэша
+        image_data.setflags(write=False)
+        self._items[key] = image_data
+        self.nbytes += image_data.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+
+
+class Pipeline:
+    """Выполняет цепочки шагов, переиспользуя закэшированные промежуточные результаты."""
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else ResultCache()
+
+    def run(self, image_data, steps, source_key, should_stop=None):
+        """
+        Применяет шаги по порядку.
+
+        Args:
+            image_data: Исходное изображение.
+            steps: Последовательность Step.
+            source_key: Хешируемый ключ исходного изображения (например, путь
+                и время изменения файла); разным изображениям - разные ключи.
+            should_stop: Функция без аргументов; если она вернет True перед
+                очередным шагом, выполнение прерывается.
+
+        Returns:
+            Результат последнего шага (только для чтения), исходное
+            изображение, если шагов нет, или None, если выполнение прервано.
+        """
+        steps = tuple(Step(step.method, tuple(step.args)) for step in steps)
+
+        # Самый длинный уже посчитанный префикс цепочки
+        result, done = image_data, 0
+        for k in range(len(steps), 0, -1):
+            cached = self.cache.get((source_key, steps[:k]))
+            if cached is not None:
+                result, done = cached, k
+                break
+
+        for k in range(done, len(steps)):
+            if should_stop is not None and should_stop():
+                return None
+            result = run_step(result, steps[k])
+            self.cache.put((source_key, steps[:k + 1]), result)
+        return result
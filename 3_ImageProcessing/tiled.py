@@ -0,0 +1,272 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import cv2
+import numpy as np
+
+from pipeline import parse_step, run_step
+
+# Обработка изображений, которые не помещаются в память, полосами:
+#
+#   python tiled.py scan.ppm result.pgm --step threshold --step open:ellipse:15
+#   python tiled.py big.npy out.npy --step gauss:9 --memory 128 --workers 4
+#
+# Изображение делится на горизонтальные полосы. Каждая полоса читается
+# вместе с ореолом - строками соседних полос, от которых зависит результат
+# (для цепочки шагов ореолы шагов складываются), - обрабатывается в пуле
+# потоков (OpenCV отпускает GIL) и записывается в файл результата,
+# отображенный в память. Результат совпадает с обработкой изображения
+# целиком бит в бит: внутри ореола берутся те же пиксели, а края полос
+# на краях изображения - те же края, что и у целого изображения.
+#
+# Высота полосы выбирается по пределу памяти (--memory), а не по размеру
+# изображения. Без загрузки в память читаются и пишутся .npy и 8-битные
+# двоичные PGM/PPM (P5/P6). Другие форматы читаются cv2.imread целиком, а
+# результат в них сначала собирается во временном .npy и затем кодируется
+# cv2.imwrite - в обоих случаях предел памяти соблюдается только при
+# обработке.
+
+# Предел памяти на полосы в работе по умолчанию
+DEFAULT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Сколько копий полосы одновременно живет при обработке: исходная полоса,
+# результаты шагов (предыдущий и текущий) и временные буферы OpenCV
+STRIP_COPIES = 4
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+_MAPPED_EXTENSIONS = (".npy", ".pgm", ".ppm")
+
+
+# ---------------------- Halo ----------------------
+
+def step_halo(step):
+    """Сколько строк соседей нужно шагу с каждой стороны полосы."""
+    if step.method == "Морфологическая обработка":
+        operation, _, size = step.args
+        # Ядро size x size с центром в size // 2 (и при четном size, в том
+        # числе у disk_element) выходит за строку не больше чем на size // 2.
+        # Открытие и закрытие - две операции подряд, каждая со своим ореолом
+        return size // 2 * (2 if operation in ("Открытие", "Закрытие") else 1)
+    if step.method == "Низкочастотная фильтрация":
+        _, size = step.args
+        # apply_filter увеличивает четный размер на 1
+        return (size + 1) // 2 if size % 2 == 0 else size // 2
+    return 0
+
+
+def pipeline_halo(steps):
+    return sum(step_halo(step) for step in steps)
+
+
+# ---------------------- Strips ----------------------
+
+def strip_rows(row_bytes, halo, memory_limit, workers):
+    """
+    Высота полосы (без ореола) и число потоков, при которых полосы в
+    работе укладываются в предел памяти.
+    """
+    per_row = row_bytes * STRIP_COPIES
+    # Если памяти не хватает на все потоки, потоков меньше
+    workers = max(1, min(workers, memory_limit // (per_row * (2 * halo + 1))))
+    rows = memory_limit // (per_row * workers) - 2 * halo
+    if rows < 1:
+        raise ValueError(f"Предела памяти {memory_limit} байт не хватает на полосу из одной строки "
+                         f"с ореолом {halo} строк")
+    return rows, workers
+
+
+def _run_strip(source, steps, y0, y1, halo):
+    """Результат строк [y0, y1): полоса с ореолом обрабатывается, ореол отрезается."""
+    top = max(0, y0 - halo)
+    bottom = min(len(source), y1 + halo)
+    result = np.ascontiguousarray(source[top:bottom])
+    for step in steps:
+        result = run_step(result, step)
+    return result[y0 - top:y1 - top]
+
+
+def run_tiled(source, steps, create_output, memory_limit=DEFAULT_MEMORY_LIMIT,
+              max_workers=DEFAULT_WORKERS, progress=None):
+    """
+    Применяет шаги к изображению полосами.
+
+    Args:
+        source: Массив изображения (например, np.memmap): читаются только
+            срезы строк нужных полос.
+        steps: Последовательность pipeline.Step.
+        create_output: Функция (shape, dtype) -> массив для записи результата
+            (вызывается один раз, когда известна форма результата).
+        memory_limit: Предел памяти на полосы в работе (байт).
+        max_workers: Потоков обработки.
+        progress: Функция (готово строк, всего строк) или None.
+
+    Returns:
+        Массив результата (созданный create_output).
+    """
+    steps = list(steps)
+    height = len(source)
+    halo = pipeline_halo(steps)
+    row_bytes = source[:1].nbytes
+    rows, max_workers = strip_rows(row_bytes, halo, memory_limit, max_workers)
+
+    # Первая полоса обрабатывается сразу: по ней видно форму и тип результата
+    first = _run_strip(source, steps, 0, min(rows, height), halo)
+    output = create_output((height,) + first.shape[1:], first.dtype)
+    output[:len(first)] = first
+    done = len(first)
+    if progress is not None:
+        progress(done, height)
+
+    pending = iter(range(done, height, rows))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Не больше max_workers полос в работе одновременно: так память ограничена
+        futures = {}
+        for y0 in pending:
+            futures[executor.submit(_run_strip, source, steps, y0, min(y0 + rows, height), halo)] = y0
+            if len(futures) >= max_workers:
+                break
+        while futures:
+            finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in finished:
+                y0 = futures.pop(future)
+                strip = future.result()
+                output[y0:y0 + len(strip)] = strip
+                done += len(strip)
+                if progress is not None:
+                    progress(done, height)
+                y0 = next(pending, None)
+                if y0 is not None:
+                    futures[executor.submit(_run_strip, source, steps, y0, min(y0 + rows, height), halo)] = y0
+    return output
+
+
+# ---------------------- Files ----------------------
+
+def _read_pnm_header(f):
+    """Магическое число, ширина, высота, максимум и смещение данных двоичного PGM/PPM."""
+    fields = []
+    while len(fields) < 4:
+        token = b""
+        c = f.read(1)
+        while c:
+            if c == b"#" and not token:
+                f.readline()
+            elif c.isspace():
+                if token:
+                    break
+            else:
+                token += c
+            c = f.read(1)
+        if not token:
+            raise ValueError("Неполный заголовок PGM/PPM")
+        fields.append(token)
+    magic, width, height, maxval = fields[0], int(fields[1]), int(fields[2]), int(fields[3])
+    return magic, width, height, maxval, f.tell()
+
+
+def open_mapped(path):
+    """
+    Изображение (BGR или оттенки серого), отображенное в память, если формат
+    это позволяет (.npy, 8-битные P5/P6), иначе прочитанное cv2.imread.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.load(path, mmap_mode="r")
+    if extension in (".pgm", ".ppm"):
+        with open(path, "rb") as f:
+            magic, width, height, maxval, offset = _read_pnm_header(f)
+        if magic in (b"P5", b"P6") and maxval < 256:
+            shape = (height, width) if magic == b"P5" else (height, width, 3)
+            image = np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=shape)
+            # PPM хранит RGB, OpenCV работает с BGR
+            return image if magic == b"P5" else image[..., ::-1]
+    image = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+    if image is None:
+        raise ValueError(f"Не удалось прочитать изображение: {path}")
+    return image
+
+
+def create_mapped(path, shape, dtype):
+    """Файл результата .npy, .pgm или .ppm, отображенный в память для записи."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    if len(shape) == 2:
+        magic = b"P5"
+    elif len(shape) == 3 and shape[2] == 3:
+        magic = b"P6"
+    else:
+        raise ValueError(f"Форма {shape} не записывается в PGM/PPM")
+    if dtype != np.uint8:
+        raise ValueError("В PGM/PPM записываются только 8-битные изображения")
+    expected = {".pgm": b"P5", ".ppm": b"P6"}[extension]
+    if magic != expected:
+        raise ValueError(f"Результат {'одноканальный' if magic == b'P5' else 'цветной'}: "
+                         f"нужен файл {'.pgm' if magic == b'P5' else '.ppm'}")
+
+    header = b"%s\n%d %d\n255\n" % (magic, shape[1], shape[0])
+    with open(path, "wb") as f:
+        f.write(header)
+        f.truncate(len(header) + int(np.prod(shape)))
+    image = np.memmap(path, dtype=np.uint8, mode="r+", offset=len(header), shape=tuple(shape))
+    return image if magic == b"P5" else image[..., ::-1]
+
+
+def process_file_tiled(src_path, dst_path, steps, memory_limit=DEFAULT_MEMORY_LIMIT,
+                       max_workers=DEFAULT_WORKERS, progress=None):
+    """
+    Применяет шаги к файлу изображения полосами и записывает результат.
+
+    Returns:
+        Форма результата.
+    """
+    source = open_mapped(src_path)
+    mapped = os.path.splitext(dst_path)[1].lower() in _MAPPED_EXTENSIONS
+    # Для остальных форматов результат собирается во временном .npy рядом с файлом
+    target = dst_path if mapped else dst_path + ".tmp.npy"
+    try:
+        output = run_tiled(source, steps, lambda shape, dtype: create_mapped(target, shape, dtype),
+                           memory_limit, max_workers, progress)
+        shape = output.shape
+        if mapped:
+            output.flush()
+        elif not cv2.imwrite(dst_path, output):
+            raise ValueError(f"Не удалось записать изображение: {dst_path}")
+        del output
+    finally:
+        if not mapped and os.path.exists(target):
+            os.remove(target)
+    return shape
+
+
+# ---------------------- CLI ----------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Обработка больших изображений полосами.")
+    parser.add_argument("input", help="исходное изображение (.npy, PGM/PPM без загрузки в память)")
+    parser.add_argument("output", help="файл результата (.npy, .pgm, .ppm или другой формат OpenCV)")
+    parser.add_argument("--step", action="append", required=True, type=parse_step,
+                        help="шаг обработки (можно повторять): threshold[:порог[:noinv]], "
+                             "erode|dilate|open|close:rect|ellipse|cross|disk:размер, gauss|blur:размер")
+    parser.add_argument("--memory", type=int, default=DEFAULT_MEMORY_LIMIT // (1024 * 1024),
+                        help="предел памяти на полосы в работе, МБ (по умолчанию: %(default)s)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help="потоков обработки (по умолчанию: число ядер)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        shape = process_file_tiled(args.input, args.output, args.step, args.memory * 1024 * 1024, args.workers)
+    except (OSError, ValueError, cv2.error) as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    print(f"{args.output}: {shape[1]}x{shape[0]}, {time.perf_counter() - start:.1f} с", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
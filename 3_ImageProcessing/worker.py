@@ -0,0 +1,146 @@
+import threading
+import time
+
+import cv2
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from batch import DEFAULT_WORKERS, run_batch, summarize
+from pipeline import Pipeline, scale_step
+
+# Фоновая обработка для окна: выполняется только последний запрос.
+#
+# GUI вызывает request() при каждом нажатии "Применить" или изменении
+# параметров; новый запрос заменяет еще не начатый прежний, а результат
+# выполняемого запроса отбрасывается, если он уже не последний (цепочка
+# прерывается между шагами - уже посчитанные шаги остаются в кэше).
+#
+# Запрос предпросмотра обрабатывает уменьшенную копию изображения (не
+# больше PROXY_SIZE по большей стороне) с пропорционально уменьшенными
+# ядрами - это быстро, пока пользователь меняет параметры.
+#
+# BatchWorker выполняет пакетную обработку папки (batch.run_batch).
+
+# Наибольшая сторона уменьшенной копии для предпросмотра
+PROXY_SIZE = 1024
+
+
+def make_proxy(image_data, max_size=PROXY_SIZE):
+    """Уменьшенная копия изображения и коэффициент уменьшения (1.0 - без уменьшения)."""
+    h, w = image_data.shape[:2]
+    scale = min(1.0, max_size / max(h, w))
+    if scale == 1.0:
+        return image_data, scale
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(image_data, size, interpolation=cv2.INTER_AREA), scale
+
+
+class ProcessingWorker(QObject):
+    """Выполняет цепочки шагов (pipeline.Pipeline) в фоновом QThread."""
+    # Номер запроса, результат, предпросмотр ли это, время обработки (с)
+    finished = pyqtSignal(int, object, bool, float)
+    # Номер запроса, предпросмотр ли это, текст ошибки
+    failed = pyqtSignal(int, bool, str)
+
+    def __init__(self, pipeline=None):
+        super().__init__()
+        # Кэш промежуточных результатов используется только этим потоком
+        self.pipeline = pipeline if pipeline is not None else Pipeline()
+        self._condition = threading.Condition()
+        self._pending = None
+        self._latest = 0
+        self._is_running = True
+        # Уменьшенная копия последнего изображения: (ключ, копия, масштаб)
+        self._proxy = None
+
+    def request(self, job_id, image_data, steps, source_key, preview=False):
+        """
+        Задает новый запрос (вызывается напрямую из потока GUI). Номера
+        запросов должны возрастать; все прежние запросы становятся устаревшими.
+        """
+        with self._condition:
+            self._pending = (job_id, image_data, list(steps), source_key, preview)
+            self._latest = job_id
+            self._condition.notify()
+
+    def is_stale(self, job_id):
+        return job_id != self._latest or not self._is_running
+
+    def stop(self):
+        with self._condition:
+            self._is_running = False
+            self._condition.notify()
+
+    def _next_job(self):
+        """Последний запрос (ждет его) или None после stop()."""
+        with self._condition:
+            while self._is_running and self._pending is None:
+                self._condition.wait()
+            if not self._is_running:
+                return None
+            job, self._pending = self._pending, None
+            return job
+
+    def run(self):
+        """Цикл обработки до stop() (запускается в отдельном QThread)."""
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+            job_id, image_data, steps, source_key, preview = job
+            start = time.perf_counter()
+            try:
+                if preview:
+                    image_data, scale = self._proxy_for(image_data, source_key)
+                    steps = [scale_step(step, scale) for step in steps]
+                    source_key = (source_key, "proxy", scale)
+                result = self.pipeline.run(image_data, steps, source_key,
+                                           should_stop=lambda: self.is_stale(job_id))
+            except Exception as e:
+                if not self.is_stale(job_id):
+                    self.failed.emit(job_id, preview, str(e))
+                continue
+            if result is not None and not self.is_stale(job_id):
+                self.finished.emit(job_id, result, preview, time.perf_counter() - start)
+
+    def _proxy_for(self, image_data, source_key):
+        if self._proxy is None or self._proxy[0] != source_key:
+            self._proxy = (source_key,) + make_proxy(image_data)
+        return self._proxy[1], self._proxy[2]
+
+
+class BatchWorker(QObject):
+    """Пакетная обработка (batch.run_batch) в фоновом QThread."""
+    # batch.FileResult каждого готового файла
+    file_done = pyqtSignal(object)
+    # Итог пакета (batch.summarize) и "error" - текст ошибки, прервавшей пакет, или None
+    finished = pyqtSignal(dict)
+
+    def __init__(self, jobs, steps, max_workers=DEFAULT_WORKERS):
+        super().__init__()
+        self.jobs = jobs
+        self.steps = list(steps)
+        self.max_workers = max_workers
+        self._is_running = True
+
+    def stop(self):
+        """Новые файлы не начинаются, начатые дорабатываются."""
+        self._is_running = False
+
+    def run(self):
+        """Обрабатывает пакет; finished отправляется всегда, даже после ошибки пакета."""
+        start = time.perf_counter()
+        results = []
+
+        def on_result(result):
+            results.append(result)
+            self.file_done.emit(result)
+
+        error = None
+        try:
+            run_batch(self.jobs, self.steps, self.max_workers, on_result=on_result,
+                      should_stop=lambda: not self._is_running)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        summary = summarize(results, time.perf_counter() - start)
+        summary["error"] = error
+        self.finished.emit(summary)